@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'levelup.settings')
+# Tells settings the requests don't run on long-lived threads
+os.environ['LEVELUP_ASGI'] = '1'
+# Route plain GETs on the read endpoints to the native async views
+os.environ.setdefault('LEVELUP_ASYNC_READS', '1')
 
 application = get_asgi_application()
@@ -10,7 +10,9 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
+from corsheaders.defaults import default_headers
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -45,22 +47,139 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'levelupapi.authentication.CachedTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # orjson backed when it's installed, otherwise the same as DRF's defaults
+    'DEFAULT_RENDERER_CLASSES': [
+        'levelupapi.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'levelupapi.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets (levelupapi.throttling); login and register set their own
+    'DEFAULT_THROTTLE_CLASSES': [
+        'levelupapi.throttling.WriteRateThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'login_username': '5/min',
+        'register': '5/hour',
+        'write': '120/min',
+    },
+}
+
+# Where the throttles keep their buckets. CACHE can name an entry in CACHES to
+# share them between workers; otherwise each process counts on its own.
+LEVELUP_THROTTLE = {
+    'CACHE': None,
+    'MAX_KEYS': 10000,
 }
 
+# Token -> user cache used by CachedTokenAuthentication. SHARED_CACHE names the
+# entry in CACHES every worker reads, so a deactivated user or deleted token is
+# dropped for all of them at once. None keeps a per-process LRU instead, where
+# other workers only notice once TTL runs out.
+LEVELUP_TOKEN_CACHE = {
+    'MAX_ENTRIES': 1024,
+    'TTL': 300,
+    'SHARED_CACHE': 'default',
+}
+
+# File based so every worker process shares it: the response cache's versions
+# (and the replica pins) only invalidate across workers that way. A per-process
+# locmem cache would leave other workers serving stale bodies.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('LEVELUP_CACHE_DIR', BASE_DIR / '.cache'),
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    }
+}
+
+# Rendered GET responses cached by levelupapi.caching.cached_response, keyed on
+# per-model versions that the save/delete signals bump. CACHE has to be
+# shared between workers, like CACHES' default above.
+LEVELUP_RESPONSE_CACHE = {
+    'CACHE': 'default',
+    'TIMEOUT': 600,
+}
+
+# Per-request query count and SQL time, reported in a Server-Timing header.
+# Requests over either threshold are logged to levelupapi.sql.
+LEVELUP_SQL_INSTRUMENTATION = {
+    'QUERY_COUNT_THRESHOLD': 50,
+    'DURATION_THRESHOLD_MS': 500,
+    'SLOWEST_STATEMENTS': 3,
+}
+
+# Serve plain GETs on gametypes, games and events from the native async views
+# in levelupapi.views.async_reads. levelup/asgi.py sets the variable, so WSGI
+# deployments keep the sync views.
+LEVELUP_ASYNC_READS = os.environ.get('LEVELUP_ASYNC_READS', '') == '1'
+
+# /events/stream push channel (levelupapi.pubsub). A client whose queue fills
+# up is disconnected and catches up with ?since=.
+LEVELUP_EVENT_STREAM = {
+    'QUEUE_SIZE': 100,
+    'MAX_CLIENTS': 1000,
+    'KEEPALIVE': 15,
+}
+
+# gzip/Brotli for bodies of MIN_SIZE bytes or more (levelupapi.compression).
+# Cached responses keep their compressed variants in the response cache, at
+# the slower CACHED_* levels since each is only compressed once.
+LEVELUP_COMPRESSION = {
+    'MIN_SIZE': 1024,
+    'GZIP_LEVEL': 6,
+    'BROTLI_QUALITY': 5,
+    'CACHED_GZIP_LEVEL': 9,
+    'CACHED_BROTLI_QUALITY': 9,
+}
+
+# Idempotency-Key on POST/PUT to games and events (levelupapi.idempotency).
+# Expired keys are purged by `manage.py run_jobs` every PURGE_INTERVAL seconds.
+LEVELUP_IDEMPOTENCY = {
+    'TTL': 24 * 60 * 60,
+    'WAIT': 5,
+    'LOCK_TIMEOUT': 60,
+    'PURGE_INTERVAL': 300,
+}
+
+# Background jobs run after a write commits (levelupapi.jobs). Jobs that don't
+# fit in a process's queue, and retries left by a stopped process, wait in the
+# Job table for `manage.py run_jobs`.
+LEVELUP_JOBS = {
+    'WORKERS': 2,
+    'QUEUE_SIZE': 100,
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF': 2,
+    'BACKOFF_MAX': 300,
+    'LOCK_TIMEOUT': 300,
+}
+
+# Attendee notifications (levelupapi.notifications); use an SMTP backend in production
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+DEFAULT_FROM_EMAIL = 'levelup@localhost'
+
 CORS_ORIGIN_WHITELIST = (
     'http://localhost:3000',
     'http://127.0.0.1:3000',
     'http://localhost:5173',
     'http://127.0.0.1:5173',
 )
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'levelupapi.middleware.CompressionMiddleware',
+    'levelupapi.middleware.SQLInstrumentationMiddleware',
+    'levelupapi.replicas.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,7 +217,73 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Under WSGI, keep each thread's connection (and the pragmas set on
+        # it) for up to a minute; the health check replaces one that has gone
+        # bad. Under ASGI every request runs in a fresh thread-sensitive
+        # context, so a kept connection is never reused and only holds file
+        # handles until it's garbage collected: close each one instead.
+        'CONN_MAX_AGE': 0 if os.environ.get('LEVELUP_ASGI') == '1' or LEVELUP_ASYNC_READS else 60,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas for list and retrieve on gametypes, games and events
+# (levelupapi.replicas). Locally, LEVELUP_REPLICA_FILES names comma separated
+# SQLite files that `manage.py copy_replicas` keeps copied from the primary;
+# each is opened read-only as replica1, replica2, ...
+LEVELUP_REPLICA_FILES = [path for path in os.environ.get('LEVELUP_REPLICA_FILES', '').split(',') if path]
+for number, path in enumerate(LEVELUP_REPLICA_FILES, 1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{path}?mode=ro',
+        'OPTIONS': {'uri': True},
+        # copy_replicas swaps in a new file; a connection kept open would
+        # go on reading the one it replaced
+        'CONN_MAX_AGE': 0,
+        # Tests read and write the primary's test database through it
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['levelupapi.replicas.ReplicaRouter']
+
+# PIN_SECONDS should be longer than the replicas' lag (copy_replicas --interval)
+LEVELUP_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'RETRY_AFTER': 30,
+    'PIN_SECONDS': 5,
+    'CACHE_TIMEOUT': 5,
+}
+
+# Pragmas applied to every new SQLite connection (levelupapi.sqlite): WAL so
+# reads don't wait on writes, and BEGIN IMMEDIATE so concurrent writers queue
+# on busy_timeout instead of failing with "database is locked".
+LEVELUP_SQLITE = {
+    'JOURNAL_MODE': 'WAL',
+    'BUSY_TIMEOUT': 5000,
+    'SYNCHRONOUS': 'NORMAL',
+    'CACHE_SIZE': -20000,
+    'MMAP_SIZE': 128 * 1024 * 1024,
+    'TRANSACTION_MODE': 'IMMEDIATE',
+}
+
+
+# Logging
+# https://docs.djangoproject.com/en/4.2/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'levelupapi': {
+            'handlers': ['console'],
+            'level': 'INFO',
+        },
+    },
 }
 
 
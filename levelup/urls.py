@@ -1,19 +1,47 @@
+from django.conf import settings
 from django.contrib import admin
 from django.conf.urls import include
 from rest_framework import routers
 from django.urls import path
-from levelupapi.views import register_user, login_user, GameTypeView, EventView, GameView
+from levelupapi.views import register_user, login_user, GameTypeView, EventView, GameView, event_stream
+from levelupapi.views import GameStatsView, UserStatsView, DashboardView
+from levelupapi.views import async_reads
 
 router = routers.DefaultRouter(trailing_slash=False) # trailing_slash=False tells
 router.register(r'gametypes', GameTypeView, 'gametype')
 router.register(r'events', EventView, 'event')
 router.register(r'games', GameView, 'game')
+router.register(r'stats/games', GameStatsView, 'gamestats')
+router.register(r'stats/users', UserStatsView, 'userstats')
 
 urlpatterns = [
+    # Server-sent events push channel (ASGI only); ahead of the router so
+    # "stream" isn't taken for an event id
+    path('events/stream', event_stream),
     path('', include(router.urls)),
+    # The signed in gamer's own games and events in one response
+    path('me/dashboard', DashboardView.as_view({'get': 'list'})),
     # Requests to http://localhost:8000/register will be routed to the register_user function
     path('register', register_user),
     # Requests to http://localhost:8000/login will be routed to the login_user function
     path('login', login_user),
     path('admin/', admin.site.urls),
 ]
+
+# Native async handlers for plain GETs on the read endpoints. Everything
+# else on these URLs is passed on to the router's view for the same URL.
+router_views = {url.name: url.callback for url in reversed(router.urls) if url.name}
+async_urlpatterns = [
+    path('gametypes', async_reads.async_read(async_reads.game_type_list, router_views['gametype-list'])),
+    path('gametypes/<int:pk>', async_reads.async_read(async_reads.game_type_detail, router_views['gametype-detail'])),
+    path('games', async_reads.async_read(async_reads.game_list, router_views['game-list'])),
+    path('games/<int:pk>', async_reads.async_read(async_reads.game_detail, router_views['game-detail'])),
+    path('events', async_reads.async_read(async_reads.event_list, router_views['event-list'],
+                                          async_reads.EVENT_LIST_PARAMS)),
+    path('events/<int:pk>', async_reads.async_read(async_reads.event_detail, router_views['event-detail'])),
+]
+
+# Only worth it under ASGI; a WSGI worker would have to start an event loop
+# for every request. levelup/asgi.py turns it on.
+if settings.LEVELUP_ASYNC_READS:
+    urlpatterns = async_urlpatterns + urlpatterns
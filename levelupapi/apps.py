@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LevelupapiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'levelupapi'
+
+    def ready(self):
+        # Connect the signal receivers, register the job handlers and system checks
+        from levelupapi import checks, signals, notifications # pylint: disable=unused-import,import-outside-toplevel
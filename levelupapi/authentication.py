@@ -0,0 +1,221 @@
+"""Token authentication with the token -> user lookup cached"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_DEFAULTS = {
+    # Most tokens kept in each process
+    "MAX_ENTRIES": 1024,
+    # Seconds before a cached token has to be looked up again
+    "TTL": 300,
+    # Alias from CACHES shared by every worker, so invalidation reaches them
+    # all; None keeps a per-process LRU that only the TTL makes catch up
+    "SHARED_CACHE": "default",
+}
+
+# Copied out of the User row instead of caching the instance, which the
+# threads answering requests with the same token would otherwise share
+USER_FIELDS = ("id", "username", "first_name", "last_name", "email", "is_active", "is_staff", "is_superuser",
+               "last_login", "date_joined")
+
+
+def user_values(user):
+    return tuple(getattr(user, field) for field in USER_FIELDS)
+
+
+def build_user(values):
+    """A fresh User from user_values(); other fields load on first access"""
+    by_field = dict(zip(USER_FIELDS, values))
+    # from_db() takes the loaded fields in the model's field order
+    loaded = [field.attname for field in User._meta.concrete_fields if field.attname in by_field]
+    return User.from_db(DEFAULT_DB_ALIAS, loaded, [by_field[name] for name in loaded])
+
+
+class TokenCache:
+    """Token key -> user, with a TTL
+
+    Entries are dropped by the signal receivers in levelupapi.signals when
+    a Token is deleted or its User is saved or deleted. With the shared
+    cache (the default) every worker reads and invalidates the same
+    entries. Without one, entries live in a bounded LRU per process, and a
+    change made in another process only shows once the TTL runs out.
+
+    Entries hold the user's USER_FIELDS values; every get() builds a new
+    User from them.
+    """
+
+    shared_prefix = "levelup:token:"
+
+    def __init__(self, max_entries=1024, ttl=300, shared_cache=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared_cache = shared_cache
+        self.entries = OrderedDict()
+        self.keys_by_user = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = {**TOKEN_CACHE_DEFAULTS, **getattr(settings, "LEVELUP_TOKEN_CACHE", {})}
+        return cls(config["MAX_ENTRIES"], config["TTL"], config["SHARED_CACHE"])
+
+    def get_shared(self):
+        return caches[self.shared_cache] if self.shared_cache else None
+
+    def get(self, key):
+        """Return the cached user for a token key, or None on a miss"""
+        shared = self.get_shared()
+        if shared is not None:
+            values = shared.get(self.shared_prefix + key)
+            with self.lock:
+                if values is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return None if values is None else build_user(values)
+
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                values, expires = entry
+                if expires > now:
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return build_user(values)
+                self._evict(key)
+            self.misses += 1
+        return None
+
+    def set(self, key, user):
+        values = user_values(user)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.set(self.shared_prefix + key, values, self.ttl)
+            return
+        with self.lock:
+            self._store(key, values, time.monotonic())
+
+    def invalidate(self, key):
+        with self.lock:
+            self._evict(key)
+        shared = self.get_shared()
+        if shared is not None:
+            shared.delete(self.shared_prefix + key)
+
+    def invalidate_user(self, user_id):
+        """Drop every token belonging to a user"""
+        with self.lock:
+            keys = set(self.keys_by_user.get(user_id, ()))
+            for key in keys:
+                self._evict(key)
+        shared = self.get_shared()
+        if shared is not None:
+            keys.update(Token.objects.filter(user_id=user_id).values_list("key", flat=True))
+            shared.delete_many([self.shared_prefix + key for key in keys])
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_user.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Hit/miss counters for this process"""
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self.entries),
+                "max_entries": self.max_entries,
+            }
+
+    def _store(self, key, values, now):
+        if key in self.entries:
+            self._evict(key)
+        self.entries[key] = (values, now + self.ttl)
+        self.keys_by_user.setdefault(values[0], set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._evict(next(iter(self.entries)))
+
+    def _evict(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0][0]
+        user_keys = self.keys_by_user.get(user_id)
+        if user_keys is not None:
+            user_keys.discard(key)
+            if not user_keys:
+                del self.keys_by_user[user_id]
+
+
+token_cache = TokenCache.from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in replacement for TokenAuthentication
+
+    Only the first request for a token hits authtoken_token and auth_user;
+    later ones are answered from token_cache.
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return (user, token)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return (user, Token(key=key, user=user))
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, reading a plain HttpRequest
+
+        Header parsing and error messages match TokenAuthentication; a
+        cache miss is looked up with the async ORM.
+
+        Returns:
+            tuple -- (user, token), or None when there is no Token header
+        """
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) == 1:
+            raise exceptions.AuthenticationFailed("Invalid token header. No credentials provided.")
+        if len(auth) > 2:
+            raise exceptions.AuthenticationFailed("Invalid token header. Token string should not contain spaces.")
+        try:
+            key = auth[1].decode()
+        except UnicodeError as ex:
+            raise exceptions.AuthenticationFailed(
+                "Invalid token header. Token string should not contain invalid characters.") from ex
+        return await self.aauthenticate_credentials(key)
+
+    async def aauthenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            try:
+                token = await Token.objects.select_related("user").aget(key=key)
+            except Token.DoesNotExist as ex:
+                raise exceptions.AuthenticationFailed("Invalid token.") from ex
+            if not token.user.is_active:
+                raise exceptions.AuthenticationFailed("User inactive or deleted.")
+            token_cache.set(key, token.user)
+            return (token.user, token)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return (user, Token(key=key, user=user))
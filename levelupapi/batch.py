@@ -0,0 +1,50 @@
+"""Helpers shared by the batch create actions"""
+from rest_framework import status
+from rest_framework.response import Response
+
+# Largest array accepted by a single batch POST
+MAX_BATCH_SIZE = 5000
+# Rows per INSERT statement handed to bulk_create
+INSERT_BATCH_SIZE = 500
+
+
+def parse_id(value):
+    """Coerce a foreign key from the payload to an int, or None if it isn't one"""
+    if isinstance(value, bool):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def require_text(item, field, errors):
+    value = item.get(field)
+    if not isinstance(value, str) or not value.strip():
+        errors[field] = "This field is required."
+    return value
+
+
+def check_batch(items):
+    """Return an error Response if the payload can't be processed as a batch"""
+    if not items:
+        return Response({"message": "Batch is empty"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(items) > MAX_BATCH_SIZE:
+        return Response(
+            {"message": f"Batches are limited to {MAX_BATCH_SIZE} items"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    return None
+
+
+def batch_response(results):
+    """201 when every item was created, 207 when some of them failed
+
+    Returns:
+        Response -- one result per submitted item, in request order
+    """
+    failed = any(result["status"] != status.HTTP_201_CREATED for result in results)
+    return Response(
+        results,
+        status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED,
+    )
@@ -0,0 +1,226 @@
+"""Rendered response cache and conditional GET support for read endpoints"""
+import hashlib
+import uuid
+from functools import partial, wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from levelupapi import compression, replicas
+from levelupapi.renderers import FastJSONRenderer
+
+RESPONSE_CACHE_DEFAULTS = {
+    # Alias from CACHES holding versions and rendered bodies. Point it
+    # at a cache every worker shares so a write in one process is seen by all.
+    "CACHE": "default",
+    # Seconds a rendered body is kept; version bumps make old ones unreachable
+    "TIMEOUT": 600,
+}
+
+JSON_MEDIA_TYPE = FastJSONRenderer.media_type
+
+
+def get_config():
+    return {**RESPONSE_CACHE_DEFAULTS, **getattr(settings, "LEVELUP_RESPONSE_CACHE", {})}
+
+
+def get_cache():
+    return caches[get_config()["CACHE"]]
+
+
+def version_key(model):
+    return f"levelup:version:{model._meta.label_lower}"
+
+
+def new_version():
+    # Unique rather than counted: incr() isn't atomic on every backend (the
+    # file based one reads and rewrites), so two workers bumping at once
+    # could both land on the same next value, and a counter that was evicted
+    # could come back with one an older cached response was keyed on
+    return uuid.uuid4().hex
+
+
+def bump_version(model):
+    """Invalidate every cached response that was built from `model` rows
+
+    The bump waits for the current transaction to commit. Made earlier, a
+    request reading in between would cache the old rows under the new
+    version, and they'd be served until the next write.
+    """
+    transaction.on_commit(partial(store_version, version_key(model)))
+
+
+def store_version(key):
+    get_cache().set(key, new_version(), None)
+
+
+def get_versions(models):
+    """Current version of each model, seeding any that are missing"""
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, new_version(), None)
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+async def aget_versions(models):
+    """get_versions() for async views"""
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    found = await cache.aget_many(keys)
+    for key in keys:
+        if key not in found:
+            await cache.aadd(key, new_version(), None)
+            found[key] = await cache.aget(key)
+    return [found[key] for key in keys]
+
+
+def response_key(versions, media_type, uri, extra=""):
+    """Cache key for a rendered body; the same for sync and async views
+
+    Bodies built from a read replica get their own keys, so a request that
+    reads from the primary (such as one from a user who just wrote) never
+    gets a body that may have missed the write.
+    """
+    source = "replica" if replicas.reading_from_replica() else "primary"
+    variant = "|".join((".".join(str(version) for version in versions), media_type, uri, extra, source))
+    return f"levelup:response:{hashlib.sha256(variant.encode()).hexdigest()}"
+
+
+def make_etag(body):
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def body_timeout():
+    """Seconds to keep a rendered body: less if it was read from a replica, which may lag"""
+    if replicas.reading_from_replica():
+        return min(get_config()["TIMEOUT"], replicas.get_config()["CACHE_TIMEOUT"])
+    return get_config()["TIMEOUT"]
+
+
+def etag_matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+
+def cached_response(*models, vary=None):
+    """Cache the rendered JSON body of a GET action
+
+    The cache key is the full request URL plus the version of every
+    model the response is built from, so any save or delete of one of those
+    models (see levelupapi.signals) makes the entry unreachable. A hit costs
+    cache lookups only. Every 200 response gets a strong ETag and a request
+    whose If-None-Match matches it gets a 304 with no body.
+
+    `vary` is an optional callable taking the request and returning extra
+    key material, for responses that depend on something other than the
+    URL and the models (such as the current time).
+
+    Only JSON responses are cached; the browsable API and streaming
+    responses are passed through untouched.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            if getattr(request.accepted_renderer, "format", None) != "json":
+                return method(view, request, *args, **kwargs)
+
+            cache = get_cache()
+            key = response_key(get_versions(models), request.accepted_media_type,
+                               request.build_absolute_uri(), vary(request) if vary else "")
+
+            cached = cache.get(key)
+            if cached is None:
+                response = method(view, request, *args, **kwargs)
+                if response.status_code != 200 or response.streaming or not hasattr(response, "data"):
+                    return response
+                body = request.accepted_renderer.render(
+                    response.data, request.accepted_media_type, view.get_renderer_context())
+                cached = (body, make_etag(body), request.accepted_media_type)
+                cache.set(key, cached, body_timeout())
+
+            return cached_body_response(request, cached)
+        return wrapper
+    return decorator
+
+
+def cached_body_response(request, cached):
+    """HttpResponse (or 304) for a (body, etag, content type) cache entry
+
+    Bodies big enough to compress are sent in the client's preferred
+    encoding. Each encoded variant is cached too, so it's compressed once
+    rather than on every hit.
+    """
+    body, etag, content_type = cached
+    encoding = negotiate(request, cached)
+    if encoding and not etag_matches(request, compression.encoded_etag(etag, encoding)):
+        body = compression.cached_variant(get_cache(), body, etag, encoding, get_config()["TIMEOUT"])
+    return body_response(request, cached, body, encoding)
+
+
+async def acached_body_response(request, cached):
+    """cached_body_response() for async views"""
+    body, etag, content_type = cached
+    encoding = negotiate(request, cached)
+    if encoding and not etag_matches(request, compression.encoded_etag(etag, encoding)):
+        body = await compression.acached_variant(get_cache(), body, etag, encoding, get_config()["TIMEOUT"])
+    return body_response(request, cached, body, encoding)
+
+
+def negotiate(request, cached):
+    """Encoding to send a cache entry in, or None for as is"""
+    body, _, content_type = cached
+    if not compression.applies(content_type, len(body)):
+        return None
+    return compression.request_encoding(request)
+
+
+def body_response(request, cached, body, encoding):
+    original, etag, content_type = cached
+    if encoding:
+        etag = compression.encoded_etag(etag, encoding)
+    if etag_matches(request, etag):
+        response = not_modified(etag)
+    else:
+        response = HttpResponse(body, content_type=content_type)
+        response["ETag"] = etag
+        if encoding:
+            response["Content-Encoding"] = encoding
+    if compression.applies(content_type, len(original)):
+        patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+async def acached_json(request, models, build, vary=None):
+    """cached_response() for async views
+
+    `build` is a coroutine function returning the data to render, or an
+    HttpResponse (e.g. a 404) which is returned as is and not cached.
+    Entries are shared with the sync views: the same URL hits the same key.
+    """
+    cache = get_cache()
+    key = response_key(await aget_versions(models), JSON_MEDIA_TYPE,
+                       request.build_absolute_uri(), vary(request) if vary else "")
+
+    cached = await cache.aget(key)
+    if cached is None:
+        data = await build()
+        if isinstance(data, HttpResponse):
+            return data
+        body = FastJSONRenderer().render(data)
+        cached = (body, make_etag(body), JSON_MEDIA_TYPE)
+        await cache.aset(key, cached, body_timeout())
+    return await acached_body_response(request, cached)
@@ -0,0 +1,138 @@
+"""Incremental change feed for list views (?since=)
+
+A client polls with the cursor from its previous response and gets back
+only the rows created or changed since then plus the ids deleted since
+then:
+
+    GET /games?since=           everything, and a cursor to start from
+    GET /games?since=<cursor>   {"changed": [...], "deleted": [ids],
+                                 "cursor": "...", "has_more": false}
+
+Every write to a row is logged as a Change, including the rows that only
+show another one: renaming a user logs their games and events, renaming a
+game its events, relabelling a game type its games. Change ids follow
+commit order (see Change), so a cursor holding the last id read misses
+nothing that commits later, however early its transaction started.
+
+A first sync pages through the rows in id order, remembering the newest
+Change from before it started; later polls read the log after that. Both
+are capped at the page size; when has_more is true the client polls again
+straight away with the new cursor.
+
+Filters such as ?game= narrow the changed rows only. Deletions are not
+filtered, so a client can get ids it never had, which it should ignore.
+"""
+import base64
+import json
+from django.db import connections, router
+from django.db.models import F, Max, QuerySet
+from django.utils import timezone
+from rest_framework.response import Response
+from levelupapi.models import Change
+from levelupapi.pagination import KeysetPagination
+
+
+def record_changes(model, rows, deleted=False):
+    """Log writes to `model` rows for the change feed
+
+    `rows` is a list of primary keys, or a queryset whose rows are logged
+    with a single INSERT ... SELECT instead of being read first.
+    """
+    label = model._meta.label_lower
+    if not isinstance(rows, QuerySet):
+        Change.objects.bulk_create([Change(model=label, object_id=pk, deleted=deleted) for pk in rows])
+        return
+    using = router.db_for_write(Change)
+    connection = connections[using]
+    select, params = rows.values(object_id=F("pk")).query.get_compiler(using).as_sql()
+    changed_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {connection.ops.quote_name(Change._meta.db_table)} "
+            f"(model, object_id, deleted, changed_at) SELECT %s, object_id, %s, %s FROM ({select})",
+            [label, deleted, changed_at, *params],
+        )
+
+
+class ChangeFeed(KeysetPagination):
+    """Rows in id order for a first sync, then the Change log after the cursor"""
+
+    ordering = ("id",)
+    cursor_query_param = "since"
+    page_size = 500
+    max_page_size = 5000
+
+    def is_requested(self, request):
+        return self.cursor_query_param in request.query_params
+
+    def get_changes_response(self, queryset, request, serialize):
+        """Build the response for a ?since= request
+
+        `serialize` turns a queryset of the changed rows into response data;
+        it's given the rows in id order.
+
+        Returns:
+            Response -- changed rows, deleted ids and the next cursor
+        """
+        self.model = queryset.model
+        page_size = self.get_page_size(request)
+        encoded = request.query_params[self.cursor_query_param]
+        changes = Change.objects.filter(model=self.model._meta.label_lower)
+
+        if encoded:
+            synced_to, last_change = self.decode_cursor(encoded)
+        else:
+            # Read the newest change before the rows, so a write in between
+            # is reported by the next poll rather than lost
+            synced_to = 0
+            last_change = changes.aggregate(last=Max("id"))["last"] or 0
+
+        if synced_to is not None:
+            return self.get_sync_response(queryset, serialize, page_size, synced_to, last_change)
+
+        entries = list(changes.filter(id__gt=last_change).order_by("id")
+                       .values_list("id", "object_id", "deleted")[:page_size + 1])
+        has_more = len(entries) > page_size
+        entries = entries[:page_size]
+        if not entries:
+            return self.changes_response([], [], None, last_change, has_more)
+
+        upto = entries[-1][0]
+        written = changes.filter(id__gt=last_change, id__lte=upto, deleted=False).values("object_id")
+        # Rows deleted since they were written are gone from `queryset`
+        data = serialize(queryset.filter(pk__in=written).order_by("id"))
+        deleted = list(dict.fromkeys(object_id for _, object_id, gone in entries if gone))
+        return self.changes_response(data, deleted, None, upto, has_more)
+
+    def get_sync_response(self, queryset, serialize, page_size, synced_to, last_change):
+        """The next page of a first sync: rows after id `synced_to`"""
+        ids = list(queryset.filter(id__gt=synced_to).order_by("id").values_list("id", flat=True)[:page_size + 1])
+        has_more = len(ids) > page_size
+        ids = ids[:page_size]
+        data = serialize(queryset.filter(id__gt=synced_to, id__lte=ids[-1]).order_by("id")) if ids else []
+        # Once the rows run out the cursor moves on to the log
+        return self.changes_response(data, [], ids[-1] if has_more else None, last_change, has_more)
+
+    def changes_response(self, data, deleted, synced_to, last_change, has_more):
+        return Response({
+            "changed": data,
+            "deleted": deleted,
+            "cursor": self.encode_position(synced_to, last_change),
+            "has_more": has_more,
+        })
+
+    def encode_position(self, synced_to, last_change):
+        """Cursor for a first sync's last row id (None once it's done) and a Change id"""
+        raw = json.dumps([synced_to, last_change], separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, encoded):
+        """Returns: tuple -- (last row id of a first sync or None, last Change id)"""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if not isinstance(values, list) or len(values) != 2:
+                raise ValueError(encoded)
+            synced_to, last_change = values
+            return (None if synced_to is None else int(synced_to)), int(last_change)
+        except Exception as ex:
+            raise self.invalid_cursor() from ex
@@ -0,0 +1,29 @@
+"""System checks for database state the migrations can't guarantee"""
+from django.core.checks import Tags, Warning, register  # pylint: disable=redefined-builtin
+from django.db import connections
+from levelupapi import search
+
+
+@register(Tags.database)
+def check_game_search(app_configs, databases=None, **kwargs):
+    """The FTS index is only kept current while all of its triggers exist
+
+    Runs with `manage.py check --database default` and before migrate.
+    """
+    warnings = []
+    for alias in databases or ():
+        connection = connections[alias]
+        if connection.vendor != "sqlite":
+            continue
+        with connection.cursor() as cursor:
+            if not search.table_exists(cursor):
+                continue
+            missing = search.missing_triggers(cursor)
+        if missing:
+            warnings.append(Warning(
+                f"The game search index on {alias!r} is missing triggers: {', '.join(missing)}. "
+                "Writes to levelupapi_game no longer reach it.",
+                hint="Run `manage.py rebuild_game_search` to recreate them and reindex.",
+                id="levelupapi.W001",
+            ))
+    return warnings
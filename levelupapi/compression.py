@@ -0,0 +1,176 @@
+"""Content-negotiated gzip/Brotli response compression
+
+CompressionMiddleware compresses responses on their way out; bodies served
+from the rendered response cache (levelupapi.caching) are compressed once
+per encoding and the result is cached next to them, so a hot response
+costs a cache lookup rather than a compression on every request.
+
+Brotli is used when the brotli package is installed and the client asks
+for it; otherwise gzip. Bodies under MIN_SIZE bytes go out as they are:
+the saving on a few hundred bytes doesn't pay for the CPU.
+"""
+import gzip
+import zlib
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError: # pragma: no cover - brotli is optional
+    brotli = None
+
+COMPRESSION_DEFAULTS = {
+    "ENABLED": True,
+    # Smallest body, in bytes, worth compressing
+    "MIN_SIZE": 1024,
+    # Levels for bodies compressed on every request (including streams)
+    "GZIP_LEVEL": 6,
+    "BROTLI_QUALITY": 5,
+    # Levels for bodies compressed once and kept in the response cache
+    "CACHED_GZIP_LEVEL": 9,
+    "CACHED_BROTLI_QUALITY": 9,
+    # Only these are compressed; text/event-stream is left alone so
+    # messages aren't held back in a compressor's buffer
+    "CONTENT_TYPES": ("application/json", "text/html", "text/plain", "text/css",
+                      "text/javascript", "application/javascript"),
+}
+
+# Server preference, best first
+ENCODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def get_config():
+    return {**COMPRESSION_DEFAULTS, **getattr(settings, "LEVELUP_COMPRESSION", {})}
+
+
+def parse_accept_encoding(header):
+    """Returns: dict -- coding -> q value from an Accept-Encoding header"""
+    accepted = {}
+    for part in header.split(","):
+        coding, *params = part.split(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header):
+    """Best encoding we support that the client accepts, or None"""
+    if not header:
+        return None
+    accepted = parse_accept_encoding(header)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(content_type, config):
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return media_type in config["CONTENT_TYPES"]
+
+
+def applies(content_type, size=None):
+    """Whether a body of this type and size (None: a stream) is compressed for clients that accept it
+
+    When it is, the response varies on Accept-Encoding.
+    """
+    config = get_config()
+    if not config["ENABLED"] or not is_compressible(content_type, config):
+        return False
+    return size is None or size >= config["MIN_SIZE"]
+
+
+def request_encoding(request):
+    """Returns: str -- "br", "gzip" or None, from the request's Accept-Encoding"""
+    return choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+
+
+def compress(body, encoding, cached=False):
+    config = get_config()
+    if encoding == "br":
+        return brotli.compress(body, quality=config["CACHED_BROTLI_QUALITY" if cached else "BROTLI_QUALITY"])
+    # mtime=0 keeps the output, and so its ETag, the same for the same body
+    return gzip.compress(body, config["CACHED_GZIP_LEVEL" if cached else "GZIP_LEVEL"], mtime=0)
+
+
+def stream_compressor(encoding):
+    """Returns: tuple -- (compress(chunk) -> bytes, finish() -> bytes)"""
+    config = get_config()
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=config["BROTLI_QUALITY"])
+        return compressor.process, compressor.finish
+    # wbits=31: zlib stream with a gzip header and trailer
+    compressor = zlib.compressobj(config["GZIP_LEVEL"], zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def compress_stream(chunks, encoding):
+    """Compress an iterable of byte chunks, yielding output as it's produced"""
+    process, finish = stream_compressor(encoding)
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+async def acompress_stream(chunks, encoding):
+    """compress_stream() for async streaming content"""
+    process, finish = stream_compressor(encoding)
+    async for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def encoded_etag(etag, encoding):
+    """A distinct strong ETag for each encoding of the same body"""
+    if etag.startswith('"') and etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def variant_key(etag, encoding):
+    # ETags are content hashes, so identical bodies share their variants
+    return f"levelup:encoded:{encoding}:{etag.strip(chr(34))}"
+
+
+def cached_variant(cache, body, etag, encoding, timeout):
+    """`body` compressed with `encoding`, from the cache or compressed and stored"""
+    key = variant_key(etag, encoding)
+    encoded = cache.get(key)
+    if encoded is None:
+        encoded = compress(body, encoding, cached=True)
+        cache.set(key, encoded, timeout)
+    return encoded
+
+
+async def acached_variant(cache, body, etag, encoding, timeout):
+    """cached_variant() for async views"""
+    key = variant_key(etag, encoding)
+    encoded = await cache.aget(key)
+    if encoded is None:
+        encoded = compress(body, encoding, cached=True)
+        await cache.aset(key, encoded, timeout)
+    return encoded
+
+
+def mark_encoded(response, encoding):
+    """Headers for a response whose body is now in `encoding`"""
+    response["Content-Encoding"] = encoding
+    if response.has_header("ETag"):
+        response["ETag"] = encoded_etag(response["ETag"], encoding)
+    patch_vary_headers(response, ("Accept-Encoding",))
@@ -0,0 +1,128 @@
+"""Plain-dict serialization for the list endpoints
+
+These build the same structures as EventSerializer and GameSerializer
+straight from values_list() rows, skipping model instances and DRF's
+per-field machinery. levelupapi.tests checks that both paths agree.
+"""
+from functools import reduce
+from operator import or_
+from django.db.models import Q
+from levelupapi.models import EventGamer
+
+EVENT_COLUMNS = (
+    "id", "name", "date_time", "location", "attendee_count",
+    "organizer_id", "organizer__first_name", "organizer__last_name",
+    "game_id", "game__name",
+)
+
+GAME_COLUMNS = (
+    "id", "name", "manufacturer", "number_of_players",
+    "type_id", "type__label",
+    "creator_id", "creator__first_name", "creator__last_name",
+)
+
+
+def format_date(value):
+    """Same as value.date().strftime("%Y-%m-%d")"""
+    return f"{value.year:04d}-{value.month:02d}-{value.day:02d}"
+
+
+def format_time(value):
+    """Same as value.time().strftime("%I:%M %p")"""
+    return f"{value.hour % 12 or 12:02d}:{value.minute:02d} {'AM' if value.hour < 12 else 'PM'}"
+
+
+def signup_rows(*events):
+    """(event_id, attendee_id, first_name, last_name) for the events of some querysets
+
+    The querysets go in as subqueries, so a long list costs no bound
+    parameters (SQLite caps them) and no ids travel back to the database.
+    """
+    return (EventGamer.objects
+            .filter(reduce(or_, (Q(event_id__in=queryset.values("id")) for queryset in events)))
+            .order_by("attendee_id")
+            .values_list("event_id", "attendee_id", "attendee__first_name", "attendee__last_name"))
+
+
+def build_events(rows, signups):
+    """Turn EVENT_COLUMNS rows and signup_rows() rows into event dicts"""
+    attendees = {}
+    for event_id, user_id, first_name, last_name in signups:
+        attendees.setdefault(event_id, []).append(
+            {"id": user_id, "full_name": f"{first_name} {last_name}"})
+
+    # Many events share a start time, so each distinct value is formatted once
+    dates = {}
+    times = {}
+    data = []
+    for (event_id, name, date_time, location, attendee_count,
+         organizer_id, first_name, last_name, game_id, game_name) in rows:
+        date = dates.get(date_time)
+        if date is None:
+            date = dates[date_time] = format_date(date_time)
+        time = times.get(date_time)
+        if time is None:
+            time = times[date_time] = format_time(date_time)
+        data.append({
+            "id": event_id,
+            "name": name,
+            "date": date,
+            "time": time,
+            "location": location,
+            "organizer": {"id": organizer_id, "full_name": f"{first_name} {last_name}"},
+            "game": {"id": game_id, "name": game_name},
+            "attendees": attendees.get(event_id, []),
+            "attendee_count": attendee_count,
+        })
+    return data
+
+
+def build_games(rows):
+    """Turn GAME_COLUMNS rows into game dicts"""
+    return [
+        {
+            "id": game_id,
+            "name": name,
+            "manufacturer": manufacturer,
+            "number_of_players": number_of_players,
+            "type": {"id": type_id, "label": label},
+            "creator": {"id": creator_id, "full_name": f"{first_name} {last_name}"},
+        }
+        for (game_id, name, manufacturer, number_of_players, type_id, label,
+             creator_id, first_name, last_name) in rows
+    ]
+
+
+def serialize_events(queryset):
+    """EventSerializer(queryset, many=True).data as plain dicts in two queries
+
+    Returns:
+        list -- one dict per event
+    """
+    rows = list(queryset.prefetch_related(None).values_list(*EVENT_COLUMNS))
+    signups = signup_rows(queryset) if rows else ()
+    return build_events(rows, signups)
+
+
+def serialize_event_lists(querysets, limit=None):
+    """serialize_events() for several querysets, sharing one signups query
+
+    Returns:
+        list -- a list of event dicts per queryset, each at most `limit` long
+    """
+    # Sliced, each is read twice: for its rows and as the signups' subquery.
+    # Both have to pick the same events.
+    querysets = [(queryset if queryset.ordered else queryset.order_by("pk")).prefetch_related(None)[:limit]
+                 for queryset in querysets]
+    row_lists = [list(queryset.values_list(*EVENT_COLUMNS)) for queryset in querysets]
+    signups = list(signup_rows(*querysets)) if any(row_lists) else ()
+    return [build_events(rows, signups) for rows in row_lists]
+
+
+def serialize_games(queryset):
+    """GameSerializer(queryset, many=True).data as plain dicts in one query
+
+    Returns:
+        list -- one dict per game
+    """
+    return build_games(queryset.values_list(*GAME_COLUMNS))
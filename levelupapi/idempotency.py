@@ -0,0 +1,204 @@
+"""Idempotency-Key support for POST and PUT
+
+A client that may retry a write sends a unique Idempotency-Key header with
+it. The first request with a key claims it by inserting an IdempotencyKey
+row; the unique (user, key) constraint decides between concurrent
+duplicates. The response is stored on the row once the view returns, and
+a retry with the same key and payload gets that response back
+(Idempotent-Replayed: true) without the view running again.
+
+A duplicate that arrives while the first request is still running waits
+for it, up to WAIT seconds, then gets a 409. The same key sent with a
+different payload gets a 422. A request that fails with an exception or a
+5xx releases its key so it can be retried.
+
+Keys expire after TTL seconds. Expired rows are deleted in batches by the
+run_jobs worker every PURGE_INTERVAL seconds, and by the
+purge_idempotency_keys command; never on a request's path, where the
+DELETE would hold the write lock.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from levelupapi.models import IdempotencyKey
+from levelupapi.renderers import FastJSONRenderer
+
+IDEMPOTENCY_DEFAULTS = {
+    # Seconds a key and its stored response are kept
+    "TTL": 24 * 60 * 60,
+    # Seconds a duplicate waits for the first request before giving up with a 409
+    "WAIT": 5,
+    "POLL_INTERVAL": 0.05,
+    # Seconds after which a key still in progress counts as abandoned
+    # (its request crashed) and can be claimed again
+    "LOCK_TIMEOUT": 60,
+    # Seconds between purges of expired keys by run_jobs (None to only
+    # purge with the purge_idempotency_keys command)
+    "PURGE_INTERVAL": 300,
+    # Rows deleted per purge statement, to keep each write lock short
+    "PURGE_BATCH": 1000,
+}
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def get_config():
+    return {**IDEMPOTENCY_DEFAULTS, **getattr(settings, "LEVELUP_IDEMPOTENCY", {})}
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request"""
+
+
+class KeyInProgress(Exception):
+    """The first request with the key is still running"""
+
+
+def request_hash(request):
+    """Fingerprint of what the request asks for, independent of JSON formatting"""
+    data = request.data
+    if hasattr(data, "lists"):
+        data = dict(data.lists())
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{payload}".encode()).hexdigest()
+
+
+def claim(user, key, fingerprint, config):
+    """Take the key for this request, or find the earlier request's response
+
+    Returns:
+        IdempotencyKey -- the finished earlier request to replay, or None
+        once this request holds the key
+
+    Raises:
+        KeyReused -- the key belongs to a request with another payload
+        KeyInProgress -- the earlier request didn't finish within WAIT
+    """
+    deadline = time.monotonic() + config["WAIT"]
+    while True:
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    user=user, key=key, request_hash=fingerprint,
+                    expires_at=now + timedelta(seconds=config["TTL"]))
+            return None
+        except IntegrityError:
+            pass
+
+        record = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if record is None:
+            # Released or purged since the insert failed
+            continue
+        if record.expires_at <= now:
+            IdempotencyKey.objects.filter(pk=record.pk, expires_at=record.expires_at).delete()
+            continue
+        if record.request_hash != fingerprint:
+            raise KeyReused()
+        if record.status_code is not None:
+            return record
+        if record.created_at <= now - timedelta(seconds=config["LOCK_TIMEOUT"]):
+            IdempotencyKey.objects.filter(pk=record.pk, status_code=None).delete()
+            continue
+        if time.monotonic() >= deadline:
+            raise KeyInProgress()
+        time.sleep(config["POLL_INTERVAL"])
+
+
+def replay(record):
+    response = HttpResponse(bytes(record.body), status=record.status_code,
+                            content_type=FastJSONRenderer.media_type)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(method):
+    """Run a write action at most once per Idempotency-Key
+
+    Requests without the header are passed straight through. Responses are
+    stored and replayed as JSON, whatever renderer the first one used.
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.META.get(HEADER)
+        if key is None:
+            return method(view, request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({"message": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        config = get_config()
+        try:
+            record = claim(request.user, key, request_hash(request), config)
+        except KeyReused:
+            return Response({"message": "Idempotency-Key was already used for a different request"},
+                            status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except KeyInProgress:
+            response = Response({"message": "A request with this Idempotency-Key is still in progress"},
+                                status=status.HTTP_409_CONFLICT)
+            response["Retry-After"] = "1"
+            return response
+        if record is not None:
+            return replay(record)
+
+        claimed = IdempotencyKey.objects.filter(user=request.user, key=key, status_code=None)
+        try:
+            response = method(view, request, *args, **kwargs)
+        except Exception:
+            claimed.delete()
+            raise
+        if response.status_code >= 500:
+            claimed.delete()
+            return response
+
+        if isinstance(response, Response):
+            body = FastJSONRenderer().render(response.data) if response.data is not None else b""
+        else:
+            body = response.content
+        claimed.update(status_code=response.status_code, body=body)
+        return response
+    return wrapper
+
+
+def purge_expired(batch_size=None):
+    """Delete expired keys, `batch_size` rows per statement
+
+    Returns:
+        int -- rows deleted
+    """
+    batch_size = batch_size or get_config()["PURGE_BATCH"]
+    deleted = 0
+    while True:
+        ids = list(IdempotencyKey.objects.filter(expires_at__lte=timezone.now())
+                   .values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+
+
+last_purge = None
+purge_lock = threading.Lock()
+
+
+def purge_if_due():
+    """purge_expired() if PURGE_INTERVAL has passed since this process last did"""
+    global last_purge  # pylint: disable=global-statement
+    interval = get_config()["PURGE_INTERVAL"]
+    if interval is None:
+        return 0
+    with purge_lock:
+        now = time.monotonic()
+        if last_purge is not None and now - last_purge < interval:
+            return 0
+        last_purge = now
+    return purge_expired()
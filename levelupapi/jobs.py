@@ -0,0 +1,234 @@
+"""Background jobs for work that follows a write
+
+enqueue() stores a Job row in the caller's transaction and, once that
+commits, hands it to a thread pool in the same process, so the request
+that caused it returns without waiting. A rolled back write takes its jobs
+with it.
+
+The pool is bounded: WORKERS threads and at most QUEUE_SIZE jobs waiting
+for one. A job that doesn't fit, or whose process stops before it ran, is
+left in the table for the run_jobs command, which also takes over jobs
+stuck running for LOCK_TIMEOUT seconds. Either runner claims a job with a
+conditional UPDATE, so it runs in one place only.
+
+Handlers manage their own transactions. They aren't wrapped in one: with
+BEGIN IMMEDIATE (levelupapi.sqlite) that would hold the database's write
+lock for the whole handler, sending mail included, and stall every
+request's writes behind it. Keep atomic blocks to the writes, and do slow
+work outside them. A job may run again after failing partway, so handlers
+should be safe to repeat.
+
+A failed job is retried after BACKOFF seconds, doubling with each attempt
+up to BACKOFF_MAX, and is marked failed after MAX_ATTEMPTS; failed jobs
+are kept with their last error.
+
+Handlers are registered by name with @job and take the keyword arguments
+given to enqueue(), which have to be JSON serializable.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from levelupapi.models import Job
+
+logger = logging.getLogger("levelupapi.jobs")
+
+JOB_DEFAULTS = {
+    # Threads running jobs in each process; 0 leaves every job to run_jobs
+    "WORKERS": 2,
+    # Jobs waiting for a thread before new ones are left to run_jobs
+    "QUEUE_SIZE": 100,
+    "MAX_ATTEMPTS": 5,
+    # Seconds before the first retry, doubled for each one after
+    "BACKOFF": 2,
+    "BACKOFF_MAX": 300,
+    # Seconds after which a running job is presumed lost with its process
+    "LOCK_TIMEOUT": 300,
+    # Seconds finished jobs are kept
+    "KEEP_DONE": 24 * 60 * 60,
+}
+
+
+def get_config():
+    return {**JOB_DEFAULTS, **getattr(settings, "LEVELUP_JOBS", {})}
+
+
+registry = {}
+
+
+def job(name):
+    """Register a function as the handler for jobs called `name`"""
+    def register(func):
+        registry[name] = func
+        return func
+    return register
+
+
+def enqueue(name, **args):
+    """Store a job and run it in the background once the current transaction commits
+
+    Returns:
+        Job -- the stored job
+    """
+    if name not in registry:
+        raise LookupError(f"No job handler registered as {name!r}")
+    record = Job.objects.create(name=name, args=args, max_attempts=get_config()["MAX_ATTEMPTS"])
+    transaction.on_commit(partial(submit, record.pk))
+    return record
+
+
+# Name -> (job id, args) of the last job enqueue_merged() stored in this thread
+merged_jobs = threading.local()
+
+
+def enqueue_merged(name, **id_lists):
+    """enqueue() for a handler taking lists of ids, adding to the last one still waiting
+
+    While the job this thread last stored under `name` hasn't started, the
+    new ids are added to its lists instead of storing another, so a cascade
+    that fires a signal per row leaves one job rather than one per row. A
+    job that was rolled back, or has been claimed, is no longer pending and
+    a new one is stored.
+    """
+    waiting = getattr(merged_jobs, "jobs", None)
+    if waiting is None:
+        waiting = merged_jobs.jobs = {}
+    if name in waiting:
+        job_id, args = waiting[name]
+        merged = {key: sorted(set(args.get(key, ())) | set(ids)) for key, ids in {**args, **id_lists}.items()}
+        if Job.objects.filter(pk=job_id, status=Job.PENDING, attempts=0).update(args=merged):
+            waiting[name] = (job_id, merged)
+            return
+    args = {key: sorted(set(ids)) for key, ids in id_lists.items()}
+    waiting[name] = (enqueue(name, **args).pk, args)
+
+
+def backoff(attempts, config):
+    """Seconds to wait before retrying a job that has failed `attempts` times"""
+    return min(config["BACKOFF"] * 2 ** (attempts - 1), config["BACKOFF_MAX"])
+
+
+def run_job(job_id):
+    """Run a job if it's due and no one else has claimed it
+
+    Returns:
+        float -- seconds until its retry if it failed and has attempts
+        left, otherwise None
+    """
+    now = timezone.now()
+    claimed = Job.objects.filter(pk=job_id, status=Job.PENDING, run_after__lte=now).update(
+        status=Job.RUNNING, started_at=now, attempts=F("attempts") + 1)
+    if not claimed:
+        return None
+    record = Job.objects.get(pk=job_id)
+    try:
+        handler = registry.get(record.name)
+        if handler is None:
+            raise LookupError(f"No job handler registered as {record.name!r}")
+        handler(**record.args)
+    except Exception as ex:  # pylint: disable=broad-except
+        return failed(record, ex)
+    Job.objects.filter(pk=job_id).update(status=Job.DONE, finished_at=timezone.now(), last_error="")
+    return None
+
+
+def failed(record, ex):
+    """Schedule a failed job's retry, or give up on it"""
+    error = f"{type(ex).__name__}: {ex}"
+    now = timezone.now()
+    jobs = Job.objects.filter(pk=record.pk)
+    if record.attempts >= record.max_attempts:
+        jobs.update(status=Job.FAILED, finished_at=now, last_error=error)
+        logger.error("Job %s (%s) failed after %d attempts: %s", record.pk, record.name, record.attempts, error)
+        return None
+    delay = backoff(record.attempts, get_config())
+    jobs.update(status=Job.PENDING, run_after=now + timedelta(seconds=delay), last_error=error)
+    logger.warning("Job %s (%s) failed, retrying in %ss: %s", record.pk, record.name, delay, error)
+    return delay
+
+
+def release_stale():
+    """Hand back jobs left running by a process that stopped
+
+    Returns:
+        int -- how many were released
+    """
+    config = get_config()
+    stale = Job.objects.filter(
+        status=Job.RUNNING, started_at__lt=timezone.now() - timedelta(seconds=config["LOCK_TIMEOUT"]))
+    stale.filter(attempts__gte=F("max_attempts")).update(
+        status=Job.FAILED, finished_at=timezone.now(), last_error="Lost while running")
+    return stale.update(status=Job.PENDING)
+
+
+def due_jobs(limit):
+    """Ids of up to `limit` jobs ready to run, oldest first"""
+    return list(Job.objects.filter(status=Job.PENDING, run_after__lte=timezone.now())
+                .order_by("run_after", "id").values_list("id", flat=True)[:limit])
+
+
+def purge_finished():
+    """Delete jobs that finished more than KEEP_DONE seconds ago; failed ones are kept"""
+    cutoff = timezone.now() - timedelta(seconds=get_config()["KEEP_DONE"])
+    deleted, _ = Job.objects.filter(status=Job.DONE, finished_at__lt=cutoff).delete()
+    return deleted
+
+
+class Executor:
+    """A bounded thread pool running jobs in this process"""
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="levelup-job")
+        self.slots = threading.BoundedSemaphore(workers + queue_size)
+
+    def submit(self, job_id):
+        """Queue a job; False when the pool is full and it's left to run_jobs"""
+        if not self.slots.acquire(blocking=False):
+            return False
+        self.pool.submit(self.run, job_id)
+        return True
+
+    def run(self, job_id):
+        # Pool threads aren't requests, so they age out their own connections
+        close_old_connections()
+        try:
+            retry_in = run_job(job_id)
+        except Exception:  # pylint: disable=broad-except
+            # The database is unreachable; the job stays where run_jobs finds it
+            logger.exception("Couldn't run job %s", job_id)
+            retry_in = None
+        finally:
+            close_old_connections()
+            self.slots.release()
+        if retry_in is not None:
+            timer = threading.Timer(retry_in, self.submit, [job_id])
+            timer.daemon = True
+            timer.start()
+
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor(config):
+    """This process's executor, started on first use; None when WORKERS is 0"""
+    global executor  # pylint: disable=global-statement
+    if not config["WORKERS"]:
+        return None
+    with executor_lock:
+        if executor is None or executor.workers != config["WORKERS"]:
+            executor = Executor(config["WORKERS"], config["QUEUE_SIZE"])
+        return executor
+
+
+def submit(job_id):
+    """Run a stored job in the background, if this process has room for it"""
+    pool = get_executor(get_config())
+    if pool is None or not pool.submit(job_id):
+        logger.debug("Job %s left for run_jobs", job_id)
@@ -0,0 +1,339 @@
+"""Drive every API route through the Django test client and report latency
+
+Requests run as they would in production, each write committing on its
+own, so commit hooks (response cache invalidation, jobs, stream messages)
+take place and are timed. Rows the write routes created are deleted and
+the rows they changed put back afterwards, unless --keep is given.
+"""
+import json
+import math
+import platform
+import subprocess
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+import django
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from levelupapi.caching import get_config
+from levelupapi.models import Event, EventGamer, Game, GameType
+from levelupapi.management.commands.seed_data import SEED_PASSWORD
+from levelupapi.pubsub import event_hub
+
+# Tables the write routes insert into, in the order their new rows are deleted
+WRITTEN_MODELS = (EventGamer, Event, Game, GameType, User)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not samples:
+        return None
+    return samples[max(0, math.ceil(pct / 100 * len(samples)) - 1)]
+
+
+class CaptureAllQueries(ExitStack):
+    """CaptureQueriesContext over every configured database, replicas included"""
+
+    def __enter__(self):
+        super().__enter__()
+        self.contexts = [self.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        return self
+
+    def __len__(self):
+        return sum(len(context.captured_queries) for context in self.contexts)
+
+
+class Command(BaseCommand):
+    help = "Benchmark every route in levelup/urls.py and write the results as JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Timed requests per route")
+        parser.add_argument("--warmup", type=int, default=3, help="Untimed requests per route first")
+        parser.add_argument("--user", help="Username to authenticate as (default: first user with a token)")
+        parser.add_argument("--host", default="localhost", help="Host header; must be in ALLOWED_HOSTS")
+        parser.add_argument("--cold", action="store_true",
+                            help="Clear the response cache before every request")
+        parser.add_argument("--only", help="Comma separated scenario names to run")
+        parser.add_argument("--output", help="Write the JSON results to this file")
+        parser.add_argument("--compare", help="Previous results file to print deltas against")
+        parser.add_argument("--keep", action="store_true",
+                            help="Keep rows created by write routes instead of rolling back")
+
+    def handle(self, *args, **options):
+        tokens = Token.objects.select_related("user").order_by("user_id")
+        if options["user"]:
+            tokens = tokens.filter(user__username=options["user"])
+        token = tokens.first()
+        if token is None:
+            raise CommandError("No user with a token found; run seed_data first")
+        if not (Event.objects.exists() and Game.objects.exists()):
+            raise CommandError("Benchmarks need at least one game and one event; run seed_data first")
+
+        self.token = token
+        self.client = Client(HTTP_AUTHORIZATION=f"Token {token.key}", HTTP_HOST=options["host"])
+        self.anonymous = Client(HTTP_HOST=options["host"])
+        self.user = token.user
+        self.options = options
+
+        scenarios = self.scenarios()
+        if options["only"]:
+            wanted = set(options["only"].split(","))
+            scenarios = [scenario for scenario in scenarios if scenario["name"] in wanted]
+
+        results = {}
+        last_ids = {model: model.objects.aggregate(last=Max("id"))["last"] or 0 for model in WRITTEN_MODELS}
+        try:
+            # Latency is what's measured; repeated logins and writes would
+            # mostly measure the throttles' 429s. Event updates email their
+            # attendees from a job; the mail is dropped.
+            with override_settings(LEVELUP_THROTTLE={"ENABLED": False},
+                                   EMAIL_BACKEND="django.core.mail.backends.dummy.EmailBackend"):
+                for scenario in scenarios:
+                    results[scenario["name"]] = self.run_scenario(scenario)
+                    self.stdout.write(self.format_row(scenario["name"], results[scenario["name"]]))
+        finally:
+            if not options["keep"]:
+                self.undo_writes(last_ids)
+
+        report = {"meta": self.meta(), "results": results}
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if options["compare"]:
+            self.compare(options["compare"], results)
+
+    def scenarios(self):
+        """One entry per route; path and body are functions of the iteration"""
+        game_type_ids = list(GameType.objects.values_list("id", flat=True)[:50])
+        game_ids = list(Game.objects.values_list("id", flat=True)[:50])
+        event_ids = list(Event.objects.values_list("id", flat=True)[:500])
+        own_game = Game.objects.filter(creator=self.user).first()
+        own_event = Event.objects.filter(organizer=self.user).first()
+        # Saved again by undo_writes(), as they were before the updates
+        self.updated = [row for row in (own_game, own_event) if row is not None]
+        free_events = list(
+            Event.objects.exclude(attendees=self.user).values_list("id", flat=True)[:500])
+        run_id = uuid.uuid4().hex[:8]
+
+        def pick(ids):
+            return lambda i: ids[i % len(ids)]
+
+        game_body = lambda i: {
+            "name": f"Bench game {i}", "manufacturer": "Bench", "number_of_players": 4,
+            "type": game_type_ids[i % len(game_type_ids)],
+        }
+        event_body = lambda i: {
+            "name": f"Bench event {i}", "date": "2025-06-01", "time": "19:00",
+            "location": "Bench", "game": game_ids[i % len(game_ids)],
+        }
+
+        scenarios = [
+            {"name": "gametypes.list", "method": "get", "path": lambda i: "/gametypes"},
+            {"name": "gametypes.retrieve", "method": "get",
+             "path": lambda i: f"/gametypes/{pick(game_type_ids)(i)}"},
+            {"name": "games.list", "method": "get", "path": lambda i: "/games"},
+            {"name": "games.retrieve", "method": "get", "path": lambda i: f"/games/{pick(game_ids)(i)}"},
+            {"name": "events.list", "method": "get", "path": lambda i: "/events"},
+            {"name": "events.list_by_game", "method": "get",
+             "path": lambda i: f"/events?game={pick(game_ids)(i)}"},
+            {"name": "events.retrieve", "method": "get", "path": lambda i: f"/events/{pick(event_ids)(i)}"},
+            {"name": "stats.games.list", "method": "get", "path": lambda i: "/stats/games"},
+            {"name": "stats.games.retrieve", "method": "get",
+             "path": lambda i: f"/stats/games/{pick(game_ids)(i)}"},
+            {"name": "stats.users.list", "method": "get", "path": lambda i: "/stats/users"},
+            {"name": "stats.users.retrieve", "method": "get", "path": lambda i: f"/stats/users/{self.user.id}"},
+            {"name": "me.dashboard", "method": "get", "path": lambda i: "/me/dashboard"},
+            # Publish to delivery on an open connection, through the ASGI handler
+            {"name": "events.stream", "stream": True, "event": pick(event_ids)},
+            {"name": "games.create", "method": "post", "path": lambda i: "/games", "body": game_body},
+            {"name": "events.create", "method": "post", "path": lambda i: "/events", "body": event_body},
+        ]
+        if own_game is not None:
+            scenarios.append({"name": "games.update", "method": "put",
+                              "path": lambda i: f"/games/{own_game.id}", "body": game_body})
+        if own_event is not None:
+            scenarios.append({"name": "events.update", "method": "put",
+                              "path": lambda i: f"/events/{own_event.id}", "body": event_body})
+        if free_events:
+            scenarios += [
+                {"name": "events.signup.join", "method": "post",
+                 "path": lambda i: f"/events/{pick(free_events)(i)}/signup"},
+                {"name": "events.signup.leave", "method": "delete",
+                 "path": lambda i: f"/events/{pick(free_events)(i)}/signup"},
+            ]
+        scenarios += [
+            {"name": "login", "method": "post", "path": lambda i: "/login", "anonymous": True,
+             "body": lambda i: {"username": self.user.username, "password": SEED_PASSWORD}},
+            {"name": "register", "method": "post", "path": lambda i: "/register", "anonymous": True,
+             "body": lambda i: {"username": f"bench_{run_id}_{i}", "password": "bench-password",
+                                "first_name": "Bench", "last_name": "User",
+                                "email": f"bench_{run_id}_{i}@example.com"}},
+        ]
+        return scenarios
+
+    def request(self, scenario, i):
+        client = self.anonymous if scenario.get("anonymous") else self.client
+        body = scenario["body"](i) if "body" in scenario else None
+        method = getattr(client, scenario["method"])
+        if body is None:
+            return method(scenario["path"](i))
+        return method(scenario["path"](i), json.dumps(body), content_type="application/json")
+
+    def run_scenario(self, scenario):
+        if scenario.get("stream"):
+            return async_to_sync(self.run_stream)(scenario)
+        response_cache = caches[get_config()["CACHE"]]
+        iteration = 0
+        for _ in range(self.options["warmup"]):
+            self.request(scenario, iteration)
+            iteration += 1
+
+        timings = []
+        queries = []
+        sizes = []
+        statuses = {}
+        for _ in range(self.options["requests"]):
+            if self.options["cold"]:
+                response_cache.clear()
+            with CaptureAllQueries() as captured:
+                started = time.perf_counter()
+                response = self.request(scenario, iteration)
+                content = b"".join(response.streaming_content) if response.streaming else response.content
+                timings.append((time.perf_counter() - started) * 1000)
+            iteration += 1
+            queries.append(len(captured))
+            sizes.append(len(content))
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+        # Memory is measured on a separate request so tracing doesn't skew timings
+        if self.options["cold"]:
+            response_cache.clear()
+        tracemalloc.start()
+        self.request(scenario, iteration)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return self.summarize(timings, queries, sizes, statuses, peak)
+
+    async def run_stream(self, scenario):
+        """Time from event_hub.publish() to the message arriving on an open /events/stream"""
+        # A scope of our own: get() always sends Host: testserver
+        response = await AsyncClient().request(
+            method="GET", path="/events/stream", query_string="", scheme="http",
+            server=(self.options["host"], "80"),
+            headers=[(b"host", self.options["host"].encode()),
+                     (b"authorization", f"Token {self.token.key}".encode())],
+        )
+        statuses = {str(response.status_code): 1}
+        if not response.streaming:
+            return self.summarize([], [], [], statuses, 0)
+        frames = response.streaming_content.__aiter__()
+        try:
+            # The reconnect delay comes first
+            await frames.__anext__()
+            timings = []
+            queries = []
+            sizes = []
+            peak = 0
+            for iteration in range(self.options["warmup"] + self.options["requests"] + 1):
+                event = Event.objects.filter(pk=scenario["event"](iteration)).values("id", "game_id")
+                event = await event.afirst()
+                traced = iteration == self.options["warmup"] + self.options["requests"]
+                if traced:
+                    tracemalloc.start()
+                started = time.perf_counter()
+                event_hub.publish("event.updated", event["id"], event["game_id"])
+                frame = await frames.__anext__()
+                elapsed = (time.perf_counter() - started) * 1000
+                if traced:
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                elif iteration >= self.options["warmup"]:
+                    timings.append(elapsed)
+                    # Delivery reads nothing from the database
+                    queries.append(0)
+                    sizes.append(len(frame))
+        finally:
+            await frames.aclose()
+            response.close()
+        return self.summarize(timings, queries, sizes, statuses, peak)
+
+    def summarize(self, timings, queries, sizes, statuses, peak):
+        timings.sort()
+        return {
+            "requests": len(timings),
+            "status": statuses,
+            "p50_ms": percentile(timings, 50),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "mean_ms": sum(timings) / len(timings) if timings else None,
+            "max_ms": timings[-1] if timings else None,
+            "queries_mean": sum(queries) / len(queries) if queries else None,
+            "queries_max": max(queries) if queries else None,
+            "bytes_mean": sum(sizes) / len(sizes) if sizes else None,
+            "peak_memory_kb": peak / 1024,
+        }
+
+    def undo_writes(self, last_ids):
+        """Delete the rows created since `last_ids` and save the updated ones as they were
+
+        Deletes go through the ORM, so the stats tables, response cache
+        and change feed follow them like any other write.
+        """
+        for model in WRITTEN_MODELS:
+            model.objects.filter(id__gt=last_ids[model]).delete()
+        for row in getattr(self, "updated", ()):
+            row.save()
+
+    def meta(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "requests_per_route": self.options["requests"],
+            "cold_cache": self.options["cold"],
+            "rows": {
+                "games": Game.objects.count(),
+                "events": Event.objects.count(),
+                "attendance": EventGamer.objects.count(),
+            },
+        }
+
+    def format_row(self, name, result):
+        def ms(value):
+            return "-" if value is None else f"{value:8.2f}"
+        return (f"{name:<22} p50 {ms(result['p50_ms'])}ms  p95 {ms(result['p95_ms'])}ms  "
+                f"p99 {ms(result['p99_ms'])}ms  queries {result['queries_mean'] or 0:6.1f}  "
+                f"peak {result['peak_memory_kb']:9.1f}KB  status {result['status']}")
+
+    def compare(self, path, results):
+        with open(path, encoding="utf-8") as previous_file:
+            previous = json.load(previous_file)["results"]
+        self.stdout.write(f"\nChange against {path} (p50 / p95 / queries)")
+        for name, result in results.items():
+            before = previous.get(name)
+            if not before:
+                continue
+            deltas = []
+            for key in ("p50_ms", "p95_ms", "queries_mean"):
+                if before.get(key):
+                    deltas.append(f"{(result[key] - before[key]) / before[key] * 100:+7.1f}%")
+                else:
+                    deltas.append("      -")
+            self.stdout.write(f"{name:<22} {'  '.join(deltas)}")
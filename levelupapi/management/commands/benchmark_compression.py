@@ -0,0 +1,49 @@
+"""Bytes on the wire and CPU per request for each response encoding"""
+import time
+from django.core.management.base import BaseCommand
+from levelupapi.caching import get_cache, make_etag
+from levelupapi.compression import ENCODINGS, brotli, cached_variant, compress, variant_key
+from levelupapi.renderers import FastJSONRenderer
+from .benchmark_json import event_payload, game_payload
+
+
+class Command(BaseCommand):
+    help = "Compare response sizes and compression time for /events and /games sized payloads"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", default="5,50,1000,10000", help="Comma separated payload sizes")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per case; the best one is reported")
+
+    def handle(self, *args, **options):
+        if brotli is None:
+            self.stdout.write(self.style.WARNING("brotli isn't installed; only gzip is measured"))
+
+        cache = get_cache()
+        for rows in (int(size) for size in options["rows"].split(",")):
+            for name, build in (("events", event_payload), ("games", game_payload)):
+                body = FastJSONRenderer().render(build(rows))
+                etag = make_etag(body)
+                self.stdout.write(f"{name:<7} rows {rows:>6}  identity {self.size(len(body))}")
+                for encoding in ENCODINGS:
+                    per_request = self.best_of(options["repeat"], lambda: compress(body, encoding))
+                    once = self.best_of(1, lambda: compress(body, encoding, cached=True))
+                    cache.delete(variant_key(etag, encoding))
+                    cached_variant(cache, body, etag, encoding, None)
+                    hit = self.best_of(options["repeat"], lambda: cached_variant(cache, body, etag, encoding, None))
+                    cache.delete(variant_key(etag, encoding))
+                    self.stdout.write(
+                        f"  {encoding:<5} per request {self.size(len(compress(body, encoding)))} "
+                        f"{per_request:8.2f}ms   cached {self.size(len(compress(body, encoding, cached=True)))} "
+                        f"{once:8.2f}ms once, {hit:6.3f}ms per hit"
+                    )
+
+    def size(self, count):
+        return f"{count / 1024:9.1f}KB" if count >= 1024 else f"{count:>9}B "
+
+    def best_of(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
@@ -0,0 +1,90 @@
+"""Compare DRF's stdlib JSON renderer/parser with the orjson backed ones"""
+import gc
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from levelupapi.parsers import FastJSONParser
+from levelupapi.renderers import FastJSONRenderer, orjson
+from levelupapi.fast_serializers import format_date, format_time
+
+
+def event_payload(rows):
+    """Rows shaped like the /events list response"""
+    start = datetime(2025, 1, 1, 18, 30)
+    data = []
+    for i in range(rows):
+        date_time = start + timedelta(minutes=15 * i)
+        data.append({
+            "id": i + 1,
+            "name": f"Dragon Night {i}",
+            "date": format_date(date_time),
+            "time": format_time(date_time),
+            "location": "Board Games Cafe",
+            "organizer": {"id": i % 100 + 1, "full_name": "Quest Player7"},
+            "game": {"id": i % 1000 + 1, "name": f"Castle Empire {i % 1000}"},
+            "attendees": [{"id": j + 1, "full_name": f"Galaxy Player{j}"} for j in range(i % 6)],
+            "attendee_count": i % 6,
+        })
+    return data
+
+
+def game_payload(rows):
+    """Rows shaped like the /games list response"""
+    return [
+        {
+            "id": i + 1,
+            "name": f"Castle Empire {i}",
+            "manufacturer": "Asmodee",
+            "number_of_players": i % 8 + 1,
+            "type": {"id": i % 10 + 1, "label": f"Strategy type {i % 10}"},
+            "creator": {"id": i % 100 + 1, "full_name": "Quest Player7"},
+        }
+        for i in range(rows)
+    ]
+
+
+class Command(BaseCommand):
+    help = "Time rendering and parsing /events and /games sized payloads with both JSON backends"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", default="1000,10000,100000", help="Comma separated payload sizes")
+        parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the best one is reported")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson isn't installed; both paths use the stdlib"))
+
+        for rows in (int(size) for size in options["rows"].split(",")):
+            for name, build in (("events", event_payload), ("games", game_payload)):
+                data = build(rows)
+                body = JSONRenderer().render(data)
+                if FastJSONRenderer().render(data) != body:
+                    raise CommandError(f"{name}: FastJSONRenderer output differs from JSONRenderer")
+
+                render_slow = self.best_of(options["repeat"], lambda: JSONRenderer().render(data))
+                render_fast = self.best_of(options["repeat"], lambda: FastJSONRenderer().render(data))
+                parse_slow = self.best_of(options["repeat"], lambda: JSONParser().parse(BytesIO(body)))
+                parse_fast = self.best_of(options["repeat"], lambda: FastJSONParser().parse(BytesIO(body)))
+                self.stdout.write(
+                    f"{name:<7} rows {rows:>7}  {len(body) / 1024:9.0f}KB  "
+                    f"render {render_slow:8.1f} -> {render_fast:7.1f}ms ({render_slow / render_fast:4.1f}x)  "
+                    f"parse {parse_slow:8.1f} -> {parse_fast:7.1f}ms ({parse_slow / parse_fast:4.1f}x)"
+                )
+
+    def best_of(self, repeat, run):
+        # Collections triggered by the objects a parse allocates would
+        # otherwise swamp the decoder time on large payloads
+        timings = []
+        for _ in range(repeat):
+            gc.collect()
+            gc.disable()
+            try:
+                started = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - started) * 1000)
+            finally:
+                gc.enable()
+        return min(timings)
@@ -0,0 +1,46 @@
+"""Compare the DRF serializers with the fast list serializers"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from levelupapi.fast_serializers import serialize_events, serialize_games
+from levelupapi.views import EventView, GameView
+from levelupapi.views.events import EventSerializer
+from levelupapi.views.games import GameSerializer
+
+
+class Command(BaseCommand):
+    help = "Time EventSerializer/GameSerializer against serialize_events/serialize_games"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000, help="Rows to serialize per run")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per path; the best one is reported")
+
+    def handle(self, *args, **options):
+        cases = (
+            ("events", EventView().get_queryset().order_by("id")[:options["rows"]],
+             EventSerializer, serialize_events),
+            ("games", GameView().get_queryset().order_by("id")[:options["rows"]],
+             GameSerializer, serialize_games),
+        )
+        renderer = JSONRenderer()
+        for name, queryset, serializer_class, fast in cases:
+            slow_body = renderer.render(serializer_class(queryset.all(), many=True).data)
+            fast_body = renderer.render(fast(queryset.all()))
+            if slow_body != fast_body:
+                raise CommandError(f"{name}: fast serializer output differs from {serializer_class.__name__}")
+
+            slow_ms = self.best_of(options["repeat"], lambda: serializer_class(queryset.all(), many=True).data)
+            fast_ms = self.best_of(options["repeat"], lambda: fast(queryset.all()))
+            rows = queryset.count()
+            self.stdout.write(
+                f"{name:<7} rows {rows:>7}  {serializer_class.__name__} {slow_ms:9.1f}ms  "
+                f"{fast.__name__} {fast_ms:9.1f}ms  speedup {slow_ms / fast_ms:5.1f}x"
+            )
+
+    def best_of(self, repeat, run):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
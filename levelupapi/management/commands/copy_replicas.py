@@ -0,0 +1,30 @@
+"""Refresh the local SQLite read replicas from the primary"""
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from levelupapi.replicas import copy_to_replica, get_config
+
+
+class Command(BaseCommand):
+    help = "Copy the primary database over every replica in LEVELUP_REPLICAS, once or every --interval seconds"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--interval", type=float, default=None,
+                            help="Keep copying, this many seconds apart (the replicas' lag)")
+
+    def handle(self, *args, **options):
+        aliases = get_config()["ALIASES"]
+        if not aliases:
+            raise CommandError("No replicas configured; set LEVELUP_REPLICA_FILES")
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError("copy_replicas stands in for replication of a SQLite primary only")
+
+        while True:
+            started = time.perf_counter()
+            for alias in aliases:
+                path = copy_to_replica(alias)
+                self.stdout.write(f"{alias}: copied to {path}")
+            self.stdout.write(f"Copied in {(time.perf_counter() - started) * 1000:.0f}ms")
+            if options["interval"] is None:
+                return
+            time.sleep(options["interval"])
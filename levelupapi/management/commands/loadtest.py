@@ -0,0 +1,119 @@
+"""Fire concurrent requests at a running server and report throughput
+
+Run it once against each deployment to compare them, e.g.
+
+    gunicorn levelup.wsgi -w 4
+    python manage.py loadtest --label wsgi --output wsgi.json
+
+    uvicorn levelup.asgi:application --workers 4
+    python manage.py loadtest --label asgi --compare wsgi.json
+"""
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from levelupapi.management.commands.benchmark import percentile
+
+
+class Command(BaseCommand):
+    help = "Measure concurrent-request throughput of a running levelup server"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the server")
+        parser.add_argument("--paths", default="/gametypes,/games,/events",
+                            help="Comma separated paths, requested in turn")
+        parser.add_argument("--requests", type=int, default=2000, help="Total timed requests")
+        parser.add_argument("--warmup", type=int, default=50, help="Untimed requests first")
+        parser.add_argument("--concurrency", type=int, default=32, help="Requests in flight at once")
+        parser.add_argument("--user", help="Username to authenticate as (default: first user with a token)")
+        parser.add_argument("--label", default="run", help="Name for this run in the output")
+        parser.add_argument("--output", help="Write the JSON results to this file")
+        parser.add_argument("--compare", help="Previous results file to print the throughput ratio against")
+
+    def handle(self, *args, **options):
+        tokens = Token.objects.order_by("user_id")
+        if options["user"]:
+            tokens = tokens.filter(user__username=options["user"])
+        token = tokens.first()
+        if token is None:
+            raise CommandError("No user with a token found; run seed_data first")
+
+        url = urlsplit(options["url"])
+        self.address = (url.hostname, url.port or 80)
+        self.headers = {"Authorization": f"Token {token.key}", "Accept": "application/json"}
+        paths = [url.path.rstrip("/") + path for path in options["paths"].split(",")]
+
+        self.run_requests(list(islice(cycle(paths), options["warmup"])), options["concurrency"])
+        started = time.perf_counter()
+        samples = self.run_requests(list(islice(cycle(paths), options["requests"])), options["concurrency"])
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(sample[1] for sample in samples)
+        statuses = {}
+        for status_code, _ in samples:
+            statuses[str(status_code)] = statuses.get(str(status_code), 0) + 1
+        result = {
+            "label": options["label"],
+            "url": options["url"],
+            "paths": paths,
+            "concurrency": options["concurrency"],
+            "requests": len(samples),
+            "seconds": round(elapsed, 3),
+            "requests_per_second": round(len(samples) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "statuses": statuses,
+        }
+        self.stdout.write(
+            f"{result['label']:<8} {result['requests_per_second']:>8} req/s  "
+            f"p50 {result['p50_ms']:>7}ms  p95 {result['p95_ms']:>7}ms  p99 {result['p99_ms']:>7}ms  "
+            f"statuses {statuses}"
+        )
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as file:
+                before = json.load(file)
+            self.stdout.write(
+                f"{result['label']} vs {before['label']}: "
+                f"{result['requests_per_second'] / before['requests_per_second']:.2f}x throughput, "
+                f"p95 {result['p95_ms']}ms vs {before['p95_ms']}ms"
+            )
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(result, file, indent=2)
+
+    def run_requests(self, paths, concurrency):
+        """Send every request with `concurrency` client threads
+
+        Returns:
+            list -- (status, milliseconds) per request; status 0 is a connection error
+        """
+        local = threading.local()
+
+        def send(path):
+            started = time.perf_counter()
+            try:
+                if getattr(local, "connection", None) is None:
+                    local.connection = http.client.HTTPConnection(*self.address, timeout=30)
+                local.connection.request("GET", path, headers=self.headers)
+                response = local.connection.getresponse()
+                response.read()
+                status_code = response.status
+                if response.will_close:
+                    local.connection.close()
+                    local.connection = None
+            except (OSError, http.client.HTTPException):
+                status_code = 0
+                if getattr(local, "connection", None) is not None:
+                    local.connection.close()
+                local.connection = None
+            return status_code, (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(send, paths))
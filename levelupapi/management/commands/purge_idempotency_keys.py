@@ -0,0 +1,15 @@
+"""Delete expired Idempotency-Key rows"""
+from django.core.management.base import BaseCommand
+from levelupapi.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = "Delete Idempotency-Key records past their expiry, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None,
+                            help="Rows per DELETE (defaults to LEVELUP_IDEMPOTENCY's PURGE_BATCH)")
+
+    def handle(self, *args, **options):
+        deleted = purge_expired(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
@@ -0,0 +1,44 @@
+"""Recreate and repopulate the full-text game search index"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from levelupapi.caching import bump_version
+from levelupapi.models import Game
+from levelupapi.search import (DROP_INDEX_SQL, create_index, forget_fts, missing_triggers, rebuild_index,
+                               table_exists)
+
+
+class Command(BaseCommand):
+    help = "Rebuild levelupapi_game_fts from levelupapi_game"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recreate", action="store_true",
+                            help="Drop the FTS table and triggers and create them again first")
+
+    def handle(self, *args, **options):
+        if options["recreate"] and connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                for statement in DROP_INDEX_SQL:
+                    cursor.execute(statement)
+            forget_fts()
+
+        missing = []
+        if connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                if table_exists(cursor):
+                    missing = missing_triggers(cursor)
+
+        # Creates the table and triggers if they are missing, e.g. after a
+        # table rebuild dropped the triggers
+        if not create_index():
+            self.stdout.write(self.style.WARNING(
+                "FTS5 is not available on this database; game search uses LIKE matching"))
+            return
+        if missing:
+            # Writes made since they went missing never reached the index;
+            # the rebuild below catches it up
+            self.stdout.write(self.style.WARNING(f"Recreated missing triggers: {', '.join(missing)}"))
+
+        rebuild_index()
+        # Cached /games?q= responses may have come from a stale index
+        bump_version(Game)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {Game.objects.count()} games"))
@@ -0,0 +1,37 @@
+"""Recompute the per-game and per-user statistics tables and report drift"""
+from django.core.management.base import BaseCommand, CommandError
+from levelupapi.stats import compute_stats, find_drift, rebuild_stats, stored_stats
+
+TABLES = ("game stats", "user stats", "game players")
+
+
+class Command(BaseCommand):
+    help = "Rebuild GameStats, UserStats and GamePlayer from events, games and signups"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true",
+                            help="Only report drift, and fail if there is any, without rewriting")
+        parser.add_argument("--show", type=int, default=10,
+                            help="Drifted rows to print per table")
+
+    def handle(self, *args, **options):
+        computed = compute_stats()
+        drifted = 0
+        for label, expected, stored in zip(TABLES, computed, stored_stats()):
+            drift = find_drift(expected, stored)
+            drifted += len(drift)
+            if not drift:
+                continue
+            self.stdout.write(self.style.WARNING(f"{label}: {len(drift)} of {len(expected)} rows drifted"))
+            for key, want, have in drift[:options["show"]]:
+                self.stdout.write(f"  {key}: expected {want}, stored {have}")
+
+        if options["check"]:
+            if drifted:
+                raise CommandError(f"{drifted} stats rows drifted; run rebuild_stats to fix them")
+            self.stdout.write(self.style.SUCCESS("Stats are up to date"))
+            return
+
+        rebuild_stats(computed)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats for {len(computed[0])} games and {len(computed[1])} users ({drifted} rows had drifted)"))
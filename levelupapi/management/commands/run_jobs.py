@@ -0,0 +1,41 @@
+"""Run background jobs left in the Job table, and purge what has expired"""
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from levelupapi.idempotency import purge_if_due
+from levelupapi.jobs import due_jobs, purge_finished, release_stale, run_job
+
+
+class Command(BaseCommand):
+    help = ("Run due jobs: retries, jobs a full queue left behind and jobs a stopped process didn't finish. "
+            "Keeps polling every --interval seconds unless --once is given")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Run what's due now, then exit")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls")
+        parser.add_argument("--batch-size", type=int, default=100, help="Jobs fetched per poll")
+
+    def handle(self, *args, **options):
+        last_purge = None
+        while True:
+            close_old_connections()
+            released = release_stale()
+            if released:
+                self.stdout.write(f"Released {released} stale jobs")
+            ran = 0
+            for job_id in due_jobs(options["batch_size"]):
+                run_job(job_id)
+                ran += 1
+            if ran:
+                self.stdout.write(f"Ran {ran} jobs")
+            if last_purge is None or time.monotonic() - last_purge > 60:
+                purge_finished()
+                last_purge = time.monotonic()
+            # Expired Idempotency-Key rows, every PURGE_INTERVAL
+            purged = purge_if_due()
+            if purged:
+                self.stdout.write(f"Deleted {purged} expired idempotency keys")
+            if options["once"] and ran < options["batch_size"]:
+                return
+            if not ran:
+                time.sleep(options["interval"])
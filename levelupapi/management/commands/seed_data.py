@@ -0,0 +1,132 @@
+"""Fill the database with a deterministic synthetic dataset"""
+import random
+from datetime import datetime, timedelta
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError, transaction
+from rest_framework.authtoken.models import Token
+from levelupapi.caching import bump_version
+from levelupapi.changes import record_changes
+from levelupapi.models import Event, EventGamer, Game, GameType
+from levelupapi.stats import rebuild_stats
+
+# Every seeded user can log in with this password
+SEED_PASSWORD = "levelup"
+SEED_USERNAME_PREFIX = "seed_gamer_"
+MANUFACTURERS = ("Hasbro", "Mattel", "Asmodee", "Ravensburger", "Fantasy Flight", "Z-Man", "Stonemaier")
+WORDS = ("Dragon", "Castle", "Quest", "Empire", "Galaxy", "Harbor", "Legends", "Dungeon",
+         "Express", "Kingdom", "Pirates", "Frontier", "Shadow", "Crystal", "Rivals")
+LOCATIONS = ("Board Games Cafe", "GameStop", "Library", "Community Center", "Rec Room", "Online")
+
+
+class Command(BaseCommand):
+    help = "Generate users, game types, games, events and attendance rows for benchmarking"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--game-types", type=int, default=10)
+        parser.add_argument("--games", type=int, default=1000)
+        parser.add_argument("--events", type=int, default=5000)
+        parser.add_argument("--attendance", type=int, default=5,
+                            help="Average number of attendees per event")
+        parser.add_argument("--seed", type=int, default=42, help="Random seed; same seed, same data")
+        parser.add_argument("--start", default="2025-01-01",
+                            help="Events are spread from 180 days before to 365 days after this date")
+        parser.add_argument("--flush", action="store_true",
+                            help="Delete all events, games, game types and seeded users first")
+
+    def handle(self, *args, **options):
+        if options["users"] < 1 or options["game_types"] < 1:
+            raise CommandError("At least one user and one game type are needed")
+        if options["games"] < 1 and options["events"] > 0:
+            raise CommandError("Events need at least one game")
+
+        rng = random.Random(options["seed"])
+        start = datetime.fromisoformat(options["start"])
+
+        try:
+            with transaction.atomic():
+                if options["flush"]:
+                    self.flush()
+                counts = self.seed(rng, start, options)
+                # The stats tables are maintained by signals bulk_create skips
+                rebuild_stats()
+        except IntegrityError as ex:
+            raise CommandError(f"{ex}. Seeded rows already exist; rerun with --flush") from ex
+
+        # bulk_create skips the signals that invalidate cached responses
+        for model in (User, GameType, Game, Event, EventGamer):
+            bump_version(model)
+
+        for label, count in counts.items():
+            self.stdout.write(f"{label}: {count}")
+        self.stdout.write(self.style.SUCCESS("Seed data created"))
+
+    def flush(self):
+        Event.objects.all().delete()
+        Game.objects.all().delete()
+        GameType.objects.all().delete()
+        User.objects.filter(username__startswith=SEED_USERNAME_PREFIX).delete()
+
+    def seed(self, rng, start, options):
+        password = make_password(SEED_PASSWORD)
+        users = User.objects.bulk_create([
+            User(
+                username=f"{SEED_USERNAME_PREFIX}{i}",
+                password=password,
+                first_name=rng.choice(WORDS),
+                last_name=f"Player{i}",
+                email=f"{SEED_USERNAME_PREFIX}{i}@example.com",
+            )
+            for i in range(options["users"])
+        ], batch_size=500)
+        Token.objects.bulk_create([
+            Token(key=f"{rng.getrandbits(160):040x}", user=user) for user in users
+        ], batch_size=500)
+
+        game_types = GameType.objects.bulk_create([
+            GameType(label=f"{rng.choice(WORDS)} type {i}") for i in range(options["game_types"])
+        ])
+
+        games = Game.objects.bulk_create([
+            Game(
+                name=f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}",
+                manufacturer=rng.choice(MANUFACTURERS),
+                number_of_players=rng.randint(1, 8),
+                type=rng.choice(game_types),
+                creator=rng.choice(users),
+            )
+            for i in range(options["games"])
+        ], batch_size=500)
+
+        events = []
+        signups = []
+        for i in range(options["events"]):
+            minutes = rng.randrange(-180 * 24 * 4, 365 * 24 * 4) * 15
+            attendees = rng.sample(users, min(len(users), rng.randint(0, 2 * options["attendance"])))
+            events.append(Event(
+                name=f"{rng.choice(WORDS)} Night {i}",
+                date_time=start + timedelta(minutes=minutes),
+                location=rng.choice(LOCATIONS),
+                organizer=rng.choice(users),
+                game=rng.choice(games),
+                attendee_count=len(attendees),
+            ))
+            signups.append(attendees)
+        Event.objects.bulk_create(events, batch_size=500)
+        EventGamer.objects.bulk_create([
+            EventGamer(event=event, attendee=attendee)
+            for event, attendees in zip(events, signups)
+            for attendee in attendees
+        ], batch_size=500)
+        for model, rows in ((GameType, game_types), (Game, games), (Event, events)):
+            record_changes(model, [row.pk for row in rows])
+
+        return {
+            "users": len(users),
+            "game types": len(game_types),
+            "games": len(games),
+            "events": len(events),
+            "attendance": sum(len(attendees) for attendees in signups),
+        }
@@ -0,0 +1,208 @@
+"""Concurrent reads and writes through the API, with and without the SQLite tuning
+
+Worker threads send requests through the full request handler (middleware,
+views, signals), each on its own database connection like a threaded
+server would:
+
+    python manage.py stress_db --threads 16 --duration 10
+
+Writes alternate between creating an event and updating a game; reads
+alternate between a page of events and a single game. Every row it writes
+belongs to a temporary user that is deleted at the end. Run it in a few
+processes at once to see what several server workers do to each other.
+
+--profile default runs with SQLite's defaults: rollback journal, deferred
+transactions and no persistent connections. The database is switched back
+to WAL by the next connection that has the tuning applied, so to compare
+profiles across several processes, run the default profile once on its own
+first, then the others together.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from levelupapi.models import Game, GameType
+from levelupapi.sqlite import current_pragmas
+from levelupapi.management.commands.benchmark import percentile
+
+STRESS_USERNAME = "stress_db_user_{pid}"
+GAMES = 20
+
+
+class Command(BaseCommand):
+    help = "Measure read/write throughput and error rate under concurrent requests"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16, help="Concurrent clients")
+        parser.add_argument("--duration", type=float, default=10.0, help="Seconds per profile")
+        parser.add_argument("--write-ratio", type=float, default=0.3, help="Share of requests that write")
+        parser.add_argument("--profile", choices=("tuned", "default", "both"), default="both")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != "sqlite":
+            raise CommandError("stress_db measures the SQLite tuning; the default database isn't SQLite")
+        profiles = ("default", "tuned") if options["profile"] == "both" else (options["profile"],)
+
+        # Setting up and cleaning up with a tuned connection would put the
+        # database back in WAL under other processes' default profile
+        untuned = profiles[0] == "default"
+        with self.tuning(not untuned):
+            user, token, games = self.setup()
+        results = {}
+        try:
+            for name in profiles:
+                with self.tuning(name == "tuned"):
+                    self.stdout.write(f"{name}: {current_pragmas(connections[DEFAULT_DB_ALIAS])}")
+                    results[name] = self.run(token, games, options)
+                self.report(name, results[name], options["duration"])
+        finally:
+            with self.tuning(not untuned):
+                user.delete()
+
+        if len(results) == 2:
+            before, after = results["default"], results["tuned"]
+            for kind in ("read", "write"):
+                if before[kind] and after[kind]:
+                    self.stdout.write(f"{kind}s/s tuned vs default: {len(after[kind]) / len(before[kind]):.2f}x")
+
+    def setup(self):
+        # Per process, so several can run side by side like server workers
+        username = STRESS_USERNAME.format(pid=os.getpid())
+        User.objects.filter(username=username).delete()
+        user = User.objects.create(username=username, first_name="Stress", last_name="Test")
+        token = Token.objects.create(user=user)
+        game_type = GameType.objects.order_by("id").first() or GameType.objects.create(label="Stress")
+        games = [
+            Game.objects.create(name=f"Stress game {i}", manufacturer="Stress", number_of_players=4,
+                                type=game_type, creator=user)
+            for i in range(GAMES)
+        ]
+        return user, token, games
+
+    @contextmanager
+    def tuning(self, enabled):
+        """Run the block on fresh connections with the tuning on, or with SQLite's defaults"""
+        settings_dict = connections.settings[DEFAULT_DB_ALIAS]
+        saved_age = settings_dict.get("CONN_MAX_AGE", 0)
+        connections.close_all()
+        if enabled:
+            try:
+                yield
+            finally:
+                connections.close_all()
+            return
+
+        settings_dict["CONN_MAX_AGE"] = 0
+        try:
+            with override_settings(LEVELUP_SQLITE={"ENABLED": False}):
+                self.use_rollback_journal()
+                yield
+        finally:
+            connections.close_all()
+            settings_dict["CONN_MAX_AGE"] = saved_age
+
+    def use_rollback_journal(self):
+        with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute("PRAGMA journal_mode")
+            if cursor.fetchone()[0] == "delete":
+                return
+            try:
+                cursor.execute("PRAGMA journal_mode = DELETE")
+            except OperationalError as ex:
+                # Leaving WAL needs the database to itself
+                raise CommandError(
+                    "Couldn't switch the database to the rollback journal while other connections have it "
+                    "open; run one process with --profile default first, then the others together") from ex
+
+    def run(self, token, games, options):
+        samples = {"read": [], "write": [], "errors": Counter()}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options["duration"]
+        threads = [
+            threading.Thread(target=self.worker, args=(
+                token, games, options["write_ratio"], random.Random(options["seed"] + i), deadline, samples, lock))
+            for i in range(options["threads"])
+        ]
+        # Failed and slow requests are counted here rather than logged one by one
+        loggers = [logging.getLogger(name) for name in ("django.request", "levelupapi.sql")]
+        disabled = [logger.disabled for logger in loggers]
+        for logger in loggers:
+            logger.disabled = True
+        try:
+            # One user writing flat out is what's being measured, not throttled
+            with override_settings(LEVELUP_THROTTLE={"ENABLED": False}):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+        finally:
+            for logger, was_disabled in zip(loggers, disabled):
+                logger.disabled = was_disabled
+        return samples
+
+    def worker(self, token, games, write_ratio, rng, deadline, samples, lock):
+        host = next((host for host in settings.ALLOWED_HOSTS if host not in ("*", "") and host[0] != "."), "localhost")
+        client = Client(HTTP_HOST=host, HTTP_AUTHORIZATION=f"Token {token.key}")
+        reads, writes, errors = [], [], Counter()
+        try:
+            while time.perf_counter() < deadline:
+                write = rng.random() < write_ratio
+                game = rng.choice(games)
+                started = time.perf_counter()
+                try:
+                    response = self.write(client, game, rng) if write else self.read(client, game, rng)
+                    error = f"HTTP {response.status_code}" if response.status_code >= 500 else None
+                except Exception as ex:  # pylint: disable=broad-except
+                    error = f"{type(ex).__name__}: {str(ex).splitlines()[0][:80]}"
+                elapsed = (time.perf_counter() - started) * 1000
+                if error:
+                    errors[error] += 1
+                else:
+                    (writes if write else reads).append(elapsed)
+        finally:
+            connections.close_all()
+            with lock:
+                samples["read"].extend(reads)
+                samples["write"].extend(writes)
+                samples["errors"].update(errors)
+
+    def read(self, client, game, rng):
+        if rng.random() < 0.5:
+            return client.get("/events", {"page_size": 50})
+        return client.get(f"/games/{game.id}")
+
+    def write(self, client, game, rng):
+        if rng.random() < 0.5:
+            return client.post("/events", {
+                "name": "Stress event", "date": "2030-01-01", "time": "19:00",
+                "location": "Stress", "game": game.id,
+            }, content_type="application/json")
+        return client.put(f"/games/{game.id}", {
+            "name": f"Stress game {rng.randrange(1000)}", "manufacturer": "Stress",
+            "number_of_players": rng.randint(1, 8), "type": game.type_id,
+        }, content_type="application/json")
+
+    def report(self, name, samples, duration):
+        failed = sum(samples["errors"].values())
+        total = len(samples["read"]) + len(samples["write"]) + failed
+        parts = []
+        for kind in ("read", "write"):
+            latencies = sorted(samples[kind])
+            parts.append(
+                f"{kind}s {len(latencies):>6} ({len(latencies) / duration:7.1f}/s, "
+                f"p50 {percentile(latencies, 50) or 0:6.1f}ms, p99 {percentile(latencies, 99) or 0:7.1f}ms)"
+            )
+        self.stdout.write(f"{name:<8} {'  '.join(parts)}  errors {failed} ({failed / max(total, 1):.1%})")
+        for error, count in samples["errors"].most_common(3):
+            self.stdout.write(f"           {count:>6}  {error}")
@@ -0,0 +1,198 @@
+"""Request middleware for the levelup API"""
+import heapq
+import json
+import logging
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from levelupapi import compression
+
+logger = logging.getLogger("levelupapi.sql")
+
+SQL_INSTRUMENTATION_DEFAULTS = {
+    # Log requests that run more queries than this (None to disable)
+    "QUERY_COUNT_THRESHOLD": 50,
+    # Log requests that take longer than this many milliseconds (None to disable)
+    "DURATION_THRESHOLD_MS": 500,
+    # How many of the slowest statements to keep for the log line
+    "SLOWEST_STATEMENTS": 3,
+}
+
+
+class QueryStats:
+    """execute_wrapper that counts and times every statement on a connection"""
+
+    __slots__ = ("count", "duration", "slowest", "keep")
+
+    def __init__(self, keep):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+        self.keep = keep
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if self.keep:
+                # Min-heap of the `keep` slowest statements seen so far
+                if len(self.slowest) < self.keep:
+                    heapq.heappush(self.slowest, (elapsed, sql))
+                elif elapsed > self.slowest[0][0]:
+                    heapq.heapreplace(self.slowest, (elapsed, sql))
+
+
+class SQLInstrumentationMiddleware:
+    """Time the SQL each request runs and report it in a Server-Timing header
+
+    Adds `Server-Timing: db;dur=<ms>;desc="<n> queries", app;dur=<ms>` to every
+    response and writes a JSON log line to the levelupapi.sql logger when a
+    request crosses LEVELUP_SQL_INSTRUMENTATION's query count or latency
+    threshold. Queries run while a streaming response is being consumed
+    happen after this middleware returns and aren't counted.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # Under ASGI with async views the chain stays async end to end
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        config = self.get_config()
+        stats = QueryStats(config["SLOWEST_STATEMENTS"])
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            self.wrap_connections(stack, stats)
+            response = self.get_response(request)
+        return self.report(request, response, config, stats, started)
+
+    async def __acall__(self, request):
+        config = self.get_config()
+        stats = QueryStats(config["SLOWEST_STATEMENTS"])
+
+        started = time.perf_counter()
+        # Connections belong to a thread and the async ORM runs its queries in
+        # the thread-sensitive executor, so the wrappers are installed there
+        stack = ExitStack()
+        await sync_to_async(self.wrap_connections)(stack, stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.report(request, response, config, stats, started)
+
+    def wrap_connections(self, stack, stats):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+
+    def get_config(self):
+        return {**SQL_INSTRUMENTATION_DEFAULTS, **getattr(settings, "LEVELUP_SQL_INSTRUMENTATION", {})}
+
+    def report(self, request, response, config, stats, started):
+        """Add the Server-Timing header and log the request if it was slow"""
+        total_ms = (time.perf_counter() - started) * 1000
+        db_ms = stats.duration * 1000
+
+        timing = f'db;dur={db_ms:.2f};desc="{stats.count} queries", app;dur={total_ms:.2f}'
+        if response.has_header("Server-Timing"):
+            timing = f'{response["Server-Timing"]}, {timing}'
+        response["Server-Timing"] = timing
+
+        count_limit = config["QUERY_COUNT_THRESHOLD"]
+        duration_limit = config["DURATION_THRESHOLD_MS"]
+        if (count_limit is not None and stats.count > count_limit) or \
+                (duration_limit is not None and total_ms > duration_limit):
+            logger.warning(json.dumps({
+                "event": "slow_request",
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "duration_ms": round(total_ms, 2),
+                "db_ms": round(db_ms, 2),
+                "queries": stats.count,
+                "slowest": [
+                    {"ms": round(elapsed * 1000, 2), "sql": sql}
+                    for elapsed, sql in sorted(stats.slowest, reverse=True)
+                ],
+            }))
+        return response
+
+
+class CompressionMiddleware:
+    """Compress responses with gzip or Brotli, whichever the client prefers
+
+    Like django.middleware.gzip.GZipMiddleware, but negotiates Brotli too and
+    only touches LEVELUP_COMPRESSION's CONTENT_TYPES at MIN_SIZE bytes or
+    more. Responses that are already encoded, such as precompressed bodies
+    from the response cache, pass through. Streaming responses, sync or
+    async, are compressed chunk by chunk. Time spent compressing a buffered
+    body is reported in Server-Timing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.process(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process(request, await self.get_response(request))
+
+    def process(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        content_type = response.get("Content-Type", "")
+        size = None if response.streaming else len(response.content)
+        if not compression.applies(content_type, size):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = compression.request_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compression.acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            del response["Content-Length"]
+            compression.mark_encoded(response, encoding)
+            return response
+
+        started = time.perf_counter()
+        compressed = compression.compress(response.content, encoding)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if len(compressed) >= size:
+            return response
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        compression.mark_encoded(response, encoding)
+
+        timing = f'compress;dur={elapsed_ms:.2f};desc="{encoding} {size} to {len(compressed)} bytes"'
+        if response.has_header("Server-Timing"):
+            timing = f'{response["Server-Timing"]}, {timing}'
+        response["Server-Timing"] = timing
+        return response
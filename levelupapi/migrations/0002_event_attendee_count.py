@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def dedupe_and_count_attendees(apps, schema_editor):
+    """Drop repeated signups so the constraint can be added, then fill in counts"""
+    Event = apps.get_model('levelupapi', 'Event')
+    EventGamer = apps.get_model('levelupapi', 'EventGamer')
+
+    seen = set()
+    duplicates = []
+    for row_id, event_id, attendee_id in EventGamer.objects.order_by('id').values_list('id', 'event_id', 'attendee_id'):
+        if (event_id, attendee_id) in seen:
+            duplicates.append(row_id)
+        seen.add((event_id, attendee_id))
+    EventGamer.objects.filter(id__in=duplicates).delete()
+
+    counts = {}
+    for event_id, _ in seen:
+        counts[event_id] = counts.get(event_id, 0) + 1
+    for event_id, count in counts.items():
+        Event.objects.filter(id=event_id).update(attendee_count=count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levelupapi', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='attendee_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(dedupe_and_count_attendees, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='eventgamer',
+            constraint=models.UniqueConstraint(fields=('event', 'attendee'), name='unique_event_attendee'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import DatabaseError, migrations
+from levelupapi.search import CREATE_INDEX_SQL, DROP_INDEX_SQL, REBUILD_SQL
+
+
+def create_search_index(apps, schema_editor):
+    """SQLite builds without FTS5 skip this; game search then uses LIKE"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(CREATE_INDEX_SQL[0])
+    except DatabaseError:
+        return
+    for statement in (*CREATE_INDEX_SQL[1:], REBUILD_SQL):
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_INDEX_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levelupapi', '0003_event_date_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations, models
+import django.utils.timezone
+from levelupapi.search import TRIGGER_SQL, table_exists
+
+
+def restore_search_triggers(apps, schema_editor):
+    """Put the FTS triggers back if 0004 created the index
+
+    Adding NOT NULL columns makes SQLite rebuild levelupapi_game, which drops
+    the triggers 0004 put on it. The FTS table itself and its rows survive.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not table_exists(cursor):
+            return
+    for statement in TRIGGER_SQL.values():
+        schema_editor.execute(statement)
+
+
+def timestamp_fields():
+    return [
+        ('created_at', models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now)),
+        ('updated_at', models.DateTimeField(auto_now=True, default=django.utils.timezone.now)),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levelupapi', '0004_game_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model', 'id'], name='tombstone_model_idx')],
+            },
+        ),
+        *[
+            migrations.AddField(
+                model_name=model_name,
+                name=name,
+                field=field,
+                preserve_default=False,
+            )
+            for model_name in ('event', 'game', 'gametype')
+            for name, field in timestamp_fields()
+        ],
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['updated_at'], name='event_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='game',
+            index=models.Index(fields=['updated_at'], name='game_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='gametype',
+            index=models.Index(fields=['updated_at'], name='gametype_updated_idx'),
+        ),
+        migrations.RunPython(restore_search_triggers, migrations.RunPython.noop),
+    ]
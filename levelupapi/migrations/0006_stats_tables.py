@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    """Count what's already there; signals keep it current from here on"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Game = apps.get_model('levelupapi', 'Game')
+    Event = apps.get_model('levelupapi', 'Event')
+    EventGamer = apps.get_model('levelupapi', 'EventGamer')
+    GameStats = apps.get_model('levelupapi', 'GameStats')
+    GamePlayer = apps.get_model('levelupapi', 'GamePlayer')
+    UserStats = apps.get_model('levelupapi', 'UserStats')
+
+    games = {game_id: GameStats(game_id=game_id) for game_id in Game.objects.values_list('id', flat=True)}
+    for game_id, count in Event.objects.values_list('game_id').annotate(n=Count('id')).order_by():
+        games[game_id].event_count = count
+    players = []
+    for game_id, user_id, count in (EventGamer.objects.values_list('event__game_id', 'attendee_id')
+                                    .annotate(n=Count('id')).order_by()):
+        players.append(GamePlayer(game_id=game_id, user_id=user_id, signups=count))
+        games[game_id].attendee_count += count
+        games[game_id].player_count += 1
+
+    users = {user_id: UserStats(user_id=user_id) for user_id in User.objects.values_list('id', flat=True)}
+    for field, rows in (
+        ('games_created', Game.objects.values_list('creator_id')),
+        ('events_organized', Event.objects.values_list('organizer_id')),
+        ('events_attended', EventGamer.objects.values_list('attendee_id')),
+    ):
+        for user_id, count in rows.annotate(n=Count('id')).order_by():
+            setattr(users[user_id], field, count)
+
+    GameStats.objects.bulk_create(games.values(), batch_size=500)
+    GamePlayer.objects.bulk_create(players, batch_size=500)
+    UserStats.objects.bulk_create(users.values(), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('levelupapi', '0005_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GameStats',
+            fields=[
+                ('game', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='levelupapi.game')),
+                ('event_count', models.IntegerField(default=0)),
+                ('attendee_count', models.IntegerField(default=0)),
+                ('player_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='levelup_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('games_created', models.IntegerField(default=0)),
+                ('events_organized', models.IntegerField(default=0)),
+                ('events_attended', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GamePlayer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('signups', models.IntegerField(default=0)),
+                ('game', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='levelupapi.game')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('game', 'user'), name='unique_game_player')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('levelupapi', '0008_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=100)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('changed_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.DeleteModel(
+            name='Tombstone',
+        ),
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='game',
+            name='game_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='gametype',
+            name='gametype_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['model', 'id'], name='change_model_idx'),
+        ),
+    ]
@@ -1,4 +1,10 @@
 from .event import Event
 from .event_gamer import EventGamer
 from .game import Game
-from .game_type import GameType
\ No newline at end of file
+from .game_type import GameType
+from .change import Change
+from .game_stats import GameStats
+from .game_player import GamePlayer
+from .user_stats import UserStats
+from .idempotency_key import IdempotencyKey
+from .job import Job
@@ -0,0 +1,20 @@
+from django.db import models
+
+class Change(models.Model):
+    """A row written or deleted, logged for the ?since= change feed
+
+    Ids are handed out in commit order: SQLite has a single writer and
+    AUTOINCREMENT never reuses an id, so a later id is a later commit.
+    """
+
+    # Model label, e.g. "levelupapi.game"
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    changed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Changes to one model after a cursor, in id order
+            models.Index(fields=["model", "id"], name="change_model_idx"),
+        ]
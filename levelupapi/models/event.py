@@ -10,3 +10,16 @@ class Event(models.Model):
     organizer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="organized_events")
     game = models.ForeignKey("Game", on_delete=models.CASCADE, related_name="events")
     attendees = models.ManyToManyField(User, through="EventGamer", related_name="attending_events")
+    # Denormalized len(attendees), kept in step by levelupapi.signals
+    attendee_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Also moved by signups and cancellations, which change the serialized event
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # ?game= combined with a date range, and pagination within a game
+            models.Index(fields=["game", "date_time"], name="event_game_date_idx"),
+            # ?from= / ?to= / ?upcoming= and keyset pagination on (date_time, id)
+            models.Index(fields=["date_time"], name="event_date_idx"),
+        ]
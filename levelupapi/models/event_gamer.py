@@ -5,4 +5,9 @@ class EventGamer(models.Model):
     """Database model for tracking Gamer Events"""
 
     event = models.ForeignKey("Event", on_delete=models.CASCADE)
-    attendee = models.ForeignKey(User, on_delete=models.CASCADE)
\ No newline at end of file
+    attendee = models.ForeignKey(User, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["event", "attendee"], name="unique_event_attendee"),
+        ]
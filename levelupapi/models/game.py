@@ -8,4 +8,6 @@ class Game(models.Model):
     manufacturer = models.CharField(max_length=200)
     number_of_players = models.IntegerField()
     type = models.ForeignKey("GameType", on_delete=models.CASCADE, related_name="games")
-    creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name="games")
\ No newline at end of file
+    creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name="games")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
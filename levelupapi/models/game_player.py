@@ -0,0 +1,18 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class GamePlayer(models.Model):
+    """How many of a game's events a user is signed up to
+
+    Lets GameStats.player_count move by one when a user's first signup
+    for a game arrives or their last one goes, without a COUNT(DISTINCT).
+    """
+
+    game = models.ForeignKey("Game", on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    signups = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["game", "user"], name="unique_game_player"),
+        ]
@@ -0,0 +1,11 @@
+from django.db import models
+
+class GameStats(models.Model):
+    """Per-game counts, kept up to date by levelupapi.stats"""
+
+    game = models.OneToOneField("Game", on_delete=models.CASCADE, primary_key=True, related_name="stats")
+    event_count = models.IntegerField(default=0)
+    # Signups across all of the game's events
+    attendee_count = models.IntegerField(default=0)
+    # Distinct users signed up to at least one of the game's events
+    player_count = models.IntegerField(default=0)
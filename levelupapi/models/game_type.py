@@ -3,4 +3,6 @@ from django.db import models
 class GameType(models.Model):
     """Database model for tracking game types"""
 
-    label = models.CharField(max_length=200)
\ No newline at end of file
+    label = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
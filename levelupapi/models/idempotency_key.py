@@ -0,0 +1,26 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class IdempotencyKey(models.Model):
+    """A write sent with an Idempotency-Key header and the response it got
+
+    status_code stays null while the first request with the key is running.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    # sha256 of the method, path and payload, to catch a key reused for another request
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    body = models.BinaryField(default=b"")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key"),
+        ]
+        indexes = [
+            # Purging expired keys
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
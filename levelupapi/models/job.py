@@ -0,0 +1,35 @@
+from django.db import models
+from django.utils import timezone
+
+class Job(models.Model):
+    """Work levelupapi.jobs runs after a write commits, outside the request
+
+    Kept here until it's done, so a job that was queued or running when its
+    process stopped is picked up again by the run_jobs command.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUSES = [(PENDING, "Pending"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    # Name the handler was registered under with @levelupapi.jobs.job
+    name = models.CharField(max_length=100)
+    # Keyword arguments for the handler
+    args = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    # Not run before this: its retry backoff
+    run_after = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Due jobs, oldest first
+            models.Index(fields=["status", "run_after"], name="job_due_idx"),
+        ]
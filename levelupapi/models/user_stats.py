@@ -0,0 +1,10 @@
+from django.db import models
+from django.contrib.auth.models import User
+
+class UserStats(models.Model):
+    """Per-user counts, kept up to date by levelupapi.stats"""
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="levelup_stats")
+    games_created = models.IntegerField(default=0)
+    events_organized = models.IntegerField(default=0)
+    events_attended = models.IntegerField(default=0)
@@ -0,0 +1,49 @@
+"""Emails to an event's attendees when it changes
+
+Sent by a notify_attendees job after the change commits, so the request
+doesn't wait on the mail server however many attendees there are. Mail
+goes through EMAIL_BACKEND (printed to the console locally).
+"""
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from levelupapi.jobs import job
+from levelupapi.models import Event
+
+# What event_message() shows; a save that changes none of them isn't worth an email
+EVENT_FIELDS = ("name", "date_time", "location", "game_id", "organizer_id")
+
+
+def attendees_see_change(before, event):
+    """True when `event` differs from `before` (EVENT_FIELDS values) in what attendees are told"""
+    return before is not None and any(before[field] != getattr(event, field) for field in EVENT_FIELDS)
+
+
+def event_message(event, attendee):
+    body = (
+        f"Hi {attendee.first_name or attendee.username},\n\n"
+        f"{event.organizer.get_full_name() or event.organizer.username} changed an event you're going to:\n\n"
+        f"{event.name}\n"
+        f"{event.game.name}\n"
+        f"{event.date_time:%A %d %B %Y, %H:%M}\n"
+        f"{event.location}\n"
+    )
+    return EmailMessage(f"{event.name} has changed", body, settings.DEFAULT_FROM_EMAIL, [attendee.email])
+
+
+@job("notify_attendees")
+def notify_attendees(event_id):
+    """Email every attendee of an event with an address about its new details
+
+    Reads in autocommit and sends outside any transaction, so the mail
+    server is never waited on with the write lock held.
+    """
+    event = Event.objects.select_related("game", "organizer").filter(pk=event_id).first()
+    if event is None:
+        # Deleted since; its attendees were told nothing about the change
+        return
+    messages = [
+        event_message(event, attendee)
+        for attendee in event.attendees.exclude(email="").exclude(pk=event.organizer_id).order_by("id")
+    ]
+    if messages:
+        get_connection().send_messages(messages)
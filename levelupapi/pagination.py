@@ -0,0 +1,117 @@
+"""Keyset (cursor) pagination for list views"""
+import base64
+import json
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """Opt-in cursor pagination ordered by a unique tuple of columns
+
+    Pages are selected with a WHERE clause on the last row of the previous
+    page instead of an OFFSET, so every page costs the same index range scan
+    and rows inserted ahead of the cursor never shift later pages.
+
+    Subclasses set `ordering` to the model fields that make up the key. The
+    last field has to be unique (normally "id").
+    """
+
+    ordering = ("id",)
+    page_size = 50
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def is_requested(self, request):
+        """Pagination only kicks in when the client asks for it"""
+        params = request.query_params
+        return self.cursor_query_param in params or self.page_size_query_param in params
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size < 1:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def paginate_queryset(self, queryset, request):
+        """Return the rows for the requested page as a list
+
+        Fetches one row more than the page size to find out whether there is
+        a next page without running a COUNT.
+        """
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        self.model = queryset.model
+
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            queryset = queryset.filter(self.after(self.decode_cursor(encoded)))
+
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        self.last_row = rows[-1] if rows else None
+        return rows
+
+    def after(self, position):
+        """Build the row-value comparison (a, b) > (x, y) as nested ORs"""
+        condition = Q(**{f"{self.ordering[-1]}__gt": position[-1]})
+        for field, value in reversed(list(zip(self.ordering[:-1], position[:-1]))):
+            condition = Q(**{f"{field}__gt": value}) | (Q(**{field: value}) & condition)
+        if len(self.ordering) > 1:
+            # Redundant, but lets SQLite seek the index instead of scanning it
+            condition = Q(**{f"{self.ordering[0]}__gte": position[0]}) & condition
+        return condition
+
+    def encode_cursor(self, row):
+        position = [
+            self.model._meta.get_field(field).value_to_string(row)
+            for field in self.ordering
+        ]
+        raw = json.dumps(position, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii")
+
+    def decode_cursor(self, encoded):
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError(encoded)
+            return [
+                self.model._meta.get_field(field).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except Exception as ex:
+            raise self.invalid_cursor() from ex
+
+    def invalid_cursor(self):
+        """A 404 with the {"error": ...} body the views use for bad parameters"""
+        return NotFound({"error": self.invalid_cursor_message})
+
+    def get_next_link(self):
+        if not self.has_next or self.last_row is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.page_size_query_param, self.page_size_value)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last_row))
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "results": data,
+        })
+
+
+class EventPagination(KeysetPagination):
+    """Events page through in chronological order"""
+    ordering = ("date_time", "id")
+
+
+class GamePagination(KeysetPagination):
+    """Games page through in insertion order"""
+    ordering = ("id",)
@@ -0,0 +1,36 @@
+"""JSON parser that uses orjson when it is installed"""
+import re
+from io import BytesIO
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+from levelupapi.renderers import FastJSONRenderer, orjson
+
+# orjson reads integers wider than 64 bits as floats, the stdlib keeps them exact
+LONG_NUMBER = re.compile(rb"\d{19,}")
+
+
+class FastJSONParser(JSONParser):
+    """Drop-in JSONParser that decodes UTF-8 bodies with orjson
+
+    orjson always rejects NaN/Infinity, which is what STRICT_JSON asks for.
+    Other charsets, non-strict mode, bodies with very long digit runs and
+    bodies orjson refuses go through JSONParser, so every request gets the
+    same result or error as before.
+    """
+
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = str(parser_context.get("encoding", settings.DEFAULT_CHARSET)).lower()
+        if orjson is None or not self.strict or encoding not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read() if stream is not None else b""
+        if LONG_NUMBER.search(body):
+            return super().parse(BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            # Let the stdlib parser produce the error message (or accept the body)
+            return super().parse(BytesIO(body), media_type, parser_context)
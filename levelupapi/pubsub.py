@@ -0,0 +1,161 @@
+"""In-process publish/subscribe hub behind the /events/stream push channel
+
+Model signals publish small notifications (an event was created, updated,
+deleted, or someone signed up or cancelled) once the writing transaction
+commits. Every connected client has its own bounded queue. Publishing
+never waits on a client: one whose queue is full is marked as overflowed,
+is sent an overflow notice after what it already has queued, and is
+disconnected. It is expected to catch up with ?since= on /events and
+reconnect.
+
+The hub lives in one process. With several server workers a client only
+hears about writes handled by the worker it's connected to, so run the
+stream on a single ASGI worker (or put a broker behind publish()).
+"""
+import asyncio
+import itertools
+import threading
+from collections import deque
+from django.conf import settings
+from django.db import transaction
+
+EVENT_STREAM_DEFAULTS = {
+    # Notifications buffered per client before it counts as too slow
+    "QUEUE_SIZE": 100,
+    # Most clients connected to one process at a time
+    "MAX_CLIENTS": 1000,
+    # Seconds between keepalive comments on an idle stream
+    "KEEPALIVE": 15,
+}
+
+
+def get_config():
+    return {**EVENT_STREAM_DEFAULTS, **getattr(settings, "LEVELUP_EVENT_STREAM", {})}
+
+
+class Overflow(Exception):
+    """The subscriber fell too far behind and has been cut off"""
+
+
+class TooManySubscribers(Exception):
+    """The hub is at MAX_CLIENTS"""
+
+
+class Subscription:
+    """One client's queue, filled from any thread and drained on its event loop"""
+
+    def __init__(self, game_id, max_queue, loop):
+        self.game_id = game_id
+        self.max_queue = max_queue
+        self.loop = loop
+        self.messages = deque()
+        self.lock = threading.Lock()
+        self.ready = asyncio.Event()
+        self.overflowed = False
+        self.closed = False
+
+    def wants(self, message):
+        return self.game_id is None or message["game"] == self.game_id
+
+    def offer(self, message):
+        """Queue a message without blocking; a full queue overflows instead"""
+        with self.lock:
+            if self.closed or self.overflowed:
+                return
+            if len(self.messages) >= self.max_queue:
+                self.overflowed = True
+            else:
+                self.messages.append(message)
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The client's event loop is gone
+            self.closed = True
+
+    async def get(self, timeout=None):
+        """Wait for the next message
+
+        Returns:
+            dict -- the message, or None when `timeout` seconds pass first
+
+        Raises:
+            Overflow -- once the queue is drained after an overflow
+        """
+        while True:
+            with self.lock:
+                if self.messages:
+                    return self.messages.popleft()
+                if self.overflowed:
+                    raise Overflow()
+                self.ready.clear()
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+
+class Hub:
+    """Fans published messages out to every matching subscription"""
+
+    def __init__(self, max_queue=100, max_clients=1000):
+        self.max_queue = max_queue
+        self.max_clients = max_clients
+        self.subscriptions = set()
+        self.lock = threading.Lock()
+        self.sequence = itertools.count(1)
+        self.published = 0
+
+    @classmethod
+    def from_settings(cls):
+        config = get_config()
+        return cls(config["QUEUE_SIZE"], config["MAX_CLIENTS"])
+
+    def subscribe(self, game_id=None):
+        """Register a subscriber on the running event loop
+
+        Raises:
+            TooManySubscribers -- when MAX_CLIENTS are already connected
+        """
+        subscription = Subscription(game_id, self.max_queue, asyncio.get_running_loop())
+        with self.lock:
+            if len(self.subscriptions) >= self.max_clients:
+                raise TooManySubscribers()
+            self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.closed = True
+        with self.lock:
+            self.subscriptions.discard(subscription)
+
+    def has_subscribers(self):
+        return bool(self.subscriptions)
+
+    def publish(self, kind, event_id, game_id, **extra):
+        """Send a notification to every subscriber interested in `game_id`"""
+        with self.lock:
+            message = {"id": next(self.sequence), "type": kind, "event": event_id, "game": game_id, **extra}
+            self.published += 1
+            subscriptions = list(self.subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(message):
+                subscription.offer(message)
+            if subscription.closed:
+                self.unsubscribe(subscription)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "subscribers": len(self.subscriptions),
+                "published": self.published,
+                "overflowed": sum(1 for subscription in self.subscriptions if subscription.overflowed),
+            }
+
+
+event_hub = Hub.from_settings()
+
+
+def publish_on_commit(kind, event_id, game_id, **extra):
+    """Publish once the current transaction commits, so rolled back writes are never announced"""
+    if event_hub.has_subscribers():
+        transaction.on_commit(lambda: event_hub.publish(kind, event_id, game_id, **extra))
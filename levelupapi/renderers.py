@@ -0,0 +1,41 @@
+"""JSON renderer that uses orjson when it is installed"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError: # pragma: no cover - orjson is optional
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in JSONRenderer that renders through orjson
+
+    Anything orjson doesn't handle the way DRF does (datetimes, Decimals,
+    lazy strings, UUIDs, ...) is handed to DRF's JSONEncoder.default, so the
+    bytes match JSONRenderer's compact output. Pretty printing, ASCII-only
+    output and values orjson refuses (e.g. integers wider than 64 bits) fall
+    back to the stdlib path, as does everything when orjson isn't installed.
+
+    The one visible difference is exponent notation for very large or small
+    floats (1e16 rather than 1e+16); the value parses back the same. None of
+    the API's models have float fields.
+    """
+
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same strict-javascript-subset escaping as JSONRenderer
+        if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+            ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return ret
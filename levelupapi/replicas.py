@@ -0,0 +1,258 @@
+"""Read replicas for the game type, game and event read endpoints
+
+ReplicaRouter (DATABASE_ROUTERS) sends every write to the primary,
+`default`. Reads go to the primary too, except inside a view method
+decorated with @replica_reads (list and retrieve on the read endpoints),
+where they go to one of LEVELUP_REPLICAS' ALIASES.
+
+Users see their own writes:
+* once a request has written, the rest of its reads use the primary
+* a user who wrote is pinned to the primary for PIN_SECONDS afterwards,
+  long enough for the replicas to catch up
+
+A replica that can't be opened is skipped for RETRY_AFTER seconds and its
+reads go to the next one, or to the primary. Responses built from a
+replica are cached under their own key for at most CACHE_TIMEOUT seconds
+(see levelupapi.caching), so a read that missed a recent write isn't
+served for the response cache's full TIMEOUT, and never to a pinned user.
+
+Locally a replica is a read-only copy of the SQLite file, refreshed by the
+copy_replicas command; see LEVELUP_REPLICA_FILES in settings.
+"""
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger("levelupapi.replicas")
+
+REPLICA_DEFAULTS = {
+    # Database aliases of the replicas; none means every query uses the primary
+    "ALIASES": (),
+    # Seconds a replica that failed to open is left out
+    "RETRY_AFTER": 30,
+    # Seconds a user's reads stay on the primary after they wrote
+    "PIN_SECONDS": 5,
+    # Alias from CACHES holding the pins; share it between workers
+    "CACHE": "default",
+    # Seconds a response built from a replica is kept in the response cache
+    "CACHE_TIMEOUT": 5,
+}
+
+
+def get_config():
+    return {**REPLICA_DEFAULTS, **getattr(settings, "LEVELUP_REPLICAS", {})}
+
+
+class RequestState:
+    """What the router needs to know about the request being handled"""
+
+    __slots__ = ("wrote", "read_alias")
+
+    def __init__(self):
+        self.wrote = False
+        # Replica this request's reads go to, while a @replica_reads method runs
+        self.read_alias = None
+
+
+current_request = ContextVar("levelup_replica_request", default=None)
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+down_until = {}
+down_lock = threading.Lock()
+
+
+def pin_key(user_id):
+    return f"levelup:replica-pin:{user_id}"
+
+
+def record_writes(execute, sql, params, many, context):
+    """execute_wrapper on the primary marking the current request as having written"""
+    state = current_request.get()
+    if state is not None and not state.wrote and sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        state.wrote = True
+        # The rest of its reads go to the primary
+        state.read_alias = None
+    return execute(sql, params, many, context)
+
+
+def watch_writes(connection):
+    """Install record_writes() on a new primary connection (a connection_created receiver)"""
+    if connection.alias == DEFAULT_DB_ALIAS and record_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_writes)
+
+
+def is_available(alias, config):
+    """Open the replica's connection if needed; False (for a while) if that fails"""
+    now = time.monotonic()
+    if down_until.get(alias, 0) > now:
+        return False
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError as ex:
+        with down_lock:
+            down_until[alias] = now + config["RETRY_AFTER"]
+        logger.warning("Replica %s is unavailable, reading from the primary: %s", alias, ex)
+        return False
+    return True
+
+
+def choose_replica(user):
+    """Alias of a replica the current request may read from, or None for the primary"""
+    config = get_config()
+    state = current_request.get()
+    if not config["ALIASES"] or state is None or state.wrote:
+        return None
+    if user is not None and user.is_authenticated and caches[config["CACHE"]].get(pin_key(user.pk)):
+        return None
+    aliases = list(config["ALIASES"])
+    random.shuffle(aliases)
+    return next((alias for alias in aliases if is_available(alias, config)), None)
+
+
+def reading_from_replica():
+    """True while the current request's reads go to a replica"""
+    state = current_request.get()
+    return state is not None and state.read_alias is not None
+
+
+def replica_reads(method):
+    """Let a view method's reads go to a replica"""
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        state = current_request.get()
+        if state is None:
+            return method(view, request, *args, **kwargs)
+        state.read_alias = choose_replica(request.user)
+        try:
+            return method(view, request, *args, **kwargs)
+        finally:
+            state.read_alias = None
+    return wrapper
+
+
+class ReplicaRouter:
+    """Writes to the primary; reads to the request's replica, if it has one"""
+
+    def db_for_read(self, model, **hints):
+        state = current_request.get()
+        if state is not None and state.read_alias is not None:
+            return state.read_alias
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Django asks this when assigning related objects too, so it can't
+        # tell whether the request wrote; record_writes() does that
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *get_config()["ALIASES"]}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas are copies of the primary, never migrated themselves
+        if db in get_config()["ALIASES"]:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """Track each request's writes for the router, and pin users who wrote"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = RequestState()
+        token = current_request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        if state.wrote:
+            self.pin(request)
+        return response
+
+    async def __acall__(self, request):
+        state = RequestState()
+        token = current_request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        if state.wrote:
+            await self.apin(request)
+        return response
+
+    def pinned_user(self, request, config):
+        """The user to pin after a write, or None"""
+        # DRF sets the authenticated user on the underlying HttpRequest too
+        user = getattr(request, "user", None)
+        if config["ALIASES"] and user is not None and user.is_authenticated:
+            return user
+        return None
+
+    def pin(self, request):
+        config = get_config()
+        user = self.pinned_user(request, config)
+        if user is not None:
+            caches[config["CACHE"]].set(pin_key(user.pk), True, config["PIN_SECONDS"])
+
+    async def apin(self, request):
+        config = get_config()
+        user = self.pinned_user(request, config)
+        if user is not None:
+            await caches[config["CACHE"]].aset(pin_key(user.pk), True, config["PIN_SECONDS"])
+
+
+def replica_file(alias):
+    """Path of the SQLite file behind a replica alias (its NAME, minus any file: URI parts)"""
+    name = str(connections[alias].settings_dict["NAME"])
+    if name.startswith("file:"):
+        name = name[len("file:"):].split("?", 1)[0]
+    return name
+
+
+def copy_to_replica(alias):
+    """Copy the primary SQLite database over a replica's file
+
+    The copy is written next to the file and swapped in, so readers see
+    either the old copy or the new one, never half of one. It's left in
+    rollback journal mode: a read-only connection can't open a WAL file
+    without its -shm companion.
+
+    Returns:
+        str -- the replica's file
+    """
+    path = replica_file(alias)
+    partial = f"{path}.partial"
+    primary = connections[DEFAULT_DB_ALIAS]
+    primary.ensure_connection()
+    copy = sqlite3.connect(partial)
+    try:
+        primary.connection.backup(copy)
+        copy.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        copy.close()
+    os.replace(partial, path)
+    return path
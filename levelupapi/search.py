@@ -0,0 +1,194 @@
+"""Full-text game search over name and manufacturer
+
+On SQLite builds with FTS5 the levelupapi_game_fts virtual table indexes
+levelupapi_game as external content. Triggers keep it in sync, so bulk
+inserts and queryset updates are covered too. Everywhere else, or if the
+table is missing, search falls back to LIKE matching.
+
+Whether a database has the table is checked per connection alias and
+remembered (see fts_available()). The MATCH query runs on the same
+database as the queryset it narrows, so a search routed to a replica reads
+the replica's index.
+"""
+import re
+import time
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+FTS_TABLE = "levelupapi_game_fts"
+
+# Name matches count for more than manufacturer matches in the ranking
+NAME_WEIGHT = 10.0
+MANUFACTURER_WEIGHT = 1.0
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# The single definition of the index: create_index(), rebuild_game_search,
+# the system check and migrations 0004 and 0005 all use these
+CREATE_TABLE_SQL = f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, manufacturer,
+        content='levelupapi_game', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )"""
+
+# Trigger name -> statement. SQLite drops them whenever a migration rebuilds
+# levelupapi_game, while the FTS table and its rows survive.
+TRIGGER_SQL = {
+    f"{FTS_TABLE}_insert":
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON levelupapi_game BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, manufacturer) VALUES (new.id, new.name, new.manufacturer);
+    END""",
+    f"{FTS_TABLE}_delete":
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON levelupapi_game BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, manufacturer)
+        VALUES ('delete', old.id, old.name, old.manufacturer);
+    END""",
+    f"{FTS_TABLE}_update":
+        f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, manufacturer ON levelupapi_game BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, manufacturer)
+        VALUES ('delete', old.id, old.name, old.manufacturer);
+        INSERT INTO {FTS_TABLE}(rowid, name, manufacturer) VALUES (new.id, new.name, new.manufacturer);
+    END""",
+}
+
+CREATE_INDEX_SQL = (CREATE_TABLE_SQL, *TRIGGER_SQL.values())
+
+REBUILD_SQL = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+
+DROP_INDEX_SQL = (
+    *(f"DROP TRIGGER IF EXISTS {name}" for name in TRIGGER_SQL),
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+)
+
+# Seconds before a database found without the table is looked at again
+RECHECK_MISSING = 60
+
+# Alias -> (whether the table exists, time.monotonic() of the check)
+fts_tables = {}
+
+
+def table_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+    return cursor.fetchone() is not None
+
+
+def missing_triggers(cursor):
+    """Names of the TRIGGER_SQL triggers the database doesn't have"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'levelupapi_game'")
+    present = {row[0] for row in cursor.fetchall()}
+    return [name for name in TRIGGER_SQL if name not in present]
+
+
+def fts_available(using=DEFAULT_DB_ALIAS):
+    """True when the FTS table exists on the `using` database
+
+    A table that was found is remembered for good; a missing one is looked
+    for again after RECHECK_MISSING seconds, so an index created by another
+    process is picked up.
+    """
+    checked = fts_tables.get(using)
+    if checked is not None and (checked[0] or time.monotonic() - checked[1] < RECHECK_MISSING):
+        return checked[0]
+    db = connections[using]
+    if db.vendor != "sqlite":
+        available = False
+    else:
+        with db.cursor() as cursor:
+            available = table_exists(cursor)
+    fts_tables[using] = (available, time.monotonic())
+    return available
+
+
+def forget_fts():
+    """Check for the FTS table again on the next search, after it was created or dropped"""
+    fts_tables.clear()
+
+
+def create_index():
+    """Create the FTS table and triggers if FTS5 is compiled in
+
+    Returns:
+        bool -- whether the index exists afterwards
+    """
+    if connection.vendor != "sqlite":
+        return False
+    forget_fts()
+    try:
+        with connection.cursor() as cursor:
+            for statement in CREATE_INDEX_SQL:
+                cursor.execute(statement)
+    except DatabaseError:
+        # No FTS5 in this SQLite build; search uses the LIKE fallback
+        return False
+    return True
+
+
+def rebuild_index():
+    """Re-read every row of levelupapi_game into the FTS table"""
+    with connection.cursor() as cursor:
+        cursor.execute(REBUILD_SQL)
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query.lower())
+
+
+def match_expression(terms):
+    """Every term has to match, each as a prefix: "dra"* "cas"*"""
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def ranked_game_ids(terms, limit, using=DEFAULT_DB_ALIAS):
+    """Ids of the best matching games, best first"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s",
+            [match_expression(terms), NAME_WEIGHT, MANUFACTURER_WEIGHT, limit],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_games(queryset, query, limit=DEFAULT_LIMIT):
+    """Run a search and return the matching rows of `queryset` in rank order
+
+    Returns:
+        list -- Game instances, at most `limit` of them
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    using = queryset.db
+    if fts_available(using):
+        try:
+            ids = ranked_game_ids(terms, limit, using)
+        except DatabaseError:
+            # Dropped since it was checked (rebuild_game_search --recreate)
+            forget_fts()
+        else:
+            games = queryset.in_bulk(ids)
+            return [games[game_id] for game_id in ids if game_id in games]
+
+    # LIKE fallback: every term must appear in name or manufacturer, and
+    # games whose name starts with the first term come first
+    condition = Q()
+    for term in terms:
+        condition &= Q(name__icontains=term) | Q(manufacturer__icontains=term)
+    rank = Case(
+        When(name__istartswith=terms[0], then=Value(0)),
+        When(name__icontains=terms[0], then=Value(1)),
+        default=Value(2),
+        output_field=IntegerField(),
+    )
+    return list(queryset.filter(condition).annotate(search_rank=rank).order_by("search_rank", "name", "id")[:limit])
+
+
+def get_limit(request):
+    try:
+        limit = int(request.query_params.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        return DEFAULT_LIMIT
+    return max(1, min(limit, MAX_LIMIT))
+
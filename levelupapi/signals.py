@@ -0,0 +1,305 @@
+"""Model signal receivers that keep derived state in sync with writes"""
+from django.contrib.auth.models import User
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from levelupapi.authentication import token_cache
+from levelupapi.caching import bump_version
+from levelupapi.changes import record_changes
+from levelupapi.pubsub import event_hub, publish_on_commit
+from levelupapi.models import Event, EventGamer, Game, GameStats, GameType, UserStats
+from levelupapi import jobs, notifications, replicas, sqlite, stats
+
+
+@receiver(connection_created)
+def tune_connection(sender, connection, **kwargs):
+    """Apply LEVELUP_SQLITE's pragmas to each new SQLite connection"""
+    sqlite.configure_connection(connection)
+
+
+@receiver(connection_created)
+def watch_primary_writes(sender, connection, **kwargs):
+    """Let the replica router see which requests wrote to the primary"""
+    replicas.watch_writes(connection)
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """A deleted token must stop authenticating right away"""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    """Cached users go stale when the row changes (is_active, names, ...)"""
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=GameType)
+@receiver(post_delete, sender=GameType)
+@receiver(post_save, sender=Game)
+@receiver(post_delete, sender=Game)
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=EventGamer)
+@receiver(post_delete, sender=EventGamer)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_response_cache_version(sender, **kwargs):
+    """Cached responses built from this model are now out of date"""
+    bump_version(sender)
+
+
+@receiver(post_save, sender=GameType)
+@receiver(post_save, sender=Game)
+@receiver(post_save, sender=Event)
+def record_save(sender, instance, created, **kwargs):
+    """Log the row for the ?since= change feed, with the rows that show it
+
+    Games show their type's label and events their game's name.
+    """
+    record_changes(sender, [instance.pk])
+    if created:
+        return
+    if sender is GameType:
+        record_changes(Game, Game.objects.filter(type=instance))
+    elif sender is Game:
+        record_changes(Event, Event.objects.filter(game=instance))
+
+
+@receiver(post_save, sender=User)
+def record_user_renamed(sender, instance, created, update_fields, **kwargs):
+    """Games show their creator's name, events their organizer's and attendees'"""
+    if created or (update_fields is not None and not {"first_name", "last_name"} & set(update_fields)):
+        # last_login is saved on its own at every login
+        return
+    record_changes(Game, Game.objects.filter(creator=instance))
+    attending = EventGamer.objects.filter(attendee=instance).values("event_id")
+    record_changes(Event, Event.objects.filter(Q(organizer=instance) | Q(pk__in=attending)))
+
+
+@receiver(post_delete, sender=GameType)
+@receiver(post_delete, sender=Game)
+@receiver(post_delete, sender=Event)
+def record_deletion(sender, instance, **kwargs):
+    """Log the deletion for the ?since= change feed
+
+    Cascades send post_delete for every row they remove, so deleting a game
+    type logs its games and their events as well.
+    """
+    record_changes(sender, [instance.pk], deleted=True)
+
+
+@receiver(m2m_changed, sender=EventGamer)
+def bump_attendee_version(sender, action, **kwargs):
+    """event.attendees.add()/remove() skip EventGamer's save signals"""
+    if action in ("post_add", "post_remove", "post_clear"):
+        bump_version(EventGamer)
+
+
+def adjust_attendee_count(event_ids, step):
+    """Atomically move Event.attendee_count by `step` in the database
+
+    The attendee list is part of the serialized event, so the ?since= feed
+    has to report it too.
+    """
+    Event.objects.filter(pk__in=event_ids).update(
+        attendee_count=F("attendee_count") + step, updated_at=timezone.now())
+    record_changes(Event, event_ids)
+    bump_version(Event)
+
+
+def recount_attendees(event_ids):
+    """Reset Event.attendee_count from levelupapi_eventgamer"""
+    signups = (EventGamer.objects.filter(event=OuterRef("pk"))
+               .values("event").annotate(total=Count("id")).values("total"))
+    Event.objects.filter(pk__in=event_ids).update(
+        attendee_count=Coalesce(Subquery(signups), 0), updated_at=timezone.now())
+    record_changes(Event, event_ids)
+    bump_version(Event)
+
+
+@receiver(post_save, sender=EventGamer)
+def count_signup(sender, instance, created, **kwargs):
+    if created:
+        adjust_attendee_count([instance.event_id], 1)
+
+
+@receiver(post_delete, sender=EventGamer)
+def count_cancellation(sender, instance, **kwargs):
+    adjust_attendee_count([instance.event_id], -1)
+
+
+@receiver(m2m_changed, sender=EventGamer)
+def count_bulk_attendee_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """attendees.add()/remove()/clear() write EventGamer rows without save signals"""
+    if action == "pre_clear" and reverse:
+        # Remember which events the user is leaving before the rows go away
+        instance._cleared_event_ids = list(
+            EventGamer.objects.filter(attendee=instance).values_list("event_id", flat=True))
+    elif action in ("post_add", "post_remove"):
+        recount_attendees(pk_set if reverse else [instance.pk])
+    elif action == "post_clear":
+        recount_attendees(instance._cleared_event_ids if reverse else [instance.pk])
+
+
+@receiver(post_save, sender=Event)
+def announce_event_saved(sender, instance, created, **kwargs):
+    publish_on_commit("event.created" if created else "event.updated", instance.pk, instance.game_id)
+
+
+@receiver(post_save, sender=Event)
+def notify_event_changed(sender, instance, created, **kwargs):
+    """Email the attendees about a change they'd see, after the response has gone"""
+    if not created and notifications.attendees_see_change(getattr(instance, "_notified_values", None), instance):
+        jobs.enqueue("notify_attendees", event_id=instance.pk)
+
+
+@receiver(post_delete, sender=Event)
+def announce_event_deleted(sender, instance, **kwargs):
+    publish_on_commit("event.deleted", instance.pk, instance.game_id)
+
+
+def announce_attendance(kind, event_ids, attendee_ids):
+    """Publish a signup or cancellation for every (event, attendee) pair
+
+    Looks up the events' games for the ?game= filter, but only when
+    someone is listening.
+    """
+    if not event_hub.has_subscribers() or not event_ids:
+        return
+    games = dict(Event.objects.filter(pk__in=event_ids).values_list("id", "game_id"))
+    for event_id in event_ids:
+        for attendee_id in attendee_ids:
+            publish_on_commit(kind, event_id, games.get(event_id), attendee=attendee_id)
+
+
+@receiver(post_save, sender=EventGamer)
+def announce_signup(sender, instance, created, **kwargs):
+    if created:
+        announce_attendance("signup", [instance.event_id], [instance.attendee_id])
+
+
+@receiver(post_delete, sender=EventGamer)
+def announce_cancellation(sender, instance, **kwargs):
+    announce_attendance("cancellation", [instance.event_id], [instance.attendee_id])
+
+
+@receiver(m2m_changed, sender=EventGamer)
+def announce_bulk_attendance(sender, instance, action, reverse, pk_set, **kwargs):
+    """attendees.add()/remove()/clear() skip EventGamer's own signals"""
+    kind = "signup" if action == "post_add" else "cancellation"
+    if action in ("post_add", "post_remove"):
+        if reverse:
+            announce_attendance(kind, list(pk_set), [instance.pk])
+        else:
+            announce_attendance(kind, [instance.pk], list(pk_set))
+    elif action == "post_clear":
+        # The attendees are already gone, so a forward clear can't name them
+        if reverse:
+            announce_attendance(kind, instance._cleared_event_ids, [instance.pk])
+        else:
+            announce_attendance(kind, [instance.pk], [None])
+
+
+@receiver(pre_save, sender=Game)
+@receiver(pre_save, sender=Event)
+def remember_stats_owners(sender, instance, update_fields, **kwargs):
+    """Note who the row counted for before an update, so stats can follow it
+
+    For events, also note what attendees are told about, so they're only
+    emailed when that changes. A save whose update_fields leave all of that
+    alone skips the lookup.
+    """
+    instance._stats_owners = instance._notified_values = None
+    if instance._state.adding or instance.pk is None:
+        return
+    tracked = {"creator", "creator_id"} if sender is Game else {*notifications.EVENT_FIELDS, "game", "organizer"}
+    if update_fields is not None and not tracked & set(update_fields):
+        return
+    if sender is Game:
+        instance._stats_owners = Game.objects.filter(pk=instance.pk).values_list("creator_id").first()
+        return
+    before = Event.objects.filter(pk=instance.pk).values(*notifications.EVENT_FIELDS).first()
+    instance._stats_owners = (before["game_id"], before["organizer_id"]) if before else None
+    instance._notified_values = before
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.bulk_create([UserStats(user=instance)], ignore_conflicts=True)
+        bump_version(UserStats)
+
+
+@receiver(post_save, sender=Game)
+def count_game_saved(sender, instance, created, **kwargs):
+    if created:
+        GameStats.objects.bulk_create([GameStats(game=instance)], ignore_conflicts=True)
+        bump_version(GameStats)
+        stats.adjust(UserStats, instance.creator_id, games_created=1)
+        return
+    owners = getattr(instance, "_stats_owners", None)
+    if owners and owners[0] != instance.creator_id:
+        stats.adjust(UserStats, owners[0], games_created=-1)
+        stats.adjust(UserStats, instance.creator_id, games_created=1)
+
+
+@receiver(post_delete, sender=Game)
+def count_game_deleted(sender, instance, **kwargs):
+    stats.adjust(UserStats, instance.creator_id, games_created=-1)
+
+
+@receiver(post_save, sender=Event)
+def count_event_saved(sender, instance, created, **kwargs):
+    if created:
+        stats.adjust(GameStats, instance.game_id, event_count=1)
+        stats.adjust(UserStats, instance.organizer_id, events_organized=1)
+        return
+    owners = getattr(instance, "_stats_owners", None)
+    if not owners:
+        return
+    old_game_id, old_organizer_id = owners
+    if old_game_id != instance.game_id:
+        stats.event_moved(instance.pk, old_game_id, instance.game_id)
+    if old_organizer_id != instance.organizer_id:
+        stats.adjust(UserStats, old_organizer_id, events_organized=-1)
+        stats.adjust(UserStats, instance.organizer_id, events_organized=1)
+
+
+@receiver(post_delete, sender=Event)
+def count_event_deleted(sender, instance, **kwargs):
+    # Its EventGamer rows went first, through count_stats_cancellation
+    stats.adjust(GameStats, instance.game_id, event_count=-1)
+    stats.adjust(UserStats, instance.organizer_id, events_organized=-1)
+    jobs.enqueue_merged("recount_signups", game_ids=[instance.game_id])
+
+
+@receiver(post_save, sender=EventGamer)
+def count_stats_signup(sender, instance, created, **kwargs):
+    if created:
+        jobs.enqueue_merged("recount_signups", event_ids=[instance.event_id], user_ids=[instance.attendee_id])
+
+
+@receiver(post_delete, sender=EventGamer)
+def count_stats_cancellation(sender, instance, **kwargs):
+    # During a cascade the event may be gone by the time the job runs;
+    # count_event_deleted names its game
+    jobs.enqueue_merged("recount_signups", event_ids=[instance.event_id], user_ids=[instance.attendee_id])
+
+
+@receiver(m2m_changed, sender=EventGamer)
+def count_stats_bulk_attendance(sender, instance, action, reverse, pk_set, **kwargs):
+    """attendees.add() inserts with bulk_create, skipping EventGamer's post_save
+
+    remove() and clear() delete through the ORM, so count_stats_cancellation
+    already sees each row they remove.
+    """
+    if action == "post_add" and pk_set:
+        event_ids, user_ids = (pk_set, [instance.pk]) if reverse else ([instance.pk], pk_set)
+        jobs.enqueue_merged("recount_signups", event_ids=list(event_ids), user_ids=list(user_ids))
@@ -0,0 +1,112 @@
+"""Sparse fieldsets: ?fields= and ?expand= on list and retrieve actions
+
+Without either parameter a response is unchanged. With them:
+
+- `fields` is a comma separated list of the keys to return (default: all)
+- relations (organizer, game, attendees, type, creator) come back as ids
+  unless they are also named in `expand`, in which case they are nested
+  like before
+
+The same selection narrows the query: only() limits the columns, and
+joins and prefetches are only added for relations that are expanded.
+"""
+from django.contrib.auth.models import User
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def split_param(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+class SparseFieldset:
+    """The fields and expanded relations asked for by a request"""
+
+    def __init__(self, serializer_class, fields, expand):
+        self.serializer_class = serializer_class
+        self.fields = fields
+        self.expand = expand
+
+    @classmethod
+    def from_request(cls, request, serializer_class):
+        """Parse ?fields= and ?expand=, or return None if neither was given
+
+        Raises:
+            ValueError -- for names the serializer doesn't have
+        """
+        params = request.query_params
+        if "fields" not in params and "expand" not in params:
+            return None
+
+        available = serializer_class.Meta.fields
+        relations = serializer_class.relation_columns
+        wanted = set(split_param(params.get("fields", ""))) or set(available)
+        unknown = wanted - set(available)
+        if unknown:
+            raise ValueError(f"Unknown field: {', '.join(sorted(unknown))}")
+
+        expand = set(split_param(params.get("expand", "")))
+        not_relations = expand - set(relations)
+        if not_relations:
+            raise ValueError(f"Cannot expand: {', '.join(sorted(not_relations))}")
+
+        # Keep the serializer's own field order
+        fields = tuple(name for name in available if name in wanted)
+        return cls(serializer_class, fields, expand & wanted)
+
+    def serializer_kwargs(self):
+        return {"fields": self.fields, "expand": self.expand}
+
+    def narrow(self, queryset, extra_columns=()):
+        """Restrict the queryset to the columns and relations being returned"""
+        field_columns = self.serializer_class.field_columns
+        relations = self.serializer_class.relation_columns
+
+        columns = set(extra_columns)
+        joins = []
+        prefetches = []
+        for name in self.fields:
+            if name not in relations:
+                columns.update(field_columns.get(name, (name,)))
+                continue
+            many, related_columns = relations[name]
+            if many:
+                # Collapsed many-to-many still needs the ids, but nothing else
+                only = related_columns if name in self.expand else ()
+                prefetches.append(Prefetch(name, queryset=User.objects.only("id", *only).order_by("id")))
+            elif name in self.expand:
+                joins.append(name)
+                columns.add(name)
+                columns.update(f"{name}__{column}" for column in related_columns)
+            else:
+                # Just the foreign key column; no join
+                columns.add(name)
+
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if joins:
+            # select_related() with no arguments would follow every foreign key
+            queryset = queryset.select_related(*joins)
+        return queryset.prefetch_related(*prefetches).only("id", *columns)
+
+
+class SparseFieldsMixin:
+    """Serializer mixin taking `fields` and `expand` keyword arguments
+
+    Serializers using it declare:
+        field_columns -- model columns behind computed fields, e.g. date -> date_time
+        relation_columns -- relation name -> (many, columns read when expanded)
+    """
+
+    field_columns = {}
+    relation_columns = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None:
+            return
+        expand = set(expand or ())
+        for name in set(self.fields) - set(fields):
+            self.fields.pop(name)
+        for name, (many, _) in self.relation_columns.items():
+            if name in self.fields and name not in expand:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many)
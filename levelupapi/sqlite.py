@@ -0,0 +1,89 @@
+"""SQLite tuning applied to every new database connection
+
+With SQLite's defaults (rollback journal, deferred transactions) readers
+block behind a writer, and two transactions that both read and then write
+can deadlock, which SQLite resolves by failing one of them straight away
+with "database is locked", busy timeout or not. The settings here fix
+both:
+
+* WAL journal: readers and the single writer no longer block each other.
+* BEGIN IMMEDIATE for atomic() blocks: a write transaction takes the
+  write lock up front, so competing writers queue on busy_timeout instead
+  of deadlocking. Needs Django 5.1+ (the backend's transaction_mode);
+  older versions keep deferred transactions.
+* synchronous=NORMAL: the safe setting under WAL. A power cut can lose
+  the last commits but not corrupt the database.
+* A bigger page cache and memory-mapped reads.
+* The real bound parameter limit. Django assumes the 999 of SQLite builds
+  before 3.32 and splits a bulk_create into an INSERT per 999 values;
+  newer builds take 32766.
+
+Pragmas are run on the raw sqlite3 connection, so they don't count
+towards query totals in tests or Server-Timing. Read-only connections
+(replicas opened with mode=ro, see levelupapi.replicas) keep the journal
+mode of their file; changing it is a write.
+"""
+import sqlite3
+from django.conf import settings
+
+SQLITE_DEFAULTS = {
+    "ENABLED": True,
+    "JOURNAL_MODE": "WAL",
+    # Milliseconds a statement waits for a lock before failing
+    "BUSY_TIMEOUT": 5000,
+    "SYNCHRONOUS": "NORMAL",
+    # Negative: KiB rather than pages (20MB per connection)
+    "CACHE_SIZE": -20000,
+    # Bytes of the database file read through mmap
+    "MMAP_SIZE": 128 * 1024 * 1024,
+    "TEMP_STORE": "MEMORY",
+    # BEGIN mode for atomic() blocks (None leaves Django's default)
+    "TRANSACTION_MODE": "IMMEDIATE",
+}
+
+# (pragma, setting), in the order they're applied
+PRAGMAS = (
+    ("busy_timeout", "BUSY_TIMEOUT"),
+    ("journal_mode", "JOURNAL_MODE"),
+    ("synchronous", "SYNCHRONOUS"),
+    ("cache_size", "CACHE_SIZE"),
+    ("mmap_size", "MMAP_SIZE"),
+    ("temp_store", "TEMP_STORE"),
+)
+
+
+def get_config():
+    return {**SQLITE_DEFAULTS, **getattr(settings, "LEVELUP_SQLITE", {})}
+
+
+def configure_connection(connection):
+    """Apply LEVELUP_SQLITE to a freshly opened connection (a connection_created receiver)"""
+    if connection.vendor != "sqlite":
+        return
+    config = get_config()
+    if not config["ENABLED"]:
+        return
+    raw = connection.connection
+    read_only = "mode=ro" in str(connection.settings_dict["NAME"])
+    for pragma, setting in PRAGMAS:
+        if read_only and pragma == "journal_mode":
+            continue
+        if config[setting] is not None:
+            # Values come from settings, never from requests
+            raw.execute(f"PRAGMA {pragma} = {config[setting]}")
+    if config["TRANSACTION_MODE"]:
+        connection.transaction_mode = config["TRANSACTION_MODE"]
+    if hasattr(raw, "getlimit"):
+        # Python 3.11+; bulk_batch_size() reads it from this connection's features
+        connection.features.max_query_params = raw.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+
+
+def current_pragmas(connection):
+    """Returns: dict -- the live value of every pragma in PRAGMAS (None where it has none)"""
+    connection.ensure_connection()
+    values = {}
+    for pragma, _ in PRAGMAS:
+        # mmap_size returns no row for in-memory databases
+        row = connection.connection.execute(f"PRAGMA {pragma}").fetchone()
+        values[pragma] = row[0] if row else None
+    return values
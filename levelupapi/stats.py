@@ -0,0 +1,186 @@
+"""Materialized per-game and per-user statistics
+
+GameStats, UserStats and GamePlayer are moved incrementally with F()
+updates from the receivers in levelupapi.signals. Bulk writes that skip
+signals call the helpers here directly, and rebuild_stats recomputes
+everything from the source tables (see the rebuild_stats command).
+
+Signups and cancellations only enqueue a recount_signups job, and an event
+moving to another game a recount_games job, so the request doesn't pay for
+the GamePlayer upkeep. Until a job has run, attendee, player and
+events_attended counts lag behind.
+
+Decrements never create rows. During a cascading delete the row being
+decremented may already be gone, and recreating it would point at a row
+that's about to disappear.
+"""
+from collections import Counter
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from levelupapi.caching import bump_version
+from levelupapi.jobs import enqueue, job
+from levelupapi.models import Event, EventGamer, Game, GamePlayer, GameStats, UserStats
+
+GAME_FIELDS = ("event_count", "attendee_count", "player_count")
+USER_FIELDS = ("games_created", "events_organized", "events_attended")
+
+
+def adjust(model, key, **deltas):
+    """Add `deltas` to the stats row for `key`, creating it for increments"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas or key is None:
+        return
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    rows = model.objects.filter(pk=key)
+    if not rows.update(**changes) and all(delta > 0 for delta in deltas.values()):
+        model.objects.bulk_create([model(pk=key)], ignore_conflicts=True)
+        rows.update(**changes)
+    bump_version(model)
+
+
+@job("recount_signups")
+def recount_signups(event_ids=(), game_ids=(), user_ids=()):
+    """Recompute the signup counts touched by attendees joining or leaving events
+
+    The games are `game_ids` plus those of `event_ids` that still exist; the
+    users are `user_ids`. Counts are recomputed from EventGamer rather than
+    adjusted, so a job that runs twice, or after a later one, is harmless.
+    """
+    game_ids = set(game_ids) | set(Event.objects.filter(pk__in=event_ids).values_list("game_id", flat=True))
+    signups = EventGamer.objects.filter(event__game_id__in=game_ids)
+    # Read under the write lock (BEGIN IMMEDIATE), so a job that read earlier
+    # can't overwrite the counts of one that read later
+    with transaction.atomic():
+        players = {
+            (game_id, user_id): count for game_id, user_id, count
+            in signups.filter(attendee_id__in=user_ids).values_list("event__game_id", "attendee_id")
+            .annotate(n=Count("id")).order_by()
+        }
+        totals = {
+            game_id: (attendees, distinct) for game_id, attendees, distinct
+            in signups.values_list("event__game_id").annotate(
+                n=Count("id"), players=Count("attendee_id", distinct=True)).order_by()
+        }
+        attended = dict(EventGamer.objects.filter(attendee_id__in=user_ids).values_list("attendee_id")
+                        .annotate(n=Count("id")).order_by())
+        GamePlayer.objects.filter(game_id__in=game_ids, user_id__in=user_ids).delete()
+        GamePlayer.objects.bulk_create(
+            [GamePlayer(game_id=game_id, user_id=user_id, signups=count)
+             for (game_id, user_id), count in players.items()], batch_size=500)
+        for game_id in game_ids:
+            attendees, distinct = totals.get(game_id, (0, 0))
+            GameStats.objects.filter(pk=game_id).update(attendee_count=attendees, player_count=distinct)
+        for user_id in user_ids:
+            UserStats.objects.filter(pk=user_id).update(events_attended=attended.get(user_id, 0))
+    bump_version(GameStats)
+    bump_version(UserStats)
+
+
+def event_moved(event_id, old_game_id, new_game_id):
+    """An event changed game: its signups count for the new one from now on"""
+    adjust(GameStats, old_game_id, event_count=-1)
+    adjust(GameStats, new_game_id, event_count=1)
+    if EventGamer.objects.filter(event_id=event_id).exists():
+        enqueue("recount_games", game_ids=[old_game_id, new_game_id])
+
+
+@job("recount_games")
+def recount_games(game_ids):
+    """Recompute the signup counts and GamePlayer rows of some games from EventGamer"""
+    signups = (EventGamer.objects.filter(event__game_id__in=game_ids)
+               .values_list("event__game_id", "attendee_id").annotate(n=Count("id")).order_by())
+    with transaction.atomic():
+        players = {(game_id, user_id): count for game_id, user_id, count in signups}
+        GamePlayer.objects.filter(game_id__in=game_ids).delete()
+        GamePlayer.objects.bulk_create(
+            [GamePlayer(game_id=game_id, user_id=user_id, signups=count)
+             for (game_id, user_id), count in players.items()], batch_size=500)
+        for game_id in game_ids:
+            counts = [count for (game, _), count in players.items() if game == game_id]
+            GameStats.objects.filter(pk=game_id).update(attendee_count=sum(counts), player_count=len(counts))
+    bump_version(GameStats)
+
+
+def games_created(games):
+    """Count games inserted with bulk_create"""
+    GameStats.objects.bulk_create([GameStats(game_id=game.pk) for game in games], ignore_conflicts=True)
+    for creator_id, count in Counter(game.creator_id for game in games).items():
+        adjust(UserStats, creator_id, games_created=count)
+    bump_version(GameStats)
+
+
+def events_created(events):
+    """Count events inserted with bulk_create (they have no attendees yet)"""
+    for game_id, count in Counter(event.game_id for event in events).items():
+        adjust(GameStats, game_id, event_count=count)
+    for organizer_id, count in Counter(event.organizer_id for event in events).items():
+        adjust(UserStats, organizer_id, events_organized=count)
+
+
+def compute_stats():
+    """Every stats row as it should be, computed from the source tables
+
+    Returns:
+        tuple -- ({game_id: counts}, {user_id: counts}, {(game_id, user_id): signups})
+    """
+    games = {game_id: dict.fromkeys(GAME_FIELDS, 0) for game_id in Game.objects.values_list("id", flat=True)}
+    for game_id, count in Event.objects.values_list("game_id").annotate(n=Count("id")).order_by():
+        games[game_id]["event_count"] = count
+
+    players = {}
+    signups = EventGamer.objects.values_list("event__game_id", "attendee_id").annotate(n=Count("id")).order_by()
+    for game_id, user_id, count in signups:
+        players[(game_id, user_id)] = count
+        games[game_id]["attendee_count"] += count
+        games[game_id]["player_count"] += 1
+
+    users = {user_id: dict.fromkeys(USER_FIELDS, 0) for user_id in User.objects.values_list("id", flat=True)}
+    for field, rows in (
+        ("games_created", Game.objects.values_list("creator_id")),
+        ("events_organized", Event.objects.values_list("organizer_id")),
+        ("events_attended", EventGamer.objects.values_list("attendee_id")),
+    ):
+        for user_id, count in rows.annotate(n=Count("id")).order_by():
+            users[user_id][field] = count
+    return games, users, players
+
+
+def stored_stats():
+    """The stats rows as they are now, in the shape compute_stats() returns"""
+    games = {row.pop("game_id"): row for row in GameStats.objects.values("game_id", *GAME_FIELDS)}
+    users = {row.pop("user_id"): row for row in UserStats.objects.values("user_id", *USER_FIELDS)}
+    players = {(game_id, user_id): count for game_id, user_id, count
+               in GamePlayer.objects.values_list("game_id", "user_id", "signups")}
+    return games, users, players
+
+
+def find_drift(expected, stored):
+    """Keys whose stored value is missing, extra or different
+
+    Returns:
+        list -- (key, expected value or None, stored value or None)
+    """
+    return [
+        (key, expected.get(key), stored.get(key))
+        for key in sorted(set(expected) | set(stored), key=str)
+        if expected.get(key) != stored.get(key)
+    ]
+
+
+def rebuild_stats(computed=None):
+    """Replace every stats row with freshly computed values"""
+    games, users, players = computed or compute_stats()
+    with transaction.atomic():
+        GamePlayer.objects.all().delete()
+        GameStats.objects.all().delete()
+        UserStats.objects.all().delete()
+        GameStats.objects.bulk_create(
+            [GameStats(game_id=game_id, **counts) for game_id, counts in games.items()], batch_size=500)
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id, **counts) for user_id, counts in users.items()], batch_size=500)
+        GamePlayer.objects.bulk_create(
+            [GamePlayer(game_id=game_id, user_id=user_id, signups=count)
+             for (game_id, user_id), count in players.items()], batch_size=500)
+    bump_version(GameStats)
+    bump_version(UserStats)
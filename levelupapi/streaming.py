@@ -0,0 +1,43 @@
+"""Incremental JSON output for large list responses"""
+from django.http import StreamingHttpResponse
+from levelupapi.renderers import FastJSONRenderer
+
+# Rows pulled from the database (and prefetched) per round trip
+STREAM_CHUNK_SIZE = 500
+
+
+def is_stream_requested(request):
+    """Clients opt in with ?stream=true"""
+    return request.query_params.get("stream", "").lower() in ("1", "true", "yes")
+
+
+def iter_json_array(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE, serializer_kwargs=None):
+    """Yield a JSON array one serialized row at a time
+
+    Each row goes through the same serializer and renderer a normal
+    Response would use, so the joined output matches it byte for byte.
+    """
+    renderer = FastJSONRenderer()
+    serializer_kwargs = serializer_kwargs or {}
+    yield b"["
+    first = True
+    for row in queryset.iterator(chunk_size=chunk_size):
+        body = renderer.render(serializer_class(row, **serializer_kwargs).data)
+        if first:
+            first = False
+            yield body
+        else:
+            yield b"," + body
+    yield b"]"
+
+
+def streaming_json_response(queryset, serializer_class, chunk_size=STREAM_CHUNK_SIZE, serializer_kwargs=None):
+    """Build a StreamingHttpResponse for a serialized queryset
+
+    Returns:
+        StreamingHttpResponse -- JSON array written as rows are read
+    """
+    return StreamingHttpResponse(
+        iter_json_array(queryset, serializer_class, chunk_size, serializer_kwargs),
+        content_type="application/json",
+    )
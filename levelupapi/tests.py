@@ -1,3 +1,2328 @@
-from django.test import TestCase
+from datetime import datetime, timedelta
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from levelupapi.authentication import TokenCache, token_cache
+from levelupapi.throttling import local_buckets
+from levelupapi.models import Event, EventGamer, Game, GamePlayer, GameStats, GameType, UserStats
 
-# Create your tests here.
+
+def make_dataset(events=0, games=1, users=3, attendees_per_event=2):
+    """Build a small, deterministic set of rows for view tests
+
+    Returns:
+        dict -- the created users, game types, games and events
+    """
+    gamers = [
+        User.objects.create(
+            username=f"gamer{i}", first_name=f"First{i}", last_name=f"Last{i}",
+        )
+        for i in range(users)
+    ]
+    game_type = GameType.objects.create(label="Board game")
+    game_rows = [
+        Game.objects.create(
+            name=f"Game {i}", manufacturer="Acme", number_of_players=4,
+            type=game_type, creator=gamers[i % users],
+        )
+        for i in range(games)
+    ]
+    start = datetime(2024, 1, 1, 18, 30)
+    event_rows = []
+    for i in range(events):
+        event = Event.objects.create(
+            name=f"Event {i}", date_time=start + timedelta(days=i),
+            location="Cafe", organizer=gamers[i % users],
+            game=game_rows[i % games],
+        )
+        for j in range(attendees_per_event):
+            EventGamer.objects.create(event=event, attendee=gamers[(i + j) % users])
+        event_rows.append(event)
+    run_due_jobs()
+    return {"users": gamers, "game_type": game_type, "games": game_rows, "events": event_rows}
+
+
+def run_due_jobs():
+    """Run the jobs writes have queued, as the pool would after they commit"""
+    from levelupapi.jobs import due_jobs, run_job
+    for job_id in due_jobs(100):
+        run_job(job_id)
+
+
+# Pool threads can't see a test's uncommitted rows; tests run jobs themselves
+@override_settings(LEVELUP_JOBS={"WORKERS": 0})
+class LevelupTestCase(TestCase):
+    """Starts every test with empty in-process caches"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        local_buckets.clear()
+
+
+class QueryCountTests(LevelupTestCase):
+    """List and retrieve endpoints must not issue a query per row"""
+
+    sizes = (1, 10, 50)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def login(self, user):
+        self.client.force_authenticate(user=user)
+
+    def test_event_list_query_count_is_constant(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                data = make_dataset(events=size, games=3)
+                self.login(data["users"][0])
+                # events + organizer + game in one query, attendees in another
+                with self.assertNumQueries(2):
+                    response = self.client.get("/events")
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.json()), Event.objects.count())
+                with self.captureOnCommitCallbacks(execute=True):
+                    Event.objects.all().delete()
+                    Game.objects.all().delete()
+                    GameType.objects.all().delete()
+                    User.objects.all().delete()
+
+    def test_event_list_filtered_by_game_query_count(self):
+        data = make_dataset(events=20, games=2)
+        self.login(data["users"][0])
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/events?game={data['games'][0].id}")
+        self.assertEqual(len(response.json()), 10)
+
+    def test_event_retrieve_query_count(self):
+        data = make_dataset(events=1, users=5, attendees_per_event=5)
+        self.login(data["users"][0])
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/events/{data['events'][0].id}")
+        self.assertEqual(len(response.json()["attendees"]), 5)
+
+    def test_game_list_query_count_is_constant(self):
+        for size in self.sizes:
+            with self.subTest(size=size):
+                data = make_dataset(games=size)
+                self.login(data["users"][0])
+                with self.assertNumQueries(1):
+                    response = self.client.get("/games")
+                self.assertEqual(len(response.json()), size)
+                with self.captureOnCommitCallbacks(execute=True):
+                    Game.objects.all().delete()
+                    GameType.objects.all().delete()
+                    User.objects.all().delete()
+
+    def test_game_retrieve_query_count(self):
+        data = make_dataset(games=1)
+        self.login(data["users"][0])
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/games/{data['games'][0].id}")
+        self.assertEqual(response.json()["creator"]["full_name"], "First0 Last0")
+        self.assertEqual(response.json()["type"]["label"], "Board game")
+
+
+class KeysetPaginationTests(LevelupTestCase):
+    """Cursor pagination on /events and /games"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=25, games=5)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def walk(self, url):
+        """Follow next links until the last page, returning every page"""
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.json()["results"])
+            url = response.json()["next"]
+        return pages
+
+    def test_unpaginated_list_is_unchanged(self):
+        response = self.client.get("/events")
+        self.assertIsInstance(response.json(), list)
+        self.assertEqual(len(response.json()), 25)
+
+    def test_events_page_in_date_order(self):
+        pages = self.walk("/events?page_size=10")
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        ids = [event["id"] for page in pages for event in page]
+        expected = list(Event.objects.order_by("date_time", "id").values_list("id", flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_events_with_equal_date_time_are_not_skipped(self):
+        same_time = self.data["events"][0].date_time
+        Event.objects.update(date_time=same_time)
+        pages = self.walk("/events?page_size=7")
+        ids = [event["id"] for page in pages for event in page]
+        self.assertEqual(sorted(ids), sorted(e.id for e in self.data["events"]))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    def test_pagination_combines_with_game_filter(self):
+        game = self.data["games"][0]
+        pages = self.walk(f"/events?game={game.id}&page_size=2")
+        ids = [event["id"] for page in pages for event in page]
+        self.assertEqual(len(ids), 5)
+        self.assertTrue(all(Event.objects.get(pk=i).game_id == game.id for i in ids))
+
+    def test_cursor_is_stable_across_inserts(self):
+        first = self.client.get("/events?page_size=10")
+        Event.objects.create(
+            name="Earlier", date_time=datetime(2000, 1, 1), location="Cafe",
+            organizer=self.data["users"][0], game=self.data["games"][0],
+        )
+        second = self.client.get(first.json()["next"])
+        expected = list(Event.objects.exclude(name="Earlier")
+                        .order_by("date_time", "id").values_list("id", flat=True)[10:20])
+        self.assertEqual([event["id"] for event in second.json()["results"]], expected)
+
+    def test_page_query_count_does_not_grow(self):
+        url = "/events?page_size=5"
+        while url:
+            with self.assertNumQueries(2):
+                response = self.client.get(url)
+            url = response.json()["next"]
+
+    def test_invalid_cursor(self):
+        # Games leave the error to DRF's handler, events catch it themselves; same body either way
+        for url in ("/events", "/games", "/stats/games"):
+            response = self.client.get(url, {"cursor": "not-a-cursor"})
+            self.assertEqual((response.status_code, response.json()), (404, {"error": "Invalid cursor"}))
+
+    def test_games_page_by_id(self):
+        pages = self.walk("/games?page_size=2")
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        ids = [game["id"] for page in pages for game in page]
+        self.assertEqual(ids, sorted(game.id for game in self.data["games"]))
+
+    def test_page_size_is_capped(self):
+        response = self.client.get("/games?page_size=100000")
+        self.assertEqual(len(response.json()["results"]), 5)
+        self.assertIsNone(response.json()["next"])
+
+
+class StreamingListTests(LevelupTestCase):
+    """?stream=true on /events and /games"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=30, games=4)
+        Event.objects.filter(pk=self.data["events"][0].pk).update(name="Café   night")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def assertStreamMatches(self, url):
+        buffered = self.client.get(url)
+        streamed = self.client.get(f"{url}{'&' if '?' in url else '?'}stream=true")
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(streamed["Content-Type"], "application/json")
+        self.assertEqual(b"".join(streamed.streaming_content), buffered.content)
+
+    def test_event_stream_matches_buffered_output(self):
+        self.assertStreamMatches("/events")
+
+    def test_event_stream_respects_game_filter(self):
+        self.assertStreamMatches(f"/events?game={self.data['games'][1].id}")
+
+    def test_game_stream_matches_buffered_output(self):
+        self.assertStreamMatches("/games")
+
+    def test_empty_stream_is_valid_json(self):
+        Event.objects.all().delete()
+        streamed = self.client.get("/events?stream=true")
+        self.assertEqual(b"".join(streamed.streaming_content), b"[]")
+
+    def test_stream_reads_in_chunks(self):
+        from levelupapi.streaming import iter_json_array
+        from levelupapi.views import EventView
+        from levelupapi.views.events import EventSerializer
+        # one events cursor read with fetchmany plus one attendee prefetch per chunk of 10
+        with self.assertNumQueries(4):
+            body = b"".join(iter_json_array(EventView().get_queryset(), EventSerializer, chunk_size=10))
+        self.assertTrue(body.startswith(b"[{") and body.endswith(b"}]"))
+
+
+class CachedTokenAuthenticationTests(LevelupTestCase):
+    """Token lookups are served from token_cache after the first request"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(games=1)
+        self.user = self.data["users"][0]
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def tearDown(self):
+        token_cache.clear()
+
+    def test_second_request_skips_token_query(self):
+        with self.assertNumQueries(2):
+            self.client.get("/games")
+        # a different query string so the view runs again instead of the response cache
+        with self.assertNumQueries(1):
+            response = self.client.get("/games?page_size=10")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(token_cache.stats()["hits"], 1)
+        self.assertEqual(token_cache.stats()["misses"], 1)
+
+    def test_unknown_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION="Token nope")
+        self.assertEqual(self.client.get("/games").status_code, 401)
+
+    def test_deleted_token_stops_working(self):
+        self.client.get("/games")
+        self.token.delete()
+        self.assertEqual(self.client.get("/games").status_code, 401)
+
+    def test_user_change_invalidates_entry(self):
+        self.client.get("/games")
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(token_cache.get(self.token.key))
+        self.assertEqual(self.client.get("/games").status_code, 401)
+
+    def test_lru_is_bounded(self):
+        cache = TokenCache(max_entries=2, ttl=60)
+        for i, user in enumerate(self.data["users"]):
+            cache.set(f"key{i}", user)
+        self.assertIsNone(cache.get("key0"))
+        self.assertEqual(cache.get("key2"), self.data["users"][2])
+        self.assertEqual(cache.stats()["size"], 2)
+
+    def test_every_hit_gets_its_own_user(self):
+        for cache in (TokenCache(), TokenCache(shared_cache="default")):
+            cache.set("key", self.user)
+            first, second = cache.get("key"), cache.get("key")
+            self.assertIsNot(first, second)
+            self.assertEqual((first.pk, first.username, first.is_active),
+                             (self.user.pk, self.user.username, self.user.is_active))
+
+    def test_expired_entries_are_misses(self):
+        cache = TokenCache(ttl=-1)
+        cache.set("key", self.user)
+        self.assertIsNone(cache.get("key"))
+
+    def test_shared_cache_invalidation_reaches_every_worker(self):
+        writer = TokenCache(shared_cache="default")
+        reader = TokenCache(shared_cache="default")
+        writer.set(self.token.key, self.user)
+        self.assertEqual(reader.get(self.token.key), self.user)
+        writer.invalidate(self.token.key)
+        self.assertIsNone(reader.get(self.token.key))
+
+        reader.set(self.token.key, self.user)
+        self.assertEqual(writer.get(self.token.key), self.user)
+        writer.invalidate_user(self.user.pk)
+        self.assertIsNone(reader.get(self.token.key))
+
+
+class ResponseCacheTests(LevelupTestCase):
+    """ETags, 304s and the version-keyed rendered response cache"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=5, games=3)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def test_repeat_get_does_no_database_work(self):
+        for url in ("/gametypes", "/games", "/events", f"/events/{self.data['events'][0].id}"):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(first.content, second.content)
+                self.assertEqual(first["ETag"], second["ETag"])
+                self.assertEqual(second["Content-Type"], "application/json")
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get("/games")["ETag"]
+        response = self.client.get("/games", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        response = self.client.get("/games", HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_invalidate_dependent_responses(self):
+        game_type = self.data["game_type"]
+        before = self.client.get(f"/gametypes/{game_type.id}")
+        game_type.label = "Card game"
+        with self.captureOnCommitCallbacks(execute=True):
+            game_type.save()
+        after = self.client.get(f"/gametypes/{game_type.id}")
+        self.assertNotEqual(before["ETag"], after["ETag"])
+        self.assertEqual(after.json()["label"], "Card game")
+        self.assertEqual(self.client.get("/games").json()[0]["type"]["label"], "Card game")
+
+    def test_attendee_changes_invalidate_events(self):
+        event = self.data["events"][0]
+        self.client.get(f"/events/{event.id}")
+        with self.captureOnCommitCallbacks(execute=True):
+            event.attendees.add(self.data["users"][2])
+        response = self.client.get(f"/events/{event.id}")
+        self.assertEqual(len(response.json()["attendees"]), 3)
+
+    def test_user_rename_invalidates_games(self):
+        self.client.get("/games")
+        creator = self.data["users"][0]
+        creator.first_name = "Renamed"
+        with self.captureOnCommitCallbacks(execute=True):
+            creator.save()
+        self.assertEqual(self.client.get("/games").json()[0]["creator"]["full_name"], "Renamed Last0")
+
+    def test_versions_are_shared_between_workers(self):
+        from django.conf import settings
+        from django.core.cache.backends.filebased import FileBasedCache
+        from levelupapi.caching import bump_version, get_versions
+        # Another process opening the same cache directory
+        config = settings.CACHES["default"]
+        other_worker = FileBasedCache(config["LOCATION"], config.get("OPTIONS", {}))
+        before = get_versions([Game])
+        self.assertEqual(other_worker.get("levelup:version:levelupapi.game"), before[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version(Game)
+            # Not until the write commits
+            self.assertEqual(other_worker.get("levelup:version:levelupapi.game"), before[0])
+        self.assertNotEqual(other_worker.get("levelup:version:levelupapi.game"), before[0])
+
+    def test_missing_rows_are_not_cached(self):
+        self.assertEqual(self.client.get("/games/999").status_code, 404)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get("/games/999").status_code, 404)
+
+
+class BatchCreateTests(LevelupTestCase):
+    """POSTing a JSON array to /games or /events"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(games=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def game_payload(self, count):
+        return [
+            {"name": f"Batch {i}", "manufacturer": "Acme", "number_of_players": 2,
+             "type": self.data["game_type"].id}
+            for i in range(count)
+        ]
+
+    def event_payload(self, count):
+        return [
+            {"name": f"Batch {i}", "date": "2024-05-01", "time": "19:00", "location": "Hall",
+             "game": self.data["games"][i % 2].id}
+            for i in range(count)
+        ]
+
+    def count_queries(self, url, payload):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(url, payload, format="json")
+        self.assertEqual(response.status_code, 201)
+        return len(context.captured_queries)
+
+    def test_game_batch_creates_every_item(self):
+        response = self.client.post("/games", self.game_payload(3), format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result["index"] for result in response.json()], [0, 1, 2])
+        self.assertEqual(response.json()[0]["data"]["creator"]["full_name"], "First0 Last0")
+        self.assertEqual(Game.objects.filter(name__startswith="Batch").count(), 3)
+
+    def test_event_batch_creates_every_item(self):
+        response = self.client.post("/events", self.event_payload(4), format="json")
+        self.assertEqual(response.status_code, 201)
+        data = response.json()[1]["data"]
+        self.assertEqual((data["date"], data["time"], data["attendees"]), ("2024-05-01", "07:00 PM", []))
+        self.assertEqual(Event.objects.count(), 4)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        # both sizes fit in one INSERT under SQLite's bound parameter limit
+        small = self.count_queries("/games", self.game_payload(5))
+        large = self.count_queries("/games", self.game_payload(150))
+        self.assertEqual(small, large)
+        small = self.count_queries("/events", self.event_payload(5))
+        large = self.count_queries("/events", self.event_payload(150))
+        self.assertEqual(small, large)
+
+    def test_invalid_items_are_reported_and_skipped(self):
+        payload = self.game_payload(2) + [
+            {"name": "", "manufacturer": "Acme", "number_of_players": "x", "type": 999},
+            "not an object",
+        ]
+        response = self.client.post("/games", payload, format="json")
+        self.assertEqual(response.status_code, 207)
+        results = response.json()
+        self.assertEqual([result["status"] for result in results], [201, 201, 400, 400])
+        self.assertEqual(set(results[2]["errors"]), {"name", "number_of_players", "type"})
+        self.assertEqual(Game.objects.filter(name__startswith="Batch").count(), 2)
+
+    def test_invalid_event_datetime_is_reported(self):
+        payload = self.event_payload(1)
+        payload[0]["date"] = "2024-02-31"
+        response = self.client.post("/events", payload, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertIn("date", response.json()[0]["errors"])
+
+    def test_empty_batch_is_rejected(self):
+        self.assertEqual(self.client.post("/games", [], format="json").status_code, 400)
+
+    def test_batch_invalidates_cached_lists(self):
+        before = len(self.client.get("/games").json())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/games", self.game_payload(2), format="json")
+        self.assertEqual(len(self.client.get("/games").json()), before + 2)
+
+
+class SignupTests(LevelupTestCase):
+    """POST/DELETE /events/{id}/signup and Event.attendee_count"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=1, users=4, attendees_per_event=0)
+        self.event = self.data["events"][0]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def count(self):
+        return Event.objects.get(pk=self.event.pk).attendee_count
+
+    def test_join_and_leave(self):
+        url = f"/events/{self.event.id}/signup"
+        self.assertEqual(self.client.post(url).status_code, 204)
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(self.client.get(f"/events/{self.event.id}").json()["attendee_count"], 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.count(), 0)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_duplicate_join_is_rejected_without_changing_count(self):
+        url = f"/events/{self.event.id}/signup"
+        self.client.post(url)
+        self.assertEqual(self.client.post(url).status_code, 409)
+        self.assertEqual(self.count(), 1)
+        self.assertEqual(EventGamer.objects.filter(event=self.event).count(), 1)
+
+    def test_unique_constraint_blocks_duplicate_rows(self):
+        from django.db import IntegrityError, transaction
+        EventGamer.objects.create(event=self.event, attendee=self.data["users"][1])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            EventGamer.objects.create(event=self.event, attendee=self.data["users"][1])
+
+    def test_unknown_event(self):
+        self.assertEqual(self.client.post("/events/999/signup").status_code, 404)
+
+    def test_m2m_helpers_keep_count_in_step(self):
+        users = self.data["users"]
+        self.event.attendees.add(users[1], users[2])
+        self.assertEqual(self.count(), 2)
+        self.event.attendees.remove(users[1], users[3])
+        self.assertEqual(self.count(), 1)
+        users[2].attending_events.clear()
+        self.assertEqual(self.count(), 0)
+
+    def test_deleting_user_decrements_count(self):
+        self.event.attendees.add(self.data["users"][2])
+        self.data["users"][2].delete()
+        self.assertEqual(self.count(), 0)
+
+
+class DateFilterTests(LevelupTestCase):
+    """?from=, ?to= and ?upcoming=true on /events"""
+
+    def setUp(self):
+        super().setUp()
+        # events on 2024-01-01 18:30 through 2024-01-10 18:30
+        self.data = make_dataset(events=10, games=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def names(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(int(event["name"].split()[-1]) for event in response.json())
+
+    def test_date_range(self):
+        self.assertEqual(self.names("/events?from=2024-01-03&to=2024-01-05"), [2, 3, 4])
+        self.assertEqual(self.names("/events?from=2024-01-03T19:00:00"), [3, 4, 5, 6, 7, 8, 9])
+        self.assertEqual(self.names("/events?to=2024-01-02T18:30:00"), [0, 1])
+
+    def test_range_combines_with_game(self):
+        game = self.data["games"][0]
+        self.assertEqual(self.names(f"/events?game={game.id}&from=2024-01-03&to=2024-01-08"), [2, 4, 6])
+
+    def test_upcoming(self):
+        Event.objects.filter(name="Event 9").update(date_time=datetime.now() + timedelta(days=2))
+        self.assertEqual(self.names("/events?upcoming=true"), [9])
+
+    def test_invalid_bound(self):
+        response = self.client.get("/events?from=yesterday")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid from date"})
+
+    def test_filters_use_an_index(self):
+        from django.db import connection
+        from levelupapi.views import EventView
+        view = EventView()
+        game = self.data["games"][0]
+        combinations = [
+            {"from": "2024-01-03"},
+            {"to": "2024-01-05"},
+            {"from": "2024-01-03", "to": "2024-01-05"},
+            {"upcoming": "true"},
+            {"game": game.id},
+            {"game": game.id, "from": "2024-01-03"},
+            {"game": game.id, "from": "2024-01-03", "to": "2024-01-05"},
+            {"game": game.id, "upcoming": "true"},
+        ]
+        for params in combinations:
+            with self.subTest(params=params):
+                events = Event.objects.all()
+                if "game" in params:
+                    events = events.filter(game=params["game"])
+                events = view.filter_by_date(events, params)
+                sql, sql_params = events.query.sql_with_params()
+                with connection.cursor() as cursor:
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", sql_params)
+                    plan = " ".join(row[-1] for row in cursor.fetchall())
+                self.assertIn("USING INDEX", plan.replace("COVERING ", ""))
+                self.assertNotIn("SCAN levelupapi_event ", plan + " ")
+
+
+class SeedAndBenchmarkCommandTests(LevelupTestCase):
+    """seed_data and benchmark management commands"""
+
+    def seed(self, **options):
+        from io import StringIO
+        from django.core.management import call_command
+        call_command("seed_data", users=5, game_types=2, games=10, events=30, attendance=2,
+                     stdout=StringIO(), **options)
+
+    def snapshot(self):
+        return (
+            list(Game.objects.order_by("id").values_list("name", "manufacturer", "type__label")),
+            list(Event.objects.order_by("id").values_list("name", "date_time", "game__name", "attendee_count")),
+            sorted(EventGamer.objects.values_list("event__name", "attendee__username")),
+        )
+
+    def test_seed_is_deterministic(self):
+        self.seed(seed=7)
+        first = self.snapshot()
+        self.seed(seed=7, flush=True)
+        self.assertEqual(self.snapshot(), first)
+        self.seed(seed=8, flush=True)
+        self.assertNotEqual(self.snapshot(), first)
+
+    def test_seed_fills_the_stats_tables(self):
+        from io import StringIO
+        from django.core.management import call_command
+        self.seed()
+        call_command("rebuild_stats", "--check", stdout=StringIO())
+        self.assertEqual(GameStats.objects.count(), 10)
+
+    def test_seeded_counts_match_attendance(self):
+        self.seed()
+        for event in Event.objects.all():
+            self.assertEqual(event.attendee_count, event.attendees.count())
+
+    def test_benchmark_writes_results_and_rolls_back(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        self.seed()
+        games = Game.objects.count()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "bench.json")
+            call_command("benchmark", requests=2, warmup=0, output=path, host="testserver",
+                         only="games.list,events.retrieve,games.create,me.dashboard,stats.users.list,events.stream",
+                         stdout=StringIO())
+            with open(path, encoding="utf-8") as results_file:
+                results = json.load(results_file)["results"]
+        self.assertEqual(set(results), {"games.list", "events.retrieve", "games.create", "me.dashboard",
+                                        "stats.users.list", "events.stream"})
+        self.assertEqual(results["games.create"]["status"], {"201": 2})
+        for name in ("games.list", "me.dashboard", "stats.users.list"):
+            self.assertEqual(results[name]["status"], {"200": 2})
+        self.assertEqual(results["events.stream"]["status"], {"200": 1})
+        self.assertEqual(results["events.stream"]["requests"], 2)
+        for key in ("p50_ms", "p95_ms", "p99_ms", "queries_mean", "peak_memory_kb"):
+            self.assertIsNotNone(results["events.retrieve"][key])
+        self.assertEqual(Game.objects.count(), games)
+
+    def test_percentile_is_nearest_rank(self):
+        from levelupapi.management.commands.benchmark import percentile
+        samples = list(range(1, 11))
+        self.assertEqual([percentile(samples, pct) for pct in (0, 10, 50, 95, 100)], [1, 1, 5, 10, 10])
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+        self.assertIsNone(percentile([], 50))
+
+    def test_benchmark_is_not_throttled(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.conf import settings
+        from django.core.management import call_command
+        self.seed()
+        rates = {**settings.REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"], "login": "2/min", "write": "2/min"}
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": rates},
+                                  PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]):
+            path = os.path.join(directory, "bench.json")
+            call_command("benchmark", requests=5, warmup=0, output=path, host="testserver",
+                         only="login,games.create", stdout=StringIO())
+            with open(path, encoding="utf-8") as results_file:
+                results = json.load(results_file)["results"]
+        self.assertEqual(results["login"]["status"], {"200": 5})
+        self.assertEqual(results["games.create"]["status"], {"201": 5})
+
+
+class SQLInstrumentationTests(LevelupTestCase):
+    """Server-Timing header and slow request log from SQLInstrumentationMiddleware"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=3, games=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def test_server_timing_reports_queries(self):
+        response = self.client.get(f"/games/{self.data['games'][0].id}")
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="1 queries", app;dur=[\d.]+$')
+
+    def test_cached_response_reports_no_queries(self):
+        self.client.get("/gametypes")
+        self.assertIn('desc="0 queries"', self.client.get("/gametypes")["Server-Timing"])
+
+    @override_settings(LEVELUP_SQL_INSTRUMENTATION={"QUERY_COUNT_THRESHOLD": 1, "SLOWEST_STATEMENTS": 1})
+    def test_requests_over_threshold_are_logged(self):
+        import json
+        with self.assertLogs("levelupapi.sql", "WARNING") as logs:
+            self.client.get("/events")
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual((line["path"], line["queries"], line["status"]), ("/events", 2, 200))
+        self.assertEqual(len(line["slowest"]), 1)
+
+    def test_fast_requests_are_not_logged(self):
+        from unittest import mock
+        from levelupapi.middleware import logger
+        with mock.patch.object(logger, "warning") as warning:
+            self.client.get("/gametypes")
+        warning.assert_not_called()
+
+
+class FastSerializerParityTests(LevelupTestCase):
+    """serialize_events/serialize_games must match the DRF serializers exactly"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=40, games=6, users=5, attendees_per_event=3)
+        # cover midnight, noon and single digit hours
+        for event, hour in zip(self.data["events"], (0, 12, 9, 23)):
+            Event.objects.filter(pk=event.pk).update(date_time=datetime(2024, 3, 5, hour, 5))
+        Event.objects.filter(pk=self.data["events"][5].pk).update(name='Quote " and emoji \U0001F3B2')
+
+    def render(self, data):
+        from rest_framework.renderers import JSONRenderer
+        return JSONRenderer().render(data)
+
+    def test_event_parity(self):
+        from levelupapi.fast_serializers import serialize_events
+        from levelupapi.views import EventView
+        from levelupapi.views.events import EventSerializer
+        queryset = EventView().get_queryset()
+        for events in (queryset, queryset.filter(game=self.data["games"][1]), queryset.none()):
+            with self.subTest(query=str(events.query) if events.exists() else "empty"):
+                self.assertEqual(self.render(serialize_events(events)),
+                                 self.render(EventSerializer(events, many=True).data))
+
+    def test_game_parity(self):
+        from levelupapi.fast_serializers import serialize_games
+        from levelupapi.views import GameView
+        from levelupapi.views.games import GameSerializer
+        games = GameView().get_queryset()
+        self.assertEqual(self.render(serialize_games(games)),
+                         self.render(GameSerializer(games, many=True).data))
+
+    def test_event_list_uses_two_queries(self):
+        from levelupapi.fast_serializers import serialize_events
+        from levelupapi.views import EventView
+        with self.assertNumQueries(2):
+            serialize_events(EventView().get_queryset())
+
+    def test_signups_query_binds_no_event_ids(self):
+        import sqlite3
+        from django.db import connection
+        from levelupapi.fast_serializers import serialize_event_lists, serialize_events
+        from levelupapi.views import EventView
+        queryset = EventView().get_queryset()
+        connection.ensure_connection()
+        # Far fewer than the 40 events, as if there were more events than SQLite allows
+        previous = connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 5)
+        try:
+            events = serialize_events(queryset)
+            page, rest = serialize_event_lists([queryset, queryset.filter(game=self.data["games"][1])], 3)
+        finally:
+            connection.connection.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, previous)
+        self.assertEqual(len(events), 40)
+        self.assertTrue(all(len(event["attendees"]) == 3 for event in events))
+        # Unordered, the lists are sliced in id order
+        events.sort(key=lambda event: event["id"])
+        self.assertEqual(page, events[:3])
+        self.assertEqual(rest, [event for event in events if event["game"]["id"] == self.data["games"][1].id][:3])
+
+
+class FastJSONTests(TestCase):
+    """FastJSONRenderer/FastJSONParser must behave exactly like DRF's JSON classes"""
+
+    def sample(self):
+        import decimal
+        import uuid
+        from datetime import date, time, timezone
+        from django.utils.translation import gettext_lazy
+        return {
+            "naive": datetime(2024, 3, 5, 18, 30, 15, 123456),
+            "aware": datetime(2024, 3, 5, 18, 30, tzinfo=timezone.utc),
+            "date": date(2024, 3, 5),
+            "time": time(7, 5),
+            "delta": timedelta(hours=1, seconds=3),
+            "decimal": decimal.Decimal("12.50"),
+            "lazy": gettext_lazy("Hello"),
+            "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+            "separators": "line\u2028para\u2029end",
+            "unicode": "Caf\u00e9 \U0001F3B2",
+            "nested": [{"id": 1, "ok": True, "none": None, "float": 1.5}],
+            1: "int key",
+            "huge": 2 ** 70,
+        }
+
+    def test_renderer_matches_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from levelupapi.renderers import FastJSONRenderer
+        data = self.sample()
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        del data["huge"]
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renderer_indent_matches_drf(self):
+        from rest_framework.renderers import JSONRenderer
+        from levelupapi.renderers import FastJSONRenderer
+        data = {"a": [1, 2]}
+        media_type = "application/json; indent=2"
+        self.assertEqual(FastJSONRenderer().render(data, media_type), JSONRenderer().render(data, media_type))
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_parser_matches_drf(self):
+        from io import BytesIO
+        from rest_framework.exceptions import ParseError
+        from rest_framework.parsers import JSONParser
+        from levelupapi.parsers import FastJSONParser
+        body = '[{"name": "Caf\u00e9", "n": 12345678901234567890123, "x": 1.25}]'.encode()
+        self.assertEqual(FastJSONParser().parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        for bad in (b"{", b'{"a": NaN}', b""):
+            with self.subTest(body=bad):
+                with self.assertRaises(ParseError):
+                    FastJSONParser().parse(BytesIO(bad))
+
+    def test_views_use_fast_renderer(self):
+        cache.clear()
+        data = make_dataset(games=2)
+        client = APIClient()
+        client.force_authenticate(user=data["users"][0])
+        response = client.post("/games", [
+            {"name": "Caf\u00e9", "manufacturer": "Acme", "number_of_players": 2, "type": data["game_type"].id},
+        ], format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("Caf\u00e9".encode(), response.content)
+
+
+class SparseFieldsetTests(LevelupTestCase):
+    """?fields= and ?expand= on /events and /games"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=6, games=2, attendees_per_event=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def test_without_params_output_is_unchanged(self):
+        from levelupapi.views.events import EventSerializer
+        event = self.data["events"][0]
+        expected = EventSerializer(Event.objects.get(pk=event.pk)).data
+        self.assertEqual(self.client.get(f"/events/{event.id}").json(), expected)
+
+    def test_fields_trim_event_output_and_query(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get("/events?fields=id,name,date")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()[0]), {"id", "name", "date"})
+        self.assertEqual(len(context.captured_queries), 1)
+        sql = context.captured_queries[0]["sql"]
+        self.assertNotIn("JOIN", sql)
+        self.assertNotIn("location", sql)
+
+    def test_relations_collapse_to_ids_unless_expanded(self):
+        event = self.data["events"][0]
+        body = self.client.get(f"/events/{event.id}?fields=id,organizer,game,attendees").json()
+        self.assertEqual(body["organizer"], event.organizer_id)
+        self.assertEqual(body["game"], event.game_id)
+        self.assertEqual(body["attendees"], sorted(event.attendees.values_list("id", flat=True)))
+
+        body = self.client.get(f"/events/{event.id}?fields=id,organizer,attendees&expand=organizer,attendees").json()
+        self.assertEqual(body["organizer"], {"id": event.organizer_id, "full_name": "First0 Last0"})
+        self.assertEqual(len(body["attendees"]), 2)
+        self.assertIn("full_name", body["attendees"][0])
+
+    def test_serializer_without_expand(self):
+        from levelupapi.views.events import EventSerializer
+        event = self.data["events"][0]
+        data = EventSerializer(event, fields=["id", "game"]).data
+        self.assertEqual(data, {"id": event.id, "game": event.game_id})
+
+    def test_expanded_relations_are_joined_not_queried_per_row(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/events?fields=id,game&expand=game")
+        self.assertEqual(response.json()[0]["game"], {"id": self.data["games"][0].id, "name": "Game 0"})
+        with self.assertNumQueries(2):
+            self.client.get("/events?expand=attendees")
+
+    def test_game_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/games?fields=id,name,type")
+        self.assertEqual(response.json()[0], {"id": self.data["games"][0].id, "name": "Game 0",
+                                              "type": self.data["game_type"].id})
+        game = self.data["games"][1]
+        body = self.client.get(f"/games/{game.id}?expand=creator").json()
+        self.assertEqual(body["creator"], {"id": game.creator_id, "full_name": "First1 Last1"})
+        self.assertEqual(body["type"], self.data["game_type"].id)
+
+    def test_fields_combine_with_pagination_and_streaming(self):
+        page = self.client.get("/events?fields=id,name&page_size=4").json()
+        self.assertEqual(set(page["results"][0]), {"id", "name"})
+        rest = self.client.get(page["next"]).json()
+        self.assertEqual(len(page["results"]) + len(rest["results"]), 6)
+
+        buffered = self.client.get("/games?fields=id,creator")
+        streamed = self.client.get("/games?fields=id,creator&stream=true")
+        self.assertEqual(b"".join(streamed.streaming_content), buffered.content)
+
+    def test_unknown_names_are_rejected(self):
+        self.assertEqual(self.client.get("/events?fields=id,secret").status_code, 400)
+        self.assertEqual(self.client.get("/games?expand=name").status_code, 400)
+        self.assertEqual(self.client.get(f"/games/{self.data['games'][0].id}?fields=nope").status_code, 400)
+
+
+class GameSearchTests(LevelupTestCase):
+    """/games?q= full-text search"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(games=1)
+        creator = self.data["users"][0]
+        game_type = self.data["game_type"]
+        for name, manufacturer in (
+            ("Settlers of Catan", "Kosmos"),
+            ("Catacombs", "Elzra"),
+            ("Dragon Castle", "Horrible Guild"),
+            ("Castles of Burgundy", "Ravensburger"),
+            ("Ticket to Ride", "Days of Wonder"),
+            ("Pokémon Cards", "Nintendo"),
+        ):
+            Game.objects.create(name=name, manufacturer=manufacturer, number_of_players=4,
+                                type=game_type, creator=creator)
+        self.client = APIClient()
+        self.client.force_authenticate(user=creator)
+
+    def names(self, query):
+        response = self.client.get("/games", {"q": query})
+        self.assertEqual(response.status_code, 200)
+        return [game["name"] for game in response.json()]
+
+    def test_prefix_matching(self):
+        self.assertEqual(sorted(self.names("cat")), ["Catacombs", "Settlers of Catan"])
+        self.assertEqual(sorted(self.names("castle")), ["Castles of Burgundy", "Dragon Castle"])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.names("drag cast"), ["Dragon Castle"])
+        self.assertEqual(self.names("dragon ticket"), [])
+
+    def test_manufacturer_and_diacritics(self):
+        self.assertEqual(self.names("ravens"), ["Castles of Burgundy"])
+        self.assertEqual(self.names("pokemon"), ["Pokémon Cards"])
+
+    def test_name_matches_rank_above_manufacturer_matches(self):
+        game = Game.objects.get(name="Ticket to Ride")
+        game.manufacturer = "Wonder Castle Games"
+        game.save()
+        self.assertEqual(self.names("castle")[-1], "Ticket to Ride")
+
+    def test_index_follows_updates_and_deletes(self):
+        Game.objects.filter(name="Catacombs").update(name="Carcassonne")
+        self.assertEqual(self.names("catac"), [])
+        self.assertEqual(self.names("carca"), ["Carcassonne"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Game.objects.filter(name="Carcassonne").delete()
+        self.assertEqual(self.names("carca"), [])
+
+    def test_limit_and_fields(self):
+        response = self.client.get("/games", {"q": "c", "limit": 1, "fields": "id,name"})
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(set(response.json()[0]), {"id", "name"})
+        self.assertEqual(self.names("!!"), [])
+
+    def test_fallback_without_fts(self):
+        from unittest import mock
+        with mock.patch("levelupapi.search.fts_available", return_value=False):
+            self.assertEqual(self.names("cat"), ["Catacombs", "Settlers of Catan"])
+            self.assertEqual(self.names("drag cast"), ["Dragon Castle"])
+
+    def test_fts_check_is_remembered_and_follows_the_queryset(self):
+        from unittest import mock
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from levelupapi import search
+        search.forget_fts()
+        self.names("cat")
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.names("dragon"), ["Dragon Castle"])
+        self.assertFalse([query for query in queries if "sqlite_master" in query["sql"]])
+
+        with mock.patch("levelupapi.search.fts_available", return_value=True) as available, \
+                mock.patch("levelupapi.search.ranked_game_ids", return_value=[]) as ranked:
+            search.search_games(Game.objects.using("replica1"), "dragon")
+        available.assert_called_once_with("replica1")
+        self.assertEqual(ranked.call_args.args[2], "replica1")
+
+    def test_rebuild_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM levelupapi_game_fts")
+        self.assertEqual(self.names("dragon"), [])
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rebuild_game_search", recreate=True, stdout=output)
+        self.assertIn("Indexed 7 games", output.getvalue())
+        self.assertEqual(self.names("dragon"), ["Dragon Castle"])
+
+    def test_missing_triggers_are_reported_and_recreated(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from django.db import connection
+        from levelupapi.checks import check_game_search
+        self.assertEqual(check_game_search(None, databases=["default"]), [])
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER levelupapi_game_fts_update")
+        Game.objects.filter(name="Catacombs").update(name="Carcassonne")
+        self.assertEqual(self.names("carca"), [])
+
+        warnings = check_game_search(None, databases=["default"])
+        self.assertEqual([warning.id for warning in warnings], ["levelupapi.W001"])
+        self.assertIn("levelupapi_game_fts_update", warnings[0].msg)
+
+        output = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("rebuild_game_search", stdout=output)
+        self.assertIn("Recreated missing triggers: levelupapi_game_fts_update", output.getvalue())
+        self.assertEqual(check_game_search(None, databases=["default"]), [])
+        self.assertEqual(self.names("carca"), ["Carcassonne"])
+
+    def test_missing_table_is_checked_again(self):
+        import time
+        from levelupapi import search
+        search.fts_tables["default"] = (False, time.monotonic())
+        self.assertEqual(self.names("dragon castle"), ["Dragon Castle"])
+        self.assertFalse(search.fts_available())
+        search.fts_tables["default"] = (False, time.monotonic() - search.RECHECK_MISSING - 1)
+        self.assertTrue(search.fts_available())
+        self.assertTrue(search.fts_tables["default"][0])
+
+
+class ChangeFeedTests(LevelupTestCase):
+    """?since= returns only rows created, changed or deleted after the cursor"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=3, games=3)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def poll(self, url, cursor="", **params):
+        response = self.client.get(url, {"since": cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_first_sync_returns_everything_in_feed_order(self):
+        feed = self.poll("/games")
+        self.assertEqual([game["id"] for game in feed["changed"]], [game.id for game in self.data["games"]])
+        self.assertEqual(feed["changed"], self.client.get("/games").json())
+        self.assertEqual((feed["deleted"], feed["has_more"]), ([], False))
+
+    def test_quiet_poll_is_empty_and_cheap(self):
+        cursor = self.poll("/events")["cursor"]
+        # the change log; nothing to serialize
+        with self.assertNumQueries(1):
+            feed = self.poll("/events", cursor)
+        self.assertEqual((feed["changed"], feed["deleted"]), ([], []))
+        self.assertEqual(self.poll("/events", feed["cursor"])["changed"], [])
+
+    def test_creates_updates_and_deletes_are_reported_once(self):
+        games = self.data["games"]
+        cursor = self.poll("/games")["cursor"]
+        games[1].name = "Renamed"
+        games[1].save()
+        deleted_id = games[2].id
+        games[2].delete()
+        created = Game.objects.create(name="New", manufacturer="Acme", number_of_players=2,
+                                      type=self.data["game_type"], creator=self.data["users"][0])
+
+        feed = self.poll("/games", cursor)
+        self.assertEqual([game["id"] for game in feed["changed"]], [games[1].id, created.id])
+        self.assertEqual(feed["changed"][0]["name"], "Renamed")
+        self.assertEqual(feed["deleted"], [deleted_id])
+
+        feed = self.poll("/games", feed["cursor"])
+        self.assertEqual((feed["changed"], feed["deleted"]), ([], []))
+
+    def test_signups_and_cascades_reach_the_event_feed(self):
+        events = self.data["events"]
+        cursor = self.poll("/events")["cursor"]
+        EventGamer.objects.filter(event=events[0]).first().delete()
+        events[1].attendees.add(self.data["users"][0])
+        deleted_id = events[2].id
+        self.data["games"][2].delete()
+
+        feed = self.poll("/events", cursor)
+        self.assertEqual([event["id"] for event in feed["changed"]], [events[0].id, events[1].id])
+        self.assertEqual([event["attendee_count"] for event in feed["changed"]], [1, 3])
+        self.assertEqual(feed["deleted"], [deleted_id])
+
+    def page_through(self, url, cursor):
+        seen = []
+        while True:
+            feed = self.poll(url, cursor, page_size=2)
+            seen.extend(game["id"] for game in feed["changed"])
+            cursor = feed["cursor"]
+            if not feed["has_more"]:
+                return seen, cursor
+
+    def test_has_more_pages_through_large_deltas(self):
+        ids = [game.id for game in self.data["games"]]
+        seen, cursor = self.page_through("/games", "")
+        self.assertEqual(seen, ids)
+        for game in self.data["games"]:
+            game.save()
+        seen, cursor = self.page_through("/games", cursor)
+        self.assertEqual(seen, ids)
+        self.assertEqual(self.poll("/games", cursor)["changed"], [])
+
+    def test_writes_during_a_first_sync_are_reported_after_it(self):
+        games = self.data["games"]
+        feed = self.poll("/games", page_size=2)
+        # Already sent, and changed before the sync reaches the end
+        games[0].name = "Renamed"
+        games[0].save()
+        feed = self.poll("/games", feed["cursor"], page_size=2)
+        self.assertEqual([game["id"] for game in feed["changed"]], [games[2].id])
+        self.assertFalse(feed["has_more"])
+        feed = self.poll("/games", feed["cursor"])
+        self.assertEqual([game["name"] for game in feed["changed"]], ["Renamed"])
+
+    def test_renames_reach_the_rows_that_show_them(self):
+        user = self.data["users"][1]
+        game = self.data["games"][0]
+        games_cursor = self.poll("/games")["cursor"]
+        events_cursor = self.poll("/events")["cursor"]
+        user.first_name = "Renamed"
+        user.save()
+        # Creator of game 1, organizer of event 1 and attendee of events 0 and 1
+        feed = self.poll("/games", games_cursor)
+        self.assertEqual([row["id"] for row in feed["changed"]], [self.data["games"][1].id])
+        # A login only saves last_login
+        from django.contrib.auth.signals import user_logged_in
+        user_logged_in.send(sender=User, request=None, user=user)
+        self.assertEqual(self.poll("/games", feed["cursor"])["changed"], [])
+
+        feed = self.poll("/events", events_cursor)
+        self.assertEqual([row["id"] for row in feed["changed"]], [event.id for event in self.data["events"][:2]])
+        self.assertIn({"id": user.id, "full_name": "Renamed Last1"}, feed["changed"][0]["attendees"])
+
+        events_cursor = feed["cursor"]
+        game.name = "Renamed game"
+        game.save()
+        feed = self.poll("/events", events_cursor)
+        self.assertEqual([row["game"]["name"] for row in feed["changed"]], ["Renamed game"])
+
+    def test_filters_and_fieldsets_apply_to_changed_rows(self):
+        game = self.data["games"][0]
+        feed = self.poll("/events", game=game.id, fields="id,game")
+        self.assertEqual(feed["changed"], [{"id": self.data["events"][0].id, "game": game.id}])
+
+    def test_game_types_and_bad_cursors(self):
+        cursor = self.poll("/gametypes")["cursor"]
+        game_type_id = self.data["game_type"].id
+        self.data["game_type"].delete()
+        self.assertEqual(self.poll("/gametypes", cursor)["deleted"], [game_type_id])
+        for url in ("/gametypes", "/games", "/events"):
+            response = self.client.get(url, {"since": "nope"})
+            self.assertEqual((response.status_code, response.json()), (404, {"error": "Invalid cursor"}))
+
+class EventStreamTests(LevelupTestCase):
+    """/events/stream pushes notifications from the in-process hub"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=2, games=2)
+        self.token = Token.objects.create(user=self.data["users"][0])
+        self.headers = {"Authorization": f"Token {self.token.key}"}
+
+    def tearDown(self):
+        from levelupapi.pubsub import event_hub
+        for subscription in list(event_hub.subscriptions):
+            event_hub.unsubscribe(subscription)
+
+    async def open_stream(self, **params):
+        response = await self.async_client.get("/events/stream", params, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        frames = response.streaming_content.__aiter__()
+        self.assertEqual(await frames.__anext__(), b"retry: 3000\n\n")
+        return frames
+
+    def parse(self, frame):
+        import json
+        fields = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+        return fields["event"], json.loads(fields["data"])
+
+    async def test_game_filter_and_cleanup(self):
+        from levelupapi.pubsub import event_hub
+        game_id = self.data["games"][0].id
+        frames = await self.open_stream(game=game_id)
+        event_hub.publish("event.updated", 1, game_id + 100)
+        event_hub.publish("signup", 2, game_id, attendee=3)
+        kind, data = self.parse(await frames.__anext__())
+        self.assertEqual((kind, data["event"], data["game"], data["attendee"]), ("signup", 2, game_id, 3))
+
+    async def test_disconnect_unsubscribes(self):
+        import asyncio
+        from django.core.handlers.asgi import ASGIHandler
+        from django.core.signals import request_finished, request_started
+        from django.db import close_old_connections
+        from levelupapi.pubsub import event_hub
+
+        disconnected = asyncio.Event()
+        sent = asyncio.Queue()
+        requests = iter([{"type": "http.request", "body": b"", "more_body": False}])
+
+        async def receive():
+            message = next(requests, None)
+            if message is None:
+                await disconnected.wait()
+                message = {"type": "http.disconnect"}
+            return message
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/events/stream", "raw_path": b"/events/stream", "query_string": b"",
+            "root_path": "", "headers": [(b"host", b"testserver"),
+                                         (b"authorization", f"Token {self.token.key}".encode())],
+            "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+        }
+        # Same as the test client: keep the test's database connection open
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            handler = asyncio.create_task(ASGIHandler()(scope, receive, sent.put))
+            self.assertEqual((await sent.get())["status"], 200)
+            self.assertEqual((await sent.get())["body"], b"retry: 3000\n\n")
+            self.assertEqual(event_hub.stats()["subscribers"], 1)
+            disconnected.set()
+            await asyncio.wait_for(handler, 5)
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertEqual(event_hub.stats()["subscribers"], 0)
+
+    async def test_signals_publish_after_commit(self):
+        from asgiref.sync import sync_to_async
+        event = self.data["events"][0]
+        frames = await self.open_stream()
+
+        def sign_up():
+            client = APIClient()
+            client.force_authenticate(user=self.data["users"][2])
+            with self.captureOnCommitCallbacks(execute=True):
+                client.post(f"/events/{event.id}/signup")
+                event.name = "Renamed"
+                event.save()
+
+        await sync_to_async(sign_up)()
+        kinds = [self.parse(await frames.__anext__()) for _ in range(2)]
+        self.assertEqual([(kind, data["event"], data["game"]) for kind, data in kinds],
+                         [("signup", event.id, event.game_id), ("event.updated", event.id, event.game_id)])
+        self.assertEqual(kinds[0][1]["attendee"], self.data["users"][2].id)
+
+    async def test_slow_client_overflows_without_holding_up_others(self):
+        from unittest import mock
+        from levelupapi.pubsub import event_hub
+        with mock.patch.object(event_hub, "max_queue", 2):
+            slow = await self.open_stream()
+            fast = await self.open_stream()
+            for event_id in range(3):
+                event_hub.publish("event.updated", event_id, 1)
+                self.assertEqual(self.parse(await fast.__anext__())[1]["event"], event_id)
+            frames = [await slow.__anext__() for _ in range(3)]
+        self.assertEqual([self.parse(frame)[1]["event"] for frame in frames[:2]], [0, 1])
+        self.assertEqual(frames[2], b"event: overflow\ndata: {}\n\n")
+        with self.assertRaises(StopAsyncIteration):
+            await slow.__anext__()
+        self.assertEqual(event_hub.stats()["subscribers"], 1)
+
+    @override_settings(LEVELUP_EVENT_STREAM={"KEEPALIVE": 0.01})
+    async def test_idle_stream_sends_keepalives(self):
+        frames = await self.open_stream()
+        self.assertEqual(await frames.__anext__(), b": keepalive\n\n")
+
+    async def test_rejects_bad_requests(self):
+        response = await self.async_client.get("/events/stream")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get("/events/stream", {"game": "x"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_served_over_wsgi(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(client.get("/events/stream").status_code, 501)
+
+    def test_nothing_is_published_without_subscribers(self):
+        from levelupapi.caching import store_version
+        from levelupapi.jobs import submit
+        with self.captureOnCommitCallbacks() as callbacks:
+            EventGamer.objects.create(event=self.data["events"][0], attendee=self.data["users"][2])
+        # Only the response cache's version bumps and the stats job; no publish for the stream
+        self.assertEqual({getattr(callback, "func", None) for callback in callbacks}, {store_version, submit})
+
+class StatsTests(LevelupTestCase):
+    """GameStats, UserStats and GamePlayer follow every write and match a full recount"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=6, games=3)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def assert_in_step(self):
+        from levelupapi.stats import compute_stats, find_drift, stored_stats
+        run_due_jobs()
+        for expected, stored in zip(compute_stats(), stored_stats()):
+            self.assertEqual(find_drift(expected, stored), [])
+
+    def test_dataset_counts(self):
+        self.assert_in_step()
+        game = self.data["games"][0]
+        # Events 0 and 3, attended by users 0, 1 and 0, 1
+        self.assertEqual(GameStats.objects.filter(game=game).values_list(
+            "event_count", "attendee_count", "player_count").get(), (2, 4, 2))
+        user = self.data["users"][0]
+        self.assertEqual(UserStats.objects.filter(user=user).values_list(
+            "games_created", "events_organized", "events_attended").get(), (1, 2, 4))
+
+    def test_signups_and_cancellations(self):
+        events, users = self.data["events"], self.data["users"]
+        EventGamer.objects.create(event=events[0], attendee=users[2])
+        EventGamer.objects.filter(event=events[1]).first().delete()
+        events[2].attendees.add(users[1])
+        # users[0] was never signed up to event 1; remove() must not count it
+        events[1].attendees.remove(users[0], users[2])
+        users[1].attending_events.remove(events[3])
+        users[2].attending_events.add(events[3])
+        self.assert_in_step()
+        events[4].attendees.clear()
+        users[0].attending_events.clear()
+        self.assert_in_step()
+        self.assertEqual(GamePlayer.objects.filter(user=users[0]).count(), 0)
+
+    def test_signup_stats_are_left_to_one_job(self):
+        from django.db import connection, transaction
+        from django.test.utils import CaptureQueriesContext
+        from levelupapi.models import Job
+        events, users = self.data["events"], self.data["users"]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.post(f"/events/{events[1].id}/signup").status_code, 204)
+        self.assertFalse([query for query in queries if "levelupapi_gameplayer" in query["sql"]])
+        self.assertEqual(list(Job.objects.filter(status=Job.PENDING).values_list("name", flat=True)),
+                         ["recount_signups"])
+        self.assert_in_step()
+
+        # A cascade removing every signup of a game adds to a single job
+        Job.objects.all().delete()
+        self.data["games"][0].delete()
+        self.assertEqual(Job.objects.count(), 1)
+        self.assert_in_step()
+
+        # The job it would add to was rolled back, so the next write stores its own
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            events[4].attendees.add(users[0])
+            raise RuntimeError
+        events[4].attendees.add(users[0])
+        self.assertEqual(Job.objects.filter(status=Job.PENDING).count(), 1)
+        self.assert_in_step()
+
+    def test_saves_that_leave_owners_alone_skip_the_lookup(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        game = self.data["games"][0]
+        game.name = "Renamed"
+        with CaptureQueriesContext(connection) as queries:
+            game.save(update_fields=["name", "updated_at"])
+        lookup = 'SELECT "levelupapi_game"."creator_id"'
+        self.assertFalse([query for query in queries if query["sql"].startswith(lookup)])
+        game.creator = self.data["users"][2]
+        game.save(update_fields=["creator"])
+        self.assert_in_step()
+
+    def test_updates_move_counts_between_rows(self):
+        event, game = self.data["events"][0], self.data["games"][0]
+        event.game = self.data["games"][1]
+        event.organizer = self.data["users"][2]
+        event.save()
+        game.creator = self.data["users"][1]
+        game.save()
+        # Moving the signups is left to a recount_games job
+        self.assert_in_step()
+
+    def test_deletes_and_cascades(self):
+        self.data["events"][0].delete()
+        self.data["games"][1].delete()
+        self.assert_in_step()
+        self.data["users"][2].delete()
+        self.assert_in_step()
+        self.data["game_type"].delete()
+        self.assert_in_step()
+
+    def test_batch_creates_are_counted(self):
+        games = [{"name": f"Batch {i}", "manufacturer": "Acme", "number_of_players": 2,
+                  "type": self.data["game_type"].id} for i in range(3)]
+        self.assertEqual(self.client.post("/games", games, format="json").status_code, 201)
+        events = [{"name": f"Batch {i}", "date": "2024-05-01", "time": "19:00", "location": "Hall",
+                   "game": self.data["games"][i % 2].id} for i in range(3)]
+        self.assertEqual(self.client.post("/events", events, format="json").status_code, 201)
+        self.assert_in_step()
+
+    def test_game_stats_endpoints(self):
+        game = self.data["games"][0]
+        Event.objects.create(name="Later", date_time=datetime.now() + timedelta(days=7), location="Cafe",
+                             organizer=self.data["users"][1], game=game)
+        response = self.client.get(f"/stats/games/{game.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            "game": game.id, "name": "Game 0", "event_count": 3, "upcoming_event_count": 1,
+            "attendee_count": 4, "player_count": 2,
+        })
+        listed = self.client.get("/stats/games").json()
+        self.assertEqual([row["game"] for row in listed], [game.id for game in self.data["games"]])
+        self.assertEqual(listed[0], response.json())
+
+        page = self.client.get("/stats/games", {"page_size": 2}).json()
+        self.assertEqual(page["results"], listed[:2])
+        self.assertEqual(self.client.get(page["next"]).json()["results"], listed[2:])
+        self.assertEqual(self.client.get("/stats/games/999999").status_code, 404)
+
+    def test_user_stats_endpoints(self):
+        user = self.data["users"][0]
+        response = self.client.get(f"/stats/users/{user.id}")
+        self.assertEqual(response.json(), {
+            "user": user.id, "full_name": "First0 Last0",
+            "games_created": 1, "events_organized": 2, "events_attended": 4,
+        })
+        self.assertEqual(len(self.client.get("/stats/users").json()), 3)
+
+        # A write shows up as soon as it commits despite the response cache
+        with self.captureOnCommitCallbacks(execute=True):
+            EventGamer.objects.filter(attendee=user).first().delete()
+            run_due_jobs()
+        self.assertEqual(self.client.get(f"/stats/users/{user.id}").json()["events_attended"], 3)
+
+        # A missing row reads as zeros rather than a 404
+        UserStats.objects.filter(user=user).delete()
+        cache.clear()
+        self.assertEqual(self.client.get(f"/stats/users/{user.id}").json()["games_created"], 0)
+        self.assertEqual(self.client.get("/stats/users/999999").status_code, 404)
+
+    def test_rebuild_command_reports_and_fixes_drift(self):
+        from django.core.management import call_command
+        from django.core.management.base import CommandError
+        from io import StringIO
+        call_command("rebuild_stats", "--check", stdout=StringIO())
+
+        game = self.data["games"][0]
+        GameStats.objects.filter(game=game).update(event_count=99)
+        GamePlayer.objects.filter(game=game).first().delete()
+        UserStats.objects.filter(user=self.data["users"][1]).delete()
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command("rebuild_stats", "--check", stdout=out)
+        self.assertIn("game stats: 1 of 3 rows drifted", out.getvalue())
+        self.assertIn("user stats: 1 of 3 rows drifted", out.getvalue())
+
+        call_command("rebuild_stats", stdout=StringIO())
+        self.assert_in_step()
+        self.assertEqual(self.client.get(f"/stats/games/{game.id}").json()["event_count"], 2)
+
+
+# URLconf for AsyncReadTests: the async handlers in front of the usual routes,
+# as levelup/asgi.py serves them
+from levelup.urls import async_urlpatterns, urlpatterns as wsgi_urlpatterns  # pylint: disable=wrong-import-position
+urlpatterns = async_urlpatterns + wsgi_urlpatterns
+
+
+class AsyncReadTests(LevelupTestCase):
+    """The native async GET handlers match the DRF views they stand in for"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=4, games=2)
+        self.token = Token.objects.create(user=self.data["users"][0])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def async_get(self, url, headers=None):
+        from asgiref.sync import async_to_sync
+        headers = {"Authorization": f"Token {self.token.key}", **(headers or {})}
+        with override_settings(ROOT_URLCONF=__name__):
+            return async_to_sync(self.async_client.get)(url, headers=headers)
+
+    def test_reads_resolve_to_async_views(self):
+        from asgiref.sync import iscoroutinefunction
+        from django.urls import resolve
+        for url in ("/gametypes", "/gametypes/1", "/games", "/games/1", "/events", "/events/1"):
+            with self.subTest(url=url):
+                self.assertTrue(iscoroutinefunction(resolve(url, urlconf=__name__).func))
+
+    def test_output_matches_sync_views(self):
+        game, event = self.data["games"][0], self.data["events"][0]
+        urls = (
+            "/gametypes", f"/gametypes/{self.data['game_type'].id}", "/games", f"/games/{game.id}",
+            "/events", f"/events/{event.id}", f"/events?game={game.id}", "/events?from=2024-01-02&to=2024-01-03",
+            "/games/999", "/events?game=abc", "/events?from=soon",
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                expected = self.client.get(url)
+                cache.clear()
+                response = self.async_get(url)
+                cache.clear()
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content, expected.content)
+
+    def test_query_counts(self):
+        # token, then events + signups
+        with self.assertNumQueries(3):
+            self.async_get("/events")
+        with self.assertNumQueries(1):
+            self.async_get(f"/games/{self.data['games'][0].id}")
+
+    def test_authentication_errors_match(self):
+        for header in ({}, {"HTTP_AUTHORIZATION": "Token nope"}, {"HTTP_AUTHORIZATION": "Token a b"}):
+            with self.subTest(header=header):
+                expected = APIClient().get("/games", **header)
+                response = self.async_get("/games", {"Authorization": header.get("HTTP_AUTHORIZATION", "")})
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.content, expected.content)
+                self.assertEqual(response["WWW-Authenticate"], expected["WWW-Authenticate"])
+
+    def test_inactive_user_is_rejected(self):
+        self.async_get("/games")
+        User.objects.filter(pk=self.token.user_id).update(is_active=False)
+        token_cache.invalidate(self.token.key)
+        self.assertEqual(self.async_get("/games").status_code, 401)
+
+    def test_response_cache_is_shared_with_sync_views(self):
+        etag = self.client.get("/games")["ETag"]
+        with self.assertNumQueries(0):
+            response = self.async_get("/games", {"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Game.objects.filter(pk=self.data["games"][0].pk).delete()
+        self.assertEqual(self.async_get("/games", {"If-None-Match": etag}).status_code, 200)
+
+    def test_everything_else_goes_to_the_drf_views(self):
+        self.assertEqual(set(self.async_get("/games?page_size=1").json()), {"next", "results"})
+        self.assertEqual(len(self.async_get("/events?fields=id").json()[0]), 1)
+        self.assertIn("text/html", self.async_get("/gametypes", {"Accept": "text/html"})["Content-Type"])
+
+        from asgiref.sync import async_to_sync
+        with override_settings(ROOT_URLCONF=__name__):
+            response = async_to_sync(self.async_client.post)(
+                "/games", {"name": "Async", "manufacturer": "Acme", "number_of_players": 2,
+                           "type": self.data["game_type"].id},
+                content_type="application/json", headers={"Authorization": f"Token {self.token.key}"})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["name"], "Async")
+
+    def test_server_timing_counts_async_queries(self):
+        response = self.async_get("/events")
+        self.assertIn('desc="3 queries"', response["Server-Timing"])
+
+
+class CompressionTests(LevelupTestCase):
+    """gzip/Brotli negotiation, the size threshold and precompressed cache entries"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=30, games=4)
+        self.token = Token.objects.create(user=self.data["users"][0])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token.key}")
+
+    def get(self, url, encoding="gzip", **headers):
+        return self.client.get(url, HTTP_ACCEPT_ENCODING=encoding, **headers)
+
+    def test_large_responses_are_compressed(self):
+        import gzip
+        plain = self.client.get("/events")
+        self.assertFalse(plain.has_header("Content-Encoding"))
+        response = self.get("/events")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response["ETag"], plain["ETag"][:-1] + '-gzip"')
+        self.assertEqual(self.get("/events", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(self.get("/events", "identity", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_small_responses_are_sent_as_is(self):
+        response = self.get("/gametypes")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertNotIn("Accept-Encoding", response.get("Vary", ""))
+
+    def test_negotiation(self):
+        from levelupapi.compression import brotli, choose_encoding
+        self.assertIsNone(choose_encoding(""))
+        self.assertIsNone(choose_encoding("identity, gzip;q=0"))
+        self.assertEqual(choose_encoding("gzip, br;q=0"), "gzip")
+        self.assertEqual(choose_encoding("*;q=0.5, gzip;q=0.1"), "br" if brotli else "gzip")
+        if brotli:
+            self.assertEqual(choose_encoding("gzip, deflate, br"), "br")
+
+    def test_brotli(self):
+        from levelupapi.compression import brotli
+        if brotli is None:
+            self.skipTest("brotli isn't installed")
+        response = self.get("/events", "gzip, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(response.content), self.client.get("/events").content)
+
+    def test_cached_responses_are_compressed_once(self):
+        from unittest import mock
+        from levelupapi import compression
+        with mock.patch.object(compression, "compress", wraps=compression.compress) as compress:
+            first = self.get("/events").content
+            self.assertEqual(self.get("/events").content, first)
+        compress.assert_called_once()
+        self.assertTrue(compress.call_args.kwargs["cached"])
+
+    def test_uncached_responses_are_compressed_by_the_middleware(self):
+        import gzip
+        games = [{"name": f"Batch {i}", "manufacturer": "Acme", "number_of_players": 2,
+                  "type": self.data["game_type"].id} for i in range(20)]
+        response = self.client.post("/games", games, format="json", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("compress;dur=", response["Server-Timing"])
+        import json
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))), 20)
+
+    def test_streaming_responses_are_compressed(self):
+        import gzip
+        response = self.get("/events?stream=true")
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        body = gzip.decompress(b"".join(response.streaming_content))
+        self.assertEqual(body, self.client.get("/events").content)
+
+    @override_settings(LEVELUP_COMPRESSION={"ENABLED": False})
+    def test_can_be_turned_off(self):
+        self.assertFalse(self.get("/events").has_header("Content-Encoding"))
+
+    def test_async_views_serve_compressed_variants(self):
+        import gzip
+        from asgiref.sync import async_to_sync
+        headers = {"Authorization": f"Token {self.token.key}", "Accept-Encoding": "gzip"}
+        with override_settings(ROOT_URLCONF=__name__):
+            response = async_to_sync(self.async_client.get)("/events", headers=headers)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), self.client.get("/events").content)
+
+
+class IdempotencyTests(LevelupTestCase):
+    """Idempotency-Key on POST and PUT to /games and /events"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=1, games=2)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+        self.game = {"name": "Retried", "manufacturer": "Acme", "number_of_players": 2,
+                     "type": self.data["game_type"].id}
+
+    def post(self, url, payload, key="key-1"):
+        return self.client.post(url, payload, format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retried_create_runs_once(self):
+        first = self.post("/games", self.game)
+        retry = self.post("/games", self.game)
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertFalse(first.has_header("Idempotent-Replayed"))
+        self.assertEqual(Game.objects.filter(name="Retried").count(), 1)
+
+        # No key, no deduplication
+        self.client.post("/games", self.game, format="json")
+        self.assertEqual(Game.objects.filter(name="Retried").count(), 2)
+
+    def test_events_and_batches(self):
+        event = {"name": "Retried", "date": "2024-05-01", "time": "19:00", "location": "Hall",
+                 "game": self.data["games"][0].id}
+        self.post("/events", event)
+        self.post("/events", [event, event], key="key-2")
+        self.assertEqual(self.post("/events", [event, event], key="key-2").status_code, 201)
+        self.assertEqual(self.post("/events", event).status_code, 201)
+        self.assertEqual(Event.objects.filter(name="Retried").count(), 3)
+
+    def test_retried_update_is_not_applied_again(self):
+        game = self.data["games"][0]
+        payload = {**self.game, "name": "First"}
+        url = f"/games/{game.id}"
+        self.assertEqual(self.client.put(url, payload, format="json", HTTP_IDEMPOTENCY_KEY="put").status_code, 204)
+        Game.objects.filter(pk=game.pk).update(name="Changed since")
+        retry = self.client.put(url, payload, format="json", HTTP_IDEMPOTENCY_KEY="put")
+        self.assertEqual((retry.status_code, retry["Idempotent-Replayed"]), (204, "true"))
+        self.assertEqual(Game.objects.get(pk=game.pk).name, "Changed since")
+
+    def test_keys_belong_to_one_request_and_one_user(self):
+        self.post("/games", self.game)
+        response = self.post("/games", {**self.game, "name": "Other"})
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.post(f"/events", {}, key="").status_code, 400)
+        self.assertEqual(self.post(f"/events", {}, key="x" * 256).status_code, 400)
+
+        self.client.force_authenticate(user=self.data["users"][1])
+        self.assertFalse(self.post("/games", self.game).has_header("Idempotent-Replayed"))
+        self.assertEqual(Game.objects.filter(name="Retried").count(), 2)
+
+    def test_server_errors_release_the_key(self):
+        from levelupapi.models import IdempotencyKey
+        self.client.raise_request_exception = False
+        event = {"name": "Retried", "date": "2024-05-01", "time": "19:00", "location": "Hall", "game": 999999}
+        self.assertEqual(self.post("/events", event).status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post("/events", {**event, "game": self.data["games"][0].id}).status_code, 201)
+
+    @override_settings(LEVELUP_IDEMPOTENCY={"WAIT": 0, "LOCK_TIMEOUT": 60})
+    def test_duplicate_of_a_running_request_gets_a_conflict(self):
+        from levelupapi.models import IdempotencyKey
+        self.post("/games", self.game)
+        IdempotencyKey.objects.update(status_code=None)
+        response = self.post("/games", self.game)
+        self.assertEqual((response.status_code, response["Retry-After"]), (409, "1"))
+
+        # Still running after LOCK_TIMEOUT: its request died, so the key is taken over
+        IdempotencyKey.objects.update(created_at=datetime.now() - timedelta(minutes=2))
+        self.assertEqual(self.post("/games", self.game).status_code, 201)
+        self.assertEqual(Game.objects.filter(name="Retried").count(), 2)
+
+    def test_duplicate_waits_for_the_running_request(self):
+        from unittest import mock
+        from levelupapi import idempotency
+        from levelupapi.models import IdempotencyKey
+        first = self.post("/games", self.game)
+        stored = IdempotencyKey.objects.values_list("status_code", "body").get()
+        IdempotencyKey.objects.update(status_code=None, body=b"")
+
+        def first_request_finishes(seconds):
+            IdempotencyKey.objects.update(status_code=stored[0], body=stored[1])
+        with mock.patch.object(idempotency.time, "sleep", side_effect=first_request_finishes) as sleep:
+            retry = self.post("/games", self.game)
+        sleep.assert_called_once()
+        self.assertEqual((retry.status_code, retry.json()), (201, first.json()))
+        self.assertEqual(Game.objects.filter(name="Retried").count(), 1)
+
+    def test_expired_keys_are_purged(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from levelupapi import idempotency
+        from levelupapi.models import IdempotencyKey
+        for key in ("a", "b", "c"):
+            self.post("/games", self.game, key=key)
+        IdempotencyKey.objects.filter(key__in=("a", "b")).update(expires_at=datetime.now() - timedelta(seconds=1))
+
+        # An expired key can be used again
+        self.assertFalse(self.post("/games", self.game, key="a").has_header("Idempotent-Replayed"))
+        out = StringIO()
+        call_command("purge_idempotency_keys", batch_size=1, stdout=out)
+        self.assertIn("Deleted 1 ", out.getvalue())
+        self.assertEqual(sorted(IdempotencyKey.objects.values_list("key", flat=True)), ["a", "c"])
+
+        # Requests leave the purge to the run_jobs worker
+        IdempotencyKey.objects.update(expires_at=datetime.now() - timedelta(seconds=1))
+        idempotency.last_purge = None
+        self.client.get("/gametypes")
+        self.assertEqual(IdempotencyKey.objects.count(), 2)
+        call_command("run_jobs", "--once", stdout=out)
+        self.assertIn("Deleted 2 expired idempotency keys", out.getvalue())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+
+class SQLiteTuningTests(TestCase):
+    """LEVELUP_SQLITE pragmas on every new connection"""
+
+    def open_connection(self, directory):
+        import os
+        from django.db import connection
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        settings_dict = {**connection.settings_dict, "NAME": os.path.join(directory, "tuning.sqlite3")}
+        other = DatabaseWrapper(settings_dict, alias="tuning")
+        other.ensure_connection()
+        return other
+
+    def test_new_connections_are_tuned(self):
+        import tempfile
+        from levelupapi.sqlite import current_pragmas
+        with tempfile.TemporaryDirectory() as directory:
+            other = self.open_connection(directory)
+            try:
+                pragmas = current_pragmas(other)
+                self.assertEqual(pragmas["journal_mode"], "wal")
+                self.assertEqual(pragmas["busy_timeout"], 5000)
+                # NORMAL
+                self.assertEqual(pragmas["synchronous"], 1)
+                self.assertEqual(pragmas["cache_size"], -20000)
+                self.assertEqual(other.transaction_mode, "IMMEDIATE")
+            finally:
+                other.close()
+
+    def test_disabled(self):
+        import tempfile
+        from levelupapi.sqlite import current_pragmas
+        with tempfile.TemporaryDirectory() as directory, override_settings(LEVELUP_SQLITE={"ENABLED": False}):
+            other = self.open_connection(directory)
+            try:
+                self.assertEqual(current_pragmas(other)["journal_mode"], "delete")
+                self.assertIsNone(other.transaction_mode)
+            finally:
+                other.close()
+
+
+# The in-memory test database fails a pool thread's write with "table is
+# locked" instead of waiting for the test's; tests run jobs themselves
+@override_settings(LEVELUP_JOBS={"WORKERS": 0})
+class StressCommandTests(TransactionTestCase):
+    """stress_db runs both profiles and cleans up after itself"""
+
+    def test_reports_both_profiles(self):
+        from io import StringIO
+        from django.core.management import call_command
+        make_dataset(events=1, games=1)
+        output = StringIO()
+        call_command("stress_db", threads=2, duration=0.3, stdout=output)
+        self.assertIn("default  reads", output.getvalue())
+        self.assertIn("tuned    reads", output.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith="stress_db_user").exists())
+
+
+# The in-memory test database fails a pool thread's write with "table is
+# locked" instead of waiting for the test's; tests run jobs themselves
+@override_settings(LEVELUP_JOBS={"WORKERS": 0})
+class ReplicaTests(TransactionTestCase):
+    """List and retrieve reads from a file-copied SQLite replica
+
+    Not a TestCase: the replica is copied with SQLite's backup API, which
+    can't read a database another transaction is writing.
+    """
+
+    def setUp(self):
+        import os
+        import tempfile
+        from django.db import connection, connections
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        from levelupapi import replicas
+        cache.clear()
+        token_cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "replica.sqlite3")
+        # Set up like a LEVELUP_REPLICA_FILES entry
+        connections["replica1"] = DatabaseWrapper({
+            **connection.settings_dict, "NAME": f"file:{self.path}?mode=ro", "OPTIONS": {"uri": True},
+            "CONN_MAX_AGE": 0,
+        }, alias="replica1")
+        self.addCleanup(connections.__delitem__, "replica1")
+        self.addCleanup(lambda: connections["replica1"].close())
+        settings_override = override_settings(LEVELUP_REPLICAS={"ALIASES": ["replica1"]})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        replicas.down_until.clear()
+
+        self.data = make_dataset(events=1, games=2)
+        self.copy()
+        self.author, self.reader = APIClient(), APIClient()
+        self.author.force_authenticate(user=self.data["users"][0])
+        self.reader.force_authenticate(user=self.data["users"][1])
+        self.game = {"name": "Fresh", "manufacturer": "Acme", "number_of_players": 2,
+                     "type": self.data["game_type"].id}
+
+    def copy(self):
+        """What a replication tick does; the test client leaves connections open across requests"""
+        from django.db import connections
+        from levelupapi.replicas import copy_to_replica
+        connections["replica1"].close()
+        copy_to_replica("replica1")
+
+    def names(self, client):
+        return {game["name"] for game in client.get("/games").json()}
+
+    def test_reads_come_from_the_replica(self):
+        game = Game.objects.create(name="Unreplicated", manufacturer="Acme", number_of_players=2,
+                                   type=self.data["game_type"], creator=self.data["users"][2])
+        self.assertEqual(self.reader.get(f"/games/{game.id}").status_code, 404)
+        self.assertNotIn("Unreplicated", self.names(self.reader))
+
+        self.copy()
+        self.assertEqual(self.reader.get(f"/games/{game.id}").status_code, 200)
+        # The list built from the replica stays cached for CACHE_TIMEOUT seconds
+        self.assertNotIn("Unreplicated", self.names(self.reader))
+        cache.clear()
+        self.assertIn("Unreplicated", self.names(self.reader))
+
+    def test_writers_read_their_writes(self):
+        created = self.author.post("/games", self.game, format="json").json()
+
+        # The reader's list is built from the replica and cached ...
+        self.assertNotIn("Fresh", self.names(self.reader))
+        # ... but the author is pinned to the primary and never gets it
+        self.assertIn("Fresh", self.names(self.author))
+        self.assertEqual(self.author.get(f"/games/{created['id']}").status_code, 200)
+        self.assertEqual(self.reader.get(f"/games/{created['id']}").status_code, 404)
+
+    def test_reads_after_a_write_in_the_request_use_the_primary(self):
+        from levelupapi import replicas
+        state = replicas.RequestState()
+        token = replicas.current_request.set(state)
+        try:
+            state.read_alias = "replica1"
+            self.assertEqual(Game.objects.all().db, "replica1")
+            Game.objects.create(name="Written", manufacturer="Acme", number_of_players=2,
+                                type=self.data["game_type"], creator=self.data["users"][0])
+            self.assertTrue(state.wrote)
+            self.assertEqual(Game.objects.all().db, "default")
+            self.assertTrue(Game.objects.filter(name="Written").exists())
+        finally:
+            replicas.current_request.reset(token)
+
+    def test_unavailable_replica_falls_back_to_the_primary(self):
+        import os
+        from django.db import connections
+        from levelupapi import replicas
+        connections["replica1"].close()
+        os.remove(self.path)
+        with self.assertLogs("levelupapi.replicas", "WARNING"):
+            response = self.reader.get(f"/games/{self.data['games'][0].id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("replica1", replicas.down_until)
+        # Skipped without another try until RETRY_AFTER has passed
+        self.assertEqual(self.reader.get("/games").status_code, 200)
+
+    def test_router(self):
+        from django.db import router
+        self.assertEqual(router.db_for_write(Game), "default")
+        self.assertEqual(router.db_for_read(Game), "default")
+        self.assertFalse(router.allow_migrate("replica1", "levelupapi"))
+        self.assertTrue(router.allow_migrate("default", "levelupapi"))
+
+
+class ThrottleTests(LevelupTestCase):
+    """Token bucket throttles on login, register and writes"""
+
+    def setUp(self):
+        super().setUp()
+        from django.conf import settings
+        self.rates = override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {
+            "login": "3/min", "login_username": "2/min", "register": "2/hour", "write": "2/min",
+        }})
+        self.rates.enable()
+        self.addCleanup(self.rates.disable)
+        hashers = override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+        hashers.enable()
+        self.addCleanup(hashers.disable)
+        self.user = User.objects.create_user(username="gamer", password="secret")
+        Token.objects.create(user=self.user)
+        self.client = APIClient()
+
+    def login(self, username="gamer", address="10.0.0.1"):
+        return self.client.post("/login", {"username": username, "password": "secret"}, format="json",
+                                REMOTE_ADDR=address)
+
+    def test_throttled_login_does_no_work(self):
+        from unittest import mock
+        self.assertEqual(self.login().json()["valid"], True)
+        self.login(username="other1")
+        self.login(username="other2")
+        with mock.patch("levelupapi.views.auth.authenticate") as authenticate, self.assertNumQueries(0):
+            response = self.login(username="other3")
+        self.assertEqual(response.status_code, 429)
+        # A token every 20 seconds
+        self.assertIn(int(response["Retry-After"]), range(1, 21))
+        authenticate.assert_not_called()
+        # Another address has its own bucket
+        self.assertEqual(self.login(address="10.0.0.2").status_code, 200)
+
+    def test_login_per_username(self):
+        self.login(address="10.0.0.1")
+        self.login(address="10.0.0.2")
+        self.assertEqual(self.login(address="10.0.0.3").status_code, 429)
+        self.assertEqual(self.login(username="someone", address="10.0.0.3").status_code, 200)
+
+    def test_register(self):
+        from unittest import mock
+        for i in range(2):
+            response = self.client.post("/register", {
+                "username": f"new{i}", "password": "pw", "email": "a@b.c", "first_name": "A", "last_name": "B",
+            }, format="json")
+            self.assertEqual(response.status_code, 200)
+        with mock.patch("django.contrib.auth.base_user.make_password") as make_password, self.assertNumQueries(0):
+            response = self.client.post("/register", {
+                "username": "new2", "password": "pw", "email": "a@b.c", "first_name": "A", "last_name": "B",
+            }, format="json")
+        self.assertEqual(response.status_code, 429)
+        make_password.assert_not_called()
+
+    def test_writes_per_user(self):
+        data = make_dataset(games=1)
+        self.client.force_authenticate(user=data["users"][0])
+        game = {"name": "Thrown", "manufacturer": "Acme", "number_of_players": 2, "type": data["game_type"].id}
+        self.assertEqual([self.client.post("/games", game, format="json").status_code for _ in range(3)],
+                         [201, 201, 429])
+        # Reads aren't throttled, and other users have their own bucket
+        self.assertEqual(self.client.get("/games").status_code, 200)
+        self.client.force_authenticate(user=data["users"][1])
+        self.assertEqual(self.client.post("/games", game, format="json").status_code, 201)
+
+    def test_shared_cache(self):
+        with override_settings(LEVELUP_THROTTLE={"CACHE": "default"}):
+            self.login()
+            self.login(username="other")
+            self.login(username="other2")
+            self.assertEqual(self.login(username="other3").status_code, 429)
+        self.assertEqual(local_buckets.full_at, {})
+        self.assertIsNotNone(cache.get("levelup:throttle:throttle_login_10.0.0.1"))
+
+    def test_disabled(self):
+        with override_settings(LEVELUP_THROTTLE={"ENABLED": False}):
+            self.assertEqual({self.login().status_code for _ in range(5)}, {200})
+
+    def test_bucket(self):
+        from levelupapi.throttling import LocalBuckets, take
+        # Two tokens, one more each second
+        full_at, wait = take(None, 100.0, 2, 1.0)
+        self.assertEqual((full_at, wait), (101.0, 0.0))
+        full_at, wait = take(full_at, 100.0, 2, 1.0)
+        self.assertEqual((full_at, wait), (102.0, 0.0))
+        self.assertEqual(take(full_at, 100.0, 2, 1.0), (None, 1.0))
+        self.assertEqual(take(full_at, 101.0, 2, 1.0), (103.0, 0.0))
+
+        buckets = LocalBuckets(max_keys=2)
+        for key in ("a", "b", "c"):
+            buckets.take(key, 2, 60.0)
+        self.assertEqual(list(buckets.full_at), ["b", "c"])
+
+
+class JobTests(LevelupTestCase):
+    """Follow-on work from event writes runs as stored background jobs"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=2, games=2)
+        # Only the jobs a test's own writes leave
+        from levelupapi.models import Job
+        Job.objects.all().delete()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.data["users"][0])
+
+    def move(self, event, game):
+        return self.client.put(f"/events/{event.id}", {
+            "name": "Moved", "date": "2030-01-01", "time": "19:00", "location": "Hall", "game": game.id,
+        }, format="json")
+
+    def register(self, name, handler):
+        from levelupapi.jobs import registry
+        registry[name] = handler
+        self.addCleanup(registry.pop, name)
+
+    def test_event_update_leaves_work_to_jobs(self):
+        from django.core import mail
+        from django.core.management import call_command
+        from io import StringIO
+        from levelupapi.caching import store_version
+        from levelupapi.jobs import submit
+        from levelupapi.models import Job
+        from levelupapi.stats import compute_stats, find_drift, stored_stats
+        users = self.data["users"]
+        User.objects.filter(pk=users[1].pk).update(email="gamer1@example.com")
+        # Event 0 is users[0]'s, attended by users 0 and 1
+        event = self.data["events"][0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(self.move(event, self.data["games"][1]).status_code, 204)
+        self.assertEqual([callback.func for callback in callbacks if callback.func is not store_version],
+                         [submit, submit])
+        self.assertEqual(sorted(Job.objects.values_list("name", "status")),
+                         [("notify_attendees", "pending"), ("recount_games", "pending")])
+        self.assertEqual(mail.outbox, [])
+
+        call_command("run_jobs", "--once", stdout=StringIO())
+        self.assertEqual(set(Job.objects.values_list("status", flat=True)), {"done"})
+        # The organizer isn't told about their own change
+        self.assertEqual([message.to for message in mail.outbox], [["gamer1@example.com"]])
+        self.assertEqual(mail.outbox[0].subject, "Moved has changed")
+        for expected, stored in zip(compute_stats(), stored_stats()):
+            self.assertEqual(find_drift(expected, stored), [])
+
+    def test_attendees_are_only_told_about_visible_changes(self):
+        from levelupapi.models import Job
+        event = Event.objects.get(pk=self.data["events"][0].pk)
+        event.save()
+        # A signup touches updated_at only
+        event.attendees.add(self.data["users"][2])
+        self.assertFalse(Job.objects.filter(name="notify_attendees").exists())
+        event.location = "Library"
+        event.save()
+        self.assertEqual(Job.objects.filter(name="notify_attendees").count(), 1)
+
+    def test_write_queries_dont_grow_with_attendees(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        event, games = self.data["events"][0], self.data["games"]
+        counts = []
+        for extra in (0, 20):
+            for i in range(extra):
+                attendee = User.objects.create(username=f"extra{len(counts)}_{i}")
+                EventGamer.objects.create(event=event, attendee=attendee)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.move(event, games[len(counts) % 2 - 1]).status_code, 204)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_retries_with_backoff_then_fails(self):
+        from levelupapi.jobs import enqueue, run_job
+        from levelupapi.models import Job
+        calls = []
+
+        def flaky(**kwargs):
+            calls.append(kwargs)
+            raise ValueError("mail server down")
+        self.register("flaky", flaky)
+
+        with override_settings(LEVELUP_JOBS={"MAX_ATTEMPTS": 3, "BACKOFF": 10}), \
+                self.assertLogs("levelupapi.jobs") as logs:
+            job = enqueue("flaky", n=1)
+            self.assertEqual(run_job(job.pk), 10)
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts, job.last_error), ("pending", 1, "ValueError: mail server down"))
+            self.assertGreater(job.run_after, datetime.now() + timedelta(seconds=9))
+            # Not due yet
+            self.assertIsNone(run_job(job.pk))
+            Job.objects.filter(pk=job.pk).update(run_after=datetime.now())
+            self.assertEqual(run_job(job.pk), 20)
+            Job.objects.filter(pk=job.pk).update(run_after=datetime.now())
+            self.assertIsNone(run_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ("failed", 3))
+        self.assertEqual(calls, [{"n": 1}] * 3)
+        self.assertEqual([record.levelname for record in logs.records], ["WARNING", "WARNING", "ERROR"])
+
+    def test_handlers_run_outside_a_transaction(self):
+        # Holding BEGIN IMMEDIATE through a slow handler would stall every writer
+        from django.db import connection
+        from levelupapi.jobs import enqueue, run_job
+        depth = []
+        self.register("depth", lambda: depth.append(len(connection.atomic_blocks)))
+        outside = len(connection.atomic_blocks)
+        run_job(enqueue("depth").pk)
+        self.assertEqual(depth, [outside])
+
+    def test_rolled_back_write_drops_its_jobs(self):
+        from django.db import transaction
+        from levelupapi.models import Job
+        event = self.data["events"][0]
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            event.name = "Never"
+            event.save()
+            raise RuntimeError
+        self.assertFalse(Job.objects.exists())
+        with self.assertRaises(LookupError):
+            from levelupapi.jobs import enqueue
+            enqueue("no_such_job")
+
+    def test_stale_jobs_are_released(self):
+        from levelupapi.jobs import release_stale
+        from levelupapi.models import Job
+        long_ago = datetime.now() - timedelta(hours=1)
+        lost = Job.objects.create(name="notify_attendees", status=Job.RUNNING, started_at=long_ago, attempts=1)
+        spent = Job.objects.create(name="notify_attendees", status=Job.RUNNING, started_at=long_ago,
+                                   attempts=5, max_attempts=5)
+        running = Job.objects.create(name="notify_attendees", status=Job.RUNNING, started_at=datetime.now())
+        self.assertEqual(release_stale(), 1)
+        self.assertEqual([Job.objects.get(pk=job.pk).status for job in (lost, spent, running)],
+                         ["pending", "failed", "running"])
+
+    def test_executor_is_bounded(self):
+        import threading
+        from unittest import mock
+        from levelupapi.jobs import Executor
+        release = threading.Event()
+        ran = []
+
+        def run_job(job_id):
+            release.wait(5)
+            ran.append(job_id)
+        with mock.patch("levelupapi.jobs.run_job", run_job):
+            executor = Executor(workers=1, queue_size=1)
+            self.assertEqual([executor.submit(job_id) for job_id in (1, 2, 3)], [True, True, False])
+            release.set()
+            executor.pool.shutdown(wait=True)
+        self.assertEqual(ran, [1, 2])
+        # Without workers, everything is left to run_jobs
+        with override_settings(LEVELUP_JOBS={"WORKERS": 0}), mock.patch("levelupapi.jobs.run_job") as run:
+            from levelupapi.jobs import submit
+            submit(1)
+        run.assert_not_called()
+
+
+class DashboardTests(LevelupTestCase):
+    """/me/dashboard: the user's own games and events in one response"""
+
+    def setUp(self):
+        super().setUp()
+        self.data = make_dataset(events=9, games=6)
+        self.user = self.data["users"][0]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_matches_the_full_endpoints(self):
+        games = self.client.get("/games").json()
+        events = self.client.get("/events").json()
+        dashboard = self.client.get("/me/dashboard").json()
+
+        self.assertEqual(dashboard["games"], sorted(
+            [game for game in games if game["creator"]["id"] == self.user.id], key=lambda game: -game["id"]))
+        latest_first = lambda event: (event["date"], event["time"], event["id"])  # pylint: disable=unnecessary-lambda-assignment
+        self.assertEqual(dashboard["organized_events"], sorted(
+            [event for event in events if event["organizer"]["id"] == self.user.id], key=latest_first, reverse=True))
+        self.assertEqual(dashboard["attending_events"], sorted(
+            [event for event in events if self.user.id in [gamer["id"] for gamer in event["attendees"]]],
+            key=latest_first, reverse=True))
+        self.assertEqual([len(dashboard[name]) for name in ("games", "organized_events", "attending_events")],
+                         [2, 3, 6])
+
+    def test_query_count_is_fixed(self):
+        with self.assertNumQueries(4):
+            self.client.get("/me/dashboard")
+        others = self.data["users"][1:]
+        for i in range(20):
+            game = Game.objects.create(name=f"More {i}", manufacturer="Acme", number_of_players=2,
+                                       type=self.data["game_type"], creator=self.user)
+            event = Event.objects.create(name=f"More {i}", date_time=datetime(2024, 3, 1), location="Cafe",
+                                         organizer=self.user, game=game)
+            event.attendees.add(self.user, *others)
+        cache.clear()
+        with self.assertNumQueries(4):
+            response = self.client.get("/me/dashboard")
+        self.assertEqual([len(rows) for rows in response.json().values()], [22, 23, 26])
+        # A user with nothing yet needs no signups query
+        self.client.force_authenticate(user=User.objects.create(username="newcomer"))
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get("/me/dashboard").json(),
+                             {"games": [], "organized_events": [], "attending_events": []})
+
+    def test_upcoming_and_limit(self):
+        game = self.data["games"][0]
+        soon, later = [
+            Event.objects.create(name=name, date_time=datetime.now() + timedelta(days=days), location="Cafe",
+                                 organizer=self.user, game=game)
+            for name, days in (("Later", 14), ("Soon", 7))
+        ][::-1]
+        EventGamer.objects.create(event=later, attendee=self.user)
+
+        dashboard = self.client.get("/me/dashboard", {"upcoming": "true"}).json()
+        self.assertEqual([event["id"] for event in dashboard["organized_events"]], [soon.id, later.id])
+        self.assertEqual([event["id"] for event in dashboard["attending_events"]], [later.id])
+
+        dashboard = self.client.get("/me/dashboard", {"upcoming": "true", "limit": 1}).json()
+        self.assertEqual([event["id"] for event in dashboard["organized_events"]], [soon.id])
+        self.assertEqual(len(dashboard["games"]), 1)
+        # Without ?upcoming= the latest come first
+        dashboard = self.client.get("/me/dashboard", {"limit": 2}).json()
+        self.assertEqual([event["id"] for event in dashboard["organized_events"]], [later.id, soon.id])
+
+        for limit in ("0", "-1", "many"):
+            self.assertEqual(self.client.get("/me/dashboard", {"limit": limit}).status_code, 400)
+
+    def test_each_user_gets_their_own(self):
+        mine = self.client.get("/me/dashboard").json()
+        self.client.force_authenticate(user=self.data["users"][1])
+        theirs = self.client.get("/me/dashboard").json()
+        self.assertNotEqual(mine["games"], theirs["games"])
+        self.assertEqual({game["creator"]["id"] for game in theirs["games"]}, {self.data["users"][1].id})
+        # A write shows up as soon as it commits despite the response cache
+        with self.captureOnCommitCallbacks(execute=True):
+            Game.objects.create(name="New", manufacturer="Acme", number_of_players=2,
+                                type=self.data["game_type"], creator=self.data["users"][1])
+        self.assertEqual(self.client.get("/me/dashboard").json()["games"][0]["name"], "New")
+
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get("/me/dashboard").status_code, 401)
+
+
+# The in-memory test database fails a pool thread's write with "table is
+# locked" instead of waiting for the test's; tests run jobs themselves
+@override_settings(LEVELUP_JOBS={"WORKERS": 0})
+class LoadTestCommandTests(LiveServerTestCase):
+    """loadtest drives a real server over HTTP"""
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        make_dataset(events=2, games=2)
+        Token.objects.create(user=User.objects.first())
+
+    def test_reports_throughput(self):
+        import json
+        import os
+        import tempfile
+        from io import StringIO
+        from django.core.management import call_command
+        output = StringIO()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "run.json")
+            call_command("loadtest", url=self.live_server_url, requests=20, warmup=2, concurrency=4,
+                         output=path, stdout=output)
+            call_command("loadtest", url=self.live_server_url, requests=8, warmup=0, concurrency=2,
+                         label="again", compare=path, stdout=output)
+            with open(path, encoding="utf-8") as file:
+                result = json.load(file)
+        self.assertEqual(result["statuses"], {"200": 20})
+        self.assertGreater(result["requests_per_second"], 0)
+        self.assertIn("again vs run:", output.getvalue())
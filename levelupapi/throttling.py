@@ -0,0 +1,188 @@
+"""Token bucket request throttles
+
+DRF's SimpleRateThrottle keeps a list of request timestamps per client in
+the cache and rewrites it on every request. These throttles keep a single
+number per client instead, the time its bucket is next full (GCRA, the
+"generic cell rate algorithm", which admits exactly what a token bucket
+would): a rate of "10/min" is a bucket of 10 tokens refilled one every
+6 seconds.
+
+Buckets live in a dict in each process by default. Updates take no lock:
+two threads racing on one client's bucket can both take its last token,
+so a client may get a request or two over the limit, never a lasting
+bypass. With LEVELUP_THROTTLE's CACHE set, buckets live in that cache and
+are shared by every worker, at the cost of a cache read and write per
+throttled request.
+
+Rates are REST_FRAMEWORK's DEFAULT_THROTTLE_RATES, by scope:
+* login / register: per client IP. login_user and register_user run no
+  authentication, so a throttled request is turned away before any
+  database query or password hash.
+* login_username: per username tried, so one account can't be guessed at
+  from many addresses.
+* write: POST, PUT, PATCH and DELETE per user. Reads aren't throttled.
+"""
+import hashlib
+import math
+import time
+from itertools import islice
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import SimpleRateThrottle
+
+THROTTLE_DEFAULTS = {
+    "ENABLED": True,
+    # Optional alias from CACHES to keep buckets in, shared by every worker
+    "CACHE": None,
+    # Most buckets kept in each process; full buckets are dropped first
+    "MAX_KEYS": 10000,
+}
+
+
+def get_config():
+    return {**THROTTLE_DEFAULTS, **getattr(settings, "LEVELUP_THROTTLE", {})}
+
+
+def take(full_at, now, capacity, interval):
+    """Take a token from a bucket that is full at `full_at` (None: full now)
+
+    Returns:
+        tuple -- (when the bucket is full after taking it, or None if it's
+        empty; seconds until a token is available, 0 if one was taken)
+    """
+    full_at = max(full_at or now, now)
+    if full_at - now > (capacity - 1) * interval:
+        return None, full_at - now - (capacity - 1) * interval
+    return full_at + interval, 0.0
+
+
+class LocalBuckets:
+    """Buckets in this process, keyed on throttle key"""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.full_at = {}
+
+    def take(self, key, capacity, interval):
+        now = time.monotonic()
+        full_at, wait = take(self.full_at.get(key), now, capacity, interval)
+        if full_at is not None:
+            self.full_at[key] = full_at
+            if len(self.full_at) > self.max_keys:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        # Rebuilt and swapped in rather than deleted from, so concurrent
+        # take() calls never see a dict changing size under them
+        active = {key: full_at for key, full_at in list(self.full_at.items()) if full_at > now}
+        if len(active) > self.max_keys:
+            # Still too many: keep the most recently created
+            active = dict(islice(active.items(), len(active) - self.max_keys, None))
+        self.full_at = active
+
+    def clear(self):
+        self.full_at = {}
+
+
+class CacheBuckets:
+    """Buckets in a cache shared between workers"""
+
+    prefix = "levelup:throttle:"
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key, capacity, interval):
+        # Wall clock: monotonic clocks aren't comparable between processes
+        now = time.time()
+        full_at, wait = take(self.cache.get(self.prefix + key), now, capacity, interval)
+        if full_at is not None:
+            self.cache.set(self.prefix + key, full_at, math.ceil(full_at - now) + 1)
+        return wait
+
+
+local_buckets = LocalBuckets(THROTTLE_DEFAULTS["MAX_KEYS"])
+
+
+def get_buckets(config):
+    if config["CACHE"]:
+        return CacheBuckets(caches[config["CACHE"]])
+    local_buckets.max_keys = config["MAX_KEYS"]
+    return local_buckets
+
+
+class TokenBucketThrottle(SimpleRateThrottle):
+    """SimpleRateThrottle's scopes and rates, counted with a token bucket"""
+
+    def get_rate(self):
+        # Read on every request rather than once at import, like the rest
+        # of the LEVELUP_* settings
+        try:
+            return api_settings.DEFAULT_THROTTLE_RATES[self.scope]
+        except KeyError as ex:
+            raise ImproperlyConfigured(f"No default throttle rate set for '{self.scope}' scope") from ex
+
+    def allow_request(self, request, view):
+        config = get_config()
+        if not config["ENABLED"] or self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.wait_seconds = get_buckets(config).take(self.key, self.num_requests, self.duration / self.num_requests)
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    """Login attempts per client IP"""
+
+    scope = "login"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginUsernameRateThrottle(TokenBucketThrottle):
+    """Login attempts per username, from any address"""
+
+    scope = "login_username"
+
+    def get_cache_key(self, request, view):
+        data = request.data
+        username = data.get("username") if hasattr(data, "get") else None
+        if not isinstance(username, str) or not username:
+            return None
+        # Usernames can hold anything; a digest keeps the key short and cache safe
+        ident = hashlib.sha256(username.lower().encode()).hexdigest()[:32]
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+class RegisterRateThrottle(LoginRateThrottle):
+    """Registrations per client IP"""
+
+    scope = "register"
+
+
+class WriteRateThrottle(TokenBucketThrottle):
+    """Writes per user (per IP for anonymous requests); reads pass straight through"""
+
+    scope = "write"
+
+    def allow_request(self, request, view):
+        if request.method in SAFE_METHODS:
+            return True
+        return super().allow_request(request, view)
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {"scope": self.scope, "ident": ident}
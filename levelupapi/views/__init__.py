@@ -1,4 +1,7 @@
 from .auth import login_user, register_user
 from .game_types import GameTypeView
 from .events import EventView
-from .games import GameView
\ No newline at end of file
+from .games import GameView
+from .event_stream import event_stream
+from .stats import GameStatsView, UserStatsView
+from .dashboard import DashboardView
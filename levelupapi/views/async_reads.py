@@ -0,0 +1,152 @@
+"""Native async GET handlers for the game type, game and event endpoints
+
+Served over ASGI (see levelup/asgi.py and LEVELUP_ASYNC_READS), plain
+list and retrieve requests for these endpoints are answered here with the
+async ORM, so they don't queue up behind the thread-sensitive executor
+sync views run in. Output, response caching and ETags match the DRF views.
+
+Anything else goes to the DRF view as before:
+- other methods (POST, PUT, DELETE, HEAD, OPTIONS)
+- query parameters these handlers don't implement: pagination, streaming,
+  sparse fieldsets, search, ?format=
+- requests accepting text/html, which get the browsable API
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from levelupapi.models import Event, EventGamer, Game, GameType
+from levelupapi.authentication import CachedTokenAuthentication
+from levelupapi.caching import acached_json
+from levelupapi.renderers import FastJSONRenderer
+from levelupapi import replicas
+from levelupapi.fast_serializers import EVENT_COLUMNS, GAME_COLUMNS, build_events, build_games, signup_rows
+from .events import EventView, upcoming_cache_key
+from .games import GameView
+
+EVENT_LIST_PARAMS = frozenset(("game", "from", "to", "upcoming"))
+
+
+def is_plain_read(request, params=frozenset()):
+    """True for a GET these handlers can answer themselves"""
+    if request.method != "GET":
+        return False
+    if "text/html" in request.META.get("HTTP_ACCEPT", ""):
+        return False
+    return set(request.GET) <= params
+
+
+def json_response(data, status_code):
+    """An uncached JSON response rendered the way DRF would render it"""
+    return HttpResponse(FastJSONRenderer().render(data), status=status_code,
+                        content_type=FastJSONRenderer.media_type)
+
+
+def unauthorized(detail):
+    """The 401 DRF sends when TokenAuthentication fails"""
+    response = json_response({"detail": str(detail)}, status.HTTP_401_UNAUTHORIZED)
+    response["WWW-Authenticate"] = CachedTokenAuthentication.keyword
+    return response
+
+
+def async_read(handler, sync_view, params=frozenset()):
+    """Build an async view answering plain GETs with `handler`
+
+    Every other request is passed on to `sync_view`, the DRF view the
+    router would have used for the same URL.
+    """
+    delegate = sync_to_async(sync_view)
+    authentication = CachedTokenAuthentication()
+
+    async def view(request, *args, **kwargs):
+        if not is_plain_read(request, params):
+            return await delegate(request, *args, **kwargs)
+
+        try:
+            credentials = await authentication.aauthenticate(request)
+        except exceptions.AuthenticationFailed as ex:
+            return unauthorized(ex.detail)
+        if credentials is None:
+            return unauthorized(exceptions.NotAuthenticated.default_detail)
+
+        # Same as @replica_reads on the DRF views
+        state = replicas.current_request.get()
+        if state is None:
+            return await handler(request, *args, **kwargs)
+        state.read_alias = await sync_to_async(replicas.choose_replica)(credentials[0])
+        try:
+            return await handler(request, *args, **kwargs)
+        finally:
+            state.read_alias = None
+
+    # Same as the DRF views it stands in for; token auth doesn't use cookies
+    view.csrf_exempt = True
+    view.__name__ = handler.__name__
+    return view
+
+
+async def game_type_list(request):
+    async def build():
+        return [{"id": pk, "label": label}
+                async for pk, label in GameType.objects.values_list("id", "label")]
+    return await acached_json(request, (GameType,), build)
+
+
+async def game_type_detail(request, pk):
+    async def build():
+        try:
+            game_type = await GameType.objects.aget(pk=pk)
+        except GameType.DoesNotExist:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        return {"id": game_type.id, "label": game_type.label}
+    return await acached_json(request, (GameType,), build)
+
+
+async def game_list(request):
+    async def build():
+        rows = [row async for row in GameView().get_queryset().values_list(*GAME_COLUMNS)]
+        return build_games(rows)
+    return await acached_json(request, (Game, GameType, User), build)
+
+
+async def game_detail(request, pk):
+    async def build():
+        try:
+            row = await GameView().get_queryset().values_list(*GAME_COLUMNS).aget(pk=pk)
+        except Game.DoesNotExist:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        return build_games([row])[0]
+    return await acached_json(request, (Game, GameType, User), build)
+
+
+async def fetch_events(queryset):
+    rows = [row async for row in queryset.prefetch_related(None).values_list(*EVENT_COLUMNS)]
+    signups = [row async for row in signup_rows(queryset)] if rows else ()
+    return build_events(rows, signups)
+
+
+async def event_list(request):
+    async def build():
+        view = EventView()
+        events = view.get_queryset()
+        game_id = request.GET.get("game")
+        if game_id is not None:
+            try:
+                events = events.filter(game=game_id)
+            except ValueError:
+                return json_response({"error": "Invalid game id"}, status.HTTP_400_BAD_REQUEST)
+        try:
+            events = view.filter_by_date(events, request.GET)
+        except ValueError as ex:
+            return json_response({"error": str(ex)}, status.HTTP_400_BAD_REQUEST)
+        return await fetch_events(events)
+    return await acached_json(request, (Event, EventGamer, Game, User), build, vary=upcoming_cache_key)
+
+
+async def event_detail(request, pk):
+    async def build():
+        events = await fetch_events(EventView().get_queryset().filter(pk=pk))
+        if not events:
+            return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+        return events[0]
+    return await acached_json(request, (Event, EventGamer, Game, User), build)
@@ -3,13 +3,17 @@ from django.contrib.auth.models import User
 from django.db import IntegrityError
 from rest_framework.authtoken.models import Token
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, authentication_classes, permission_classes, throttle_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
+from levelupapi.throttling import LoginRateThrottle, LoginUsernameRateThrottle, RegisterRateThrottle
 
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+# No authentication, so a throttled attempt costs no query or password hash
+@authentication_classes([])
+@throttle_classes([LoginRateThrottle, LoginUsernameRateThrottle])
 def login_user(request):
     '''Handles the authentication of a gamer
 
@@ -38,6 +42,8 @@ def login_user(request):
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
+@authentication_classes([])
+@throttle_classes([RegisterRateThrottle])
 def register_user(request):
     '''Handles the creation of a new gamer for authentication
 
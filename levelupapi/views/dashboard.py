@@ -0,0 +1,58 @@
+"""View module for the signed in gamer's own games and events"""
+from django.contrib.auth.models import User
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rest_framework import status
+from levelupapi.models import Event, EventGamer, Game, GameType
+from levelupapi.caching import cached_response
+from levelupapi.fast_serializers import serialize_event_lists, serialize_games
+from levelupapi.replicas import replica_reads
+from .events import upcoming_cache_key, upcoming_cutoff
+
+
+def dashboard_cache_key(request):
+    # Every user gets their own body for the same URL
+    return f"{request.user.pk}|{upcoming_cache_key(request)}"
+
+
+class DashboardView(ViewSet):
+    """The games, organized events and attending events of request.user"""
+
+    @replica_reads
+    @cached_response(Game, GameType, Event, EventGamer, User, vary=dashboard_cache_key)
+    def list(self, request):
+        """Handle GET requests for /me/dashboard
+
+        Games come newest first. Events come latest first, or with
+        ?upcoming=true only those from now on, soonest first. ?limit=
+        caps each of the three lists. Four queries whatever the numbers.
+
+        Returns:
+            Response -- JSON serialized games, organized_events and attending_events
+        """
+        limit = request.query_params.get("limit")
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                return Response({"error": "limit must be a positive integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        user = request.user
+        organized = user.organized_events.all()
+        attending = user.attending_events.all()
+        if request.query_params.get("upcoming", "").lower() in ("1", "true", "yes"):
+            cutoff = upcoming_cutoff()
+            organized = organized.filter(date_time__gte=cutoff).order_by("date_time", "id")
+            attending = attending.filter(date_time__gte=cutoff).order_by("date_time", "id")
+        else:
+            organized = organized.order_by("-date_time", "-id")
+            attending = attending.order_by("-date_time", "-id")
+
+        organized_events, attending_events = serialize_event_lists([organized, attending], limit)
+        return Response({
+            "games": serialize_games(user.games.order_by("-id")[:limit]),
+            "organized_events": organized_events,
+            "attending_events": attending_events,
+        })
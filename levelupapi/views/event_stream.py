@@ -0,0 +1,102 @@
+"""Server-sent events channel pushing event changes: GET /events/stream
+
+Each notification is one SSE message:
+
+    id: 42
+    event: signup
+    data: {"id":42,"type":"signup","event":7,"game":3,"attendee":12}
+
+Types are event.created, event.updated, event.deleted, signup and
+cancellation. ?game=<id> limits the stream to one game's events, like
+?game= on /events. An idle stream gets a comment line every KEEPALIVE
+seconds. A client that falls behind gets an `overflow` message and the
+stream ends; it should catch up with /events?since= and reconnect.
+
+Only served over ASGI: a WSGI worker would be tied up for as long as the
+client stays connected.
+"""
+from django.http import HttpResponseNotAllowed, StreamingHttpResponse
+from rest_framework import exceptions, status
+from levelupapi.authentication import CachedTokenAuthentication
+from levelupapi.pubsub import Overflow, TooManySubscribers, event_hub, get_config
+from levelupapi.renderers import FastJSONRenderer
+from .async_reads import json_response, unauthorized
+
+# Milliseconds a browser EventSource waits before reconnecting
+RECONNECT_DELAY = 3000
+
+
+def format_message(message):
+    data = FastJSONRenderer().render(message)
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (message["id"], message["type"].encode(), data)
+
+
+class EventStream:
+    """SSE frames for one subscription, as StreamingHttpResponse content
+
+    Django calls close() once the response is done with, including when
+    the client disconnects, which drops the subscription from the hub.
+    """
+
+    def __init__(self, subscription, keepalive):
+        self.subscription = subscription
+        self.keepalive = keepalive
+
+    async def __aiter__(self):
+        yield b"retry: %d\n\n" % RECONNECT_DELAY
+        while True:
+            try:
+                message = await self.subscription.get(self.keepalive)
+            except Overflow:
+                yield b"event: overflow\ndata: {}\n\n"
+                return
+            if message is None:
+                yield b": keepalive\n\n"
+            else:
+                yield format_message(message)
+
+    def close(self):
+        event_hub.unsubscribe(self.subscription)
+
+
+async def event_stream(request):
+    """Handle GET requests for the event push channel
+
+    Returns:
+        StreamingHttpResponse -- text/event-stream that stays open
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    if not hasattr(request, "scope"):
+        return json_response({"error": "The event stream is only served over ASGI"},
+                             status.HTTP_501_NOT_IMPLEMENTED)
+
+    try:
+        credentials = await CachedTokenAuthentication().aauthenticate(request)
+    except exceptions.AuthenticationFailed as ex:
+        return unauthorized(ex.detail)
+    if credentials is None:
+        return unauthorized(exceptions.NotAuthenticated.default_detail)
+
+    game_id = request.GET.get("game")
+    if game_id is not None:
+        try:
+            game_id = int(game_id)
+        except ValueError:
+            return json_response({"error": "Invalid game id"}, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        # Subscribe before answering so nothing published from here on is missed
+        subscription = event_hub.subscribe(game_id)
+    except TooManySubscribers:
+        return json_response({"error": "Too many open streams"}, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    response = StreamingHttpResponse(
+        EventStream(subscription, get_config()["KEEPALIVE"]), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx from buffering the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+event_stream.csrf_exempt = True
@@ -1,17 +1,78 @@
 """View module for handling requests about events"""
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.http import HttpResponseServerError
+from rest_framework.decorators import action
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers, status
-from levelupapi.models import Event, Game
+from rest_framework.exceptions import NotFound
+from levelupapi.models import Event, EventGamer, Game
+from levelupapi.batch import INSERT_BATCH_SIZE, batch_response, check_batch, parse_id, require_text
+from levelupapi.caching import bump_version, cached_response
+from levelupapi.replicas import replica_reads
+from levelupapi.changes import ChangeFeed, record_changes
+from levelupapi.idempotency import idempotent
+from levelupapi.fast_serializers import serialize_events
+from levelupapi.pagination import EventPagination
+from levelupapi.pubsub import publish_on_commit
+from levelupapi.sparse import SparseFieldset, SparseFieldsMixin
+from levelupapi import stats
+from levelupapi.streaming import is_stream_requested, streaming_json_response
 from django.contrib.auth.models import User
-from django.utils.dateparse import parse_datetime
-from datetime import datetime
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, timedelta
     
 
+def parse_date_only(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def parse_bound(value, name):
+    """Turn a ?from= / ?to= value (date or datetime) into a datetime"""
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime(day.year, day.month, day.day) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"Invalid {name} date")
+    return parsed
+
+
+def upcoming_cutoff():
+    """Start of the current minute, so ?upcoming=true responses can be cached for it"""
+    return datetime.now().replace(second=0, microsecond=0)
+
+
+def upcoming_cache_key(request):
+    # request.GET so it works for both DRF and plain Django requests
+    if request.GET.get("upcoming", "").lower() in ("1", "true", "yes"):
+        return upcoming_cutoff().isoformat()
+    return ""
+
+
 class EventView(ViewSet):
     """Level up events view"""
 
+    def get_queryset(self):
+        """Events with everything EventSerializer reads loaded up front
+
+        Organizer and game come back in the same SELECT and all attendees
+        for the page come back in one extra query, so the query count
+        doesn't grow with the number of events. Attendees are ordered by id
+        to match serialize_events().
+        """
+        return Event.objects.select_related("organizer", "game").prefetch_related(
+            Prefetch("attendees", queryset=User.objects.order_by("id")))
+
+    @replica_reads
+    @cached_response(Event, EventGamer, Game, User)
     def retrieve(self, request, pk):
         """Handle GET requests for single event
         
@@ -19,12 +80,49 @@ class EventView(ViewSet):
         """
 
         try:
-            event = Event.objects.get(pk=pk)
-            serializer = EventSerializer(event)
+            fieldset = SparseFieldset.from_request(request, EventSerializer)
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if fieldset is None:
+                event = self.get_queryset().get(pk=pk)
+                serializer = EventSerializer(event)
+            else:
+                event = fieldset.narrow(self.get_queryset()).get(pk=pk)
+                serializer = EventSerializer(event, **fieldset.serializer_kwargs())
             return Response(serializer.data)
         except Event.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    def filter_by_date(self, events, params):
+        """Apply the ?from=, ?to= and ?upcoming=true filters
+
+        Each accepts a date (whole day) or a datetime. The filters are served
+        by the (date_time) and (game_id, date_time) indexes on Event.
+
+        Raises:
+            ValueError -- when a bound can't be parsed
+        """
+        date_from = params.get("from")
+        if date_from:
+            events = events.filter(date_time__gte=parse_bound(date_from, "from"))
+
+        date_to = params.get("to")
+        if date_to:
+            if parse_date_only(date_to):
+                # A bare date includes everything on that day
+                end = parse_bound(date_to, "to") + timedelta(days=1)
+                events = events.filter(date_time__lt=end)
+            else:
+                events = events.filter(date_time__lte=parse_bound(date_to, "to"))
+
+        if params.get("upcoming", "").lower() in ("1", "true", "yes"):
+            events = events.filter(date_time__gte=upcoming_cutoff())
+        return events
+
+    @replica_reads
+    @cached_response(Event, EventGamer, Game, User, vary=upcoming_cache_key)
     def list(self, request):
         """Handle GET requests to get all events
 
@@ -36,24 +134,66 @@ class EventView(ViewSet):
 
         try:
             # Start with all rows
-            events = Event.objects.all()
+            events = self.get_queryset()
             if game_id is not None:
                 try:
                     # Filter the queryset based on game parameter
                     events = events.filter(game=game_id)
                 except ValueError:
                     return Response({"error": "Invalid game id"}, status=status.HTTP_400_BAD_REQUEST)
-            serializer = EventSerializer(events, many=True)
-            return Response(serializer.data)
+
+            try:
+                events = self.filter_by_date(events, request.query_params)
+                # ?fields= and ?expand= trim the output and the query
+                fieldset = SparseFieldset.from_request(request, EventSerializer)
+            except ValueError as ex:
+                return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+            serializer_kwargs = {}
+            if fieldset is not None:
+                events = fieldset.narrow(events, extra_columns=EventPagination.ordering)
+                serializer_kwargs = fieldset.serializer_kwargs()
+
+            # ?since= returns only what was created, changed or deleted after the cursor
+            feed = ChangeFeed()
+            if feed.is_requested(request):
+                if fieldset is not None:
+                    return feed.get_changes_response(
+                        events, request, lambda rows: EventSerializer(rows, many=True, **serializer_kwargs).data)
+                return feed.get_changes_response(events, request, serialize_events)
+
+            # ?page_size= or ?cursor= switches to keyset pagination
+            paginator = EventPagination()
+            if paginator.is_requested(request):
+                page = paginator.paginate_queryset(events, request)
+                serializer = EventSerializer(page, many=True, **serializer_kwargs)
+                return paginator.get_paginated_response(serializer.data)
+
+            # ?stream=true writes the array out in chunks instead of building it in memory
+            if is_stream_requested(request):
+                return streaming_json_response(events, EventSerializer, serializer_kwargs=serializer_kwargs)
+
+            if fieldset is not None:
+                return Response(EventSerializer(events, many=True, **serializer_kwargs).data)
+
+            # Same output as EventSerializer(events, many=True).data without the per-field overhead
+            return Response(serialize_events(events))
+        except NotFound as ex:
+            # An invalid cursor; the catch-all below would make it a 500
+            return Response(ex.detail, status=status.HTTP_404_NOT_FOUND)
         except Exception as ex:
             return HttpResponseServerError(ex)
         
+    @idempotent
     def create(self, request):
         """Handle POST operations
 
         Returns
             Response -- JSON serialized game instance
         """
+        # A JSON array body creates every event in it at once
+        if isinstance(request.data, list):
+            return self.create_many(request, request.data)
+
         event_date = request.data.get("date")
         event_time = request.data.get("time")
 
@@ -80,7 +220,77 @@ class EventView(ViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as ex:
             return Response(None, status=status.HTTP_400_BAD_REQUEST)
-        
+
+    def create_many(self, request, items):
+        """Handle POST operations with a JSON array of events
+
+        Every referenced game is looked up with a single IN query and the
+        valid events are inserted with bulk_create in one transaction.
+        Invalid items are reported and skipped.
+
+        Returns:
+            Response -- per-item results in request order
+        """
+        error = check_batch(items)
+        if error is not None:
+            return error
+
+        game_ids = {parse_id(item.get("game")) for item in items if isinstance(item, dict)}
+        games = Game.objects.in_bulk(game_ids - {None})
+
+        results = []
+        events = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({"index": index, "status": status.HTTP_400_BAD_REQUEST,
+                                "errors": {"non_field_errors": "Expected an object"}})
+                continue
+
+            errors = {}
+            name = require_text(item, "name", errors)
+            location = require_text(item, "location", errors)
+            try:
+                parsed_datetime = parse_datetime(f'{item.get("date")} {item.get("time")}')
+            except ValueError:
+                parsed_datetime = None
+            if parsed_datetime is None:
+                errors["date"] = "date and time do not make a valid datetime"
+            game = games.get(parse_id(item.get("game")))
+            if game is None:
+                errors["game"] = "game_id does not exist"
+
+            if errors:
+                results.append({"index": index, "status": status.HTTP_400_BAD_REQUEST, "errors": errors})
+                continue
+
+            results.append({"index": index, "status": status.HTTP_201_CREATED})
+            events.append(Event(
+                name=name,
+                date_time=parsed_datetime,
+                location=location,
+                organizer=request.user,
+                game=game,
+            ))
+
+        with transaction.atomic():
+            Event.objects.bulk_create(events, batch_size=INSERT_BATCH_SIZE)
+            stats.events_created(events)
+            record_changes(Event, [event.pk for event in events])
+        # bulk_create doesn't send post_save
+        if events:
+            bump_version(Event)
+            for event in events:
+                publish_on_commit("event.created", event.pk, event.game_id)
+
+        # New events have no attendees yet; one query confirms it for all of them
+        prefetch_related_objects(events, "attendees")
+        created = iter(EventSerializer(events, many=True).data)
+        for result in results:
+            if result["status"] == status.HTTP_201_CREATED:
+                result["data"] = next(created)
+        return batch_response(results)
+
+    @idempotent
     def update(self, request, pk):
         """Handle PUT requests for an event
 
@@ -120,6 +330,38 @@ class EventView(ViewSet):
         except Event.DoesNotExist:
             return Response({"message": "event_id does not exist"}, status=status.HTTP_404_NOT_FOUND)
 
+    @action(methods=["post", "delete"], detail=True)
+    def signup(self, request, pk):
+        """Handle POST (join) and DELETE (leave) requests for an event
+
+        The unique (event, attendee) constraint settles concurrent joins and
+        the EventGamer signals move Event.attendee_count with F() updates in
+        the same transaction.
+
+        Returns:
+            Response -- Empty body with 204 status code
+        """
+        # The id comes back as an int, unlike the pk string from the URL
+        event_id = Event.objects.filter(pk=pk).values_list("id", flat=True).first()
+        if event_id is None:
+            return Response({"message": "event_id does not exist"}, status=status.HTTP_404_NOT_FOUND)
+
+        if request.method == "POST":
+            try:
+                with transaction.atomic():
+                    EventGamer.objects.create(event_id=event_id, attendee=request.user)
+            except IntegrityError:
+                return Response({"message": "You are already signed up for that event"},
+                                status=status.HTTP_409_CONFLICT)
+            return Response(None, status=status.HTTP_204_NO_CONTENT)
+
+        with transaction.atomic():
+            deleted, _ = EventGamer.objects.filter(event_id=event_id, attendee=request.user).delete()
+        if not deleted:
+            return Response({"message": "You are not signed up for that event"},
+                            status=status.HTTP_404_NOT_FOUND)
+        return Response(None, status=status.HTTP_204_NO_CONTENT)
+
 
 
 class EventOrganizerSerializer(serializers.ModelSerializer):
@@ -141,9 +383,16 @@ class EventGameSerializer(serializers.ModelSerializer):
         fields = ('id', 'name')
 
 
-class EventSerializer(serializers.ModelSerializer):
+class EventSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for events"""
 
+    field_columns = {"date": ("date_time",), "time": ("date_time",)}
+    relation_columns = {
+        "organizer": (False, ("first_name", "last_name")),
+        "game": (False, ("name",)),
+        "attendees": (True, ("first_name", "last_name")),
+    }
+
     date = serializers.SerializerMethodField()
     time = serializers.SerializerMethodField()
     organizer = EventOrganizerSerializer(many=False)
@@ -159,4 +408,5 @@ class EventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        fields = ('id', 'name', 'date', 'time', 'location', 'organizer', 'game', 'attendees')
+        fields = ('id', 'name', 'date', 'time', 'location', 'organizer', 'game', 'attendees',
+                  'attendee_count')
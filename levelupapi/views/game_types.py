@@ -4,11 +4,16 @@ from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers, status
 from levelupapi.models import GameType
+from levelupapi.caching import cached_response
+from levelupapi.replicas import replica_reads
+from levelupapi.changes import ChangeFeed
 
 
 class GameTypeView(ViewSet):
     """Level up game types view"""
 
+    @replica_reads
+    @cached_response(GameType)
     def retrieve(self, request, pk):
         """Handle GET requests for single game type
 
@@ -28,6 +33,8 @@ class GameTypeView(ViewSet):
         except GameType.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    @replica_reads
+    @cached_response(GameType)
     def list(self, request):
         """Handle GET requests to get all game types
 
@@ -38,6 +45,13 @@ class GameTypeView(ViewSet):
         # 'all' is equivalent to this sql execute:
         # select *
         # from levelupapi_gametype
+
+        # ?since= returns only what was created, changed or deleted after the cursor
+        feed = ChangeFeed()
+        if feed.is_requested(request):
+            return feed.get_changes_response(
+                game_types, request, lambda rows: GameTypeSerializer(rows, many=True).data)
+
         serializer = GameTypeSerializer(game_types, many=True)
         return Response(serializer.data)
 
@@ -1,8 +1,20 @@
 """View module for handling requests about games"""
+from django.db import transaction
 from rest_framework.viewsets import ViewSet
 from rest_framework.response import Response
 from rest_framework import serializers, status
 from levelupapi.models import Game, GameType
+from levelupapi.batch import INSERT_BATCH_SIZE, batch_response, check_batch, parse_id, require_text
+from levelupapi.caching import bump_version, cached_response
+from levelupapi.replicas import replica_reads
+from levelupapi.changes import ChangeFeed, record_changes
+from levelupapi.idempotency import idempotent
+from levelupapi.fast_serializers import serialize_games
+from levelupapi.pagination import GamePagination
+from levelupapi.search import get_limit, search_games
+from levelupapi.sparse import SparseFieldset, SparseFieldsMixin
+from levelupapi import stats
+from levelupapi.streaming import is_stream_requested, streaming_json_response
 from django.contrib.auth.models import User
 from .game_types import GameTypeSerializer
 
@@ -10,6 +22,12 @@ from .game_types import GameTypeSerializer
 class GameView(ViewSet):
     """Level up games view"""
 
+    def get_queryset(self):
+        """Games joined to their creator and type so serializing is a single query"""
+        return Game.objects.select_related("creator", "type")
+
+    @replica_reads
+    @cached_response(Game, GameType, User)
     def retrieve(self, request, pk):
         """Handle GET requests for single game
         
@@ -17,12 +35,23 @@ class GameView(ViewSet):
         """
 
         try:
-            game = Game.objects.get(pk=pk)
-            serializer = GameSerializer(game)
+            fieldset = SparseFieldset.from_request(request, GameSerializer)
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            if fieldset is None:
+                game = self.get_queryset().get(pk=pk)
+                serializer = GameSerializer(game)
+            else:
+                game = fieldset.narrow(self.get_queryset()).get(pk=pk)
+                serializer = GameSerializer(game, **fieldset.serializer_kwargs())
             return Response(serializer.data)
         except Game.DoesNotExist:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
+    @replica_reads
+    @cached_response(Game, GameType, User)
     def list(self, request):
         """Handle GET requests to get all games
 
@@ -30,16 +59,60 @@ class GameView(ViewSet):
             Response -- JSON serialized list of games
         """
 
-        games = Game.objects.all()
-        serializer = GameSerializer(games, many=True)
-        return Response(serializer.data)
+        games = self.get_queryset()
+
+        # ?fields= and ?expand= trim the output and the query
+        try:
+            fieldset = SparseFieldset.from_request(request, GameSerializer)
+        except ValueError as ex:
+            return Response({"error": str(ex)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer_kwargs = {}
+        if fieldset is not None:
+            games = fieldset.narrow(games)
+            serializer_kwargs = fieldset.serializer_kwargs()
+
+        # ?q= returns the best `limit` matches on name and manufacturer, best first
+        query = request.query_params.get("q")
+        if query is not None:
+            results = search_games(games, query, get_limit(request))
+            return Response(GameSerializer(results, many=True, **serializer_kwargs).data)
 
+        # ?since= returns only what was created, changed or deleted after the cursor
+        feed = ChangeFeed()
+        if feed.is_requested(request):
+            if fieldset is not None:
+                return feed.get_changes_response(
+                    games, request, lambda rows: GameSerializer(rows, many=True, **serializer_kwargs).data)
+            return feed.get_changes_response(games, request, serialize_games)
+
+        # ?page_size= or ?cursor= switches to keyset pagination
+        paginator = GamePagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(games, request)
+            serializer = GameSerializer(page, many=True, **serializer_kwargs)
+            return paginator.get_paginated_response(serializer.data)
+
+        # ?stream=true writes the array out in chunks instead of building it in memory
+        if is_stream_requested(request):
+            return streaming_json_response(games, GameSerializer, serializer_kwargs=serializer_kwargs)
+
+        if fieldset is not None:
+            return Response(GameSerializer(games, many=True, **serializer_kwargs).data)
+
+        # Same output as GameSerializer(games, many=True).data without the per-field overhead
+        return Response(serialize_games(games))
+
+    @idempotent
     def create(self, request):
         """Handle POST operations
 
         Returns
             Response -- JSON serialized game instance
         """
+        # A JSON array body creates every game in it at once
+        if isinstance(request.data, list):
+            return self.create_many(request, request.data)
+
         name = request.data.get("name")
         manufacturer = request.data.get("manufacturer")
         number_of_players = request.data.get("number_of_players")
@@ -60,7 +133,70 @@ class GameView(ViewSet):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as ex:
             return Response(None, status=status.HTTP_400_BAD_REQUEST)
-        
+
+    def create_many(self, request, items):
+        """Handle POST operations with a JSON array of games
+
+        Every referenced game type is looked up with a single IN query and
+        the valid games are inserted with bulk_create in one transaction.
+        Invalid items are reported and skipped.
+
+        Returns:
+            Response -- per-item results in request order
+        """
+        error = check_batch(items)
+        if error is not None:
+            return error
+
+        type_ids = {parse_id(item.get("type")) for item in items if isinstance(item, dict)}
+        game_types = GameType.objects.in_bulk(type_ids - {None})
+
+        results = []
+        games = []
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                results.append({"index": index, "status": status.HTTP_400_BAD_REQUEST,
+                                "errors": {"non_field_errors": "Expected an object"}})
+                continue
+
+            errors = {}
+            name = require_text(item, "name", errors)
+            manufacturer = require_text(item, "manufacturer", errors)
+            number_of_players = parse_id(item.get("number_of_players"))
+            if number_of_players is None:
+                errors["number_of_players"] = "A whole number is required."
+            game_type = game_types.get(parse_id(item.get("type")))
+            if game_type is None:
+                errors["type"] = "type_id does not exist"
+
+            if errors:
+                results.append({"index": index, "status": status.HTTP_400_BAD_REQUEST, "errors": errors})
+                continue
+
+            results.append({"index": index, "status": status.HTTP_201_CREATED})
+            games.append(Game(
+                name=name,
+                manufacturer=manufacturer,
+                number_of_players=number_of_players,
+                type=game_type,
+                creator=request.user,
+            ))
+
+        with transaction.atomic():
+            Game.objects.bulk_create(games, batch_size=INSERT_BATCH_SIZE)
+            stats.games_created(games)
+            record_changes(Game, [game.pk for game in games])
+        # bulk_create doesn't send post_save
+        if games:
+            bump_version(Game)
+
+        created = iter(GameSerializer(games, many=True).data)
+        for result in results:
+            if result["status"] == status.HTTP_201_CREATED:
+                result["data"] = next(created)
+        return batch_response(results)
+
+    @idempotent
     def update(self, request, pk):
         """Handle PUT requests for a game
 
@@ -106,9 +242,14 @@ class GameCreatorSerializer(serializers.ModelSerializer):
         fields = ('id', 'full_name')
 
 
-class GameSerializer(serializers.ModelSerializer):
+class GameSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """JSON serializer for games"""
 
+    relation_columns = {
+        "type": (False, ("label",)),
+        "creator": (False, ("first_name", "last_name")),
+    }
+
     creator = GameCreatorSerializer(many=False)
     type = GameTypeSerializer(many=False)
 
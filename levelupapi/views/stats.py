@@ -0,0 +1,131 @@
+"""View module for the read-only per-game and per-user statistics"""
+from django.contrib.auth.models import User
+from django.db.models import Count
+from rest_framework.viewsets import ViewSet
+from rest_framework.response import Response
+from rest_framework import status
+from levelupapi.models import Event, Game, GameStats, UserStats
+from levelupapi.caching import cached_response
+from levelupapi.pagination import KeysetPagination
+from levelupapi.stats import GAME_FIELDS, USER_FIELDS
+from .events import upcoming_cutoff
+
+
+class GameStatsPagination(KeysetPagination):
+    ordering = ("game",)
+
+
+class UserStatsPagination(KeysetPagination):
+    ordering = ("user",)
+
+
+def upcoming_minute(request):
+    # upcoming_event_count moves as time passes, not only on writes
+    return upcoming_cutoff().isoformat()
+
+
+def upcoming_event_counts(game_ids=None):
+    """Events from now on per game, counted off the (game, date_time) index
+
+    Unlike the other numbers this one changes as time passes, so it is
+    counted when read rather than stored.
+    """
+    events = Event.objects.filter(date_time__gte=upcoming_cutoff())
+    if game_ids is not None:
+        events = events.filter(game_id__in=game_ids)
+    return dict(events.values_list("game_id").annotate(n=Count("id")).order_by())
+
+
+class GameStatsView(ViewSet):
+    """Counts for each game: events, upcoming events, signups and distinct players"""
+
+    def serialize(self, rows, upcoming):
+        return [
+            {
+                "game": row.game_id,
+                "name": row.game.name,
+                "event_count": row.event_count,
+                "upcoming_event_count": upcoming.get(row.game_id, 0),
+                "attendee_count": row.attendee_count,
+                "player_count": row.player_count,
+            }
+            for row in rows
+        ]
+
+    @cached_response(GameStats, Event, Game, vary=upcoming_minute)
+    def retrieve(self, request, pk):
+        """Handle GET requests for one game's stats
+
+        Returns:
+            Response -- JSON serialized game stats
+        """
+        try:
+            game = Game.objects.only("name").get(pk=pk)
+        except (Game.DoesNotExist, ValueError):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        row = GameStats.objects.filter(game=game).first() or GameStats()
+        row.game = game
+        return Response(self.serialize([row], upcoming_event_counts([game.pk]))[0])
+
+    @cached_response(GameStats, Event, Game, vary=upcoming_minute)
+    def list(self, request):
+        """Handle GET requests for every game's stats, in game id order
+
+        Returns:
+            Response -- JSON serialized list of game stats
+        """
+        rows = GameStats.objects.select_related("game").only("game__name", *GAME_FIELDS)
+
+        # ?page_size= or ?cursor= switches to keyset pagination
+        paginator = GameStatsPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(rows, request)
+            upcoming = upcoming_event_counts([row.game_id for row in page])
+            return paginator.get_paginated_response(self.serialize(page, upcoming))
+
+        return Response(self.serialize(rows.order_by("game"), upcoming_event_counts()))
+
+
+class UserStatsView(ViewSet):
+    """Counts for each user: games created, events organized and events attended"""
+
+    def serialize(self, rows):
+        return [
+            {
+                "user": row.user_id,
+                "full_name": f"{row.user.first_name} {row.user.last_name}",
+                **{field: getattr(row, field) for field in USER_FIELDS},
+            }
+            for row in rows
+        ]
+
+    @cached_response(UserStats, User)
+    def retrieve(self, request, pk):
+        """Handle GET requests for one user's stats
+
+        Returns:
+            Response -- JSON serialized user stats
+        """
+        try:
+            user = User.objects.only("first_name", "last_name").get(pk=pk)
+        except (User.DoesNotExist, ValueError):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        row = UserStats.objects.filter(user=user).first() or UserStats()
+        row.user = user
+        return Response(self.serialize([row])[0])
+
+    @cached_response(UserStats, User)
+    def list(self, request):
+        """Handle GET requests for every user's stats, in user id order
+
+        Returns:
+            Response -- JSON serialized list of user stats
+        """
+        rows = UserStats.objects.select_related("user").only("user__first_name", "user__last_name", *USER_FIELDS)
+
+        paginator = UserStatsPagination()
+        if paginator.is_requested(request):
+            page = paginator.paginate_queryset(rows, request)
+            return paginator.get_paginated_response(self.serialize(page))
+
+        return Response(self.serialize(rows.order_by("user")))